@@ -3,6 +3,7 @@ import os
 from theflow.settings import settings as flowsettings
 
 KH_APP_DATA_DIR = getattr(flowsettings, "KH_APP_DATA_DIR", ".")
+KH_BLOB_STORE_PATH = getattr(flowsettings, "KH_BLOB_STORE_PATH", None)
 KH_GRADIO_SHARE = getattr(flowsettings, "KH_GRADIO_SHARE", False)
 GRADIO_TEMP_DIR = os.getenv("GRADIO_TEMP_DIR", None)
 # override GRADIO_TEMP_DIR if it's not set
@@ -21,6 +22,8 @@ demo.queue().launch(
     allowed_paths=[
         "libs/ktem/ktem/assets",
         GRADIO_TEMP_DIR,
+        # page thumbnails and figures referenced by the documents
+        *([KH_BLOB_STORE_PATH] if KH_BLOB_STORE_PATH else []),
     ],
     share=KH_GRADIO_SHARE,
 )
@@ -84,6 +84,8 @@ KH_FEATURE_USER_MANAGEMENT_PASSWORD = str(
 KH_ENABLE_ALEMBIC = False
 KH_DATABASE = f"sqlite:///{KH_USER_DATA_DIR / 'sql.db'}"
 KH_FILESTORAGE_PATH = str(KH_USER_DATA_DIR / "files")
+# page thumbnails and figures are stored here, and referenced from the documents
+KH_BLOB_STORE_PATH = str(KH_USER_DATA_DIR / "files" / "blobs")
 KH_WEB_SEARCH_BACKEND = (
     "kotaemon.indices.retrievers.tavily_web_search.WebSearch"
     # "kotaemon.indices.retrievers.jina_web_search.WebSearch"
@@ -92,6 +94,7 @@ KH_WEB_SEARCH_BACKEND = (
 KH_DOCSTORE = {
     # "__type__": "kotaemon.storages.ElasticsearchDocumentStore",
     # "__type__": "kotaemon.storages.SimpleFileDocumentStore",
+    # "__type__": "kotaemon.storages.LogStructuredDocumentStore",
     "__type__": "kotaemon.storages.LanceDBDocumentStore",
     "path": str(KH_USER_DATA_DIR / "docstore"),
 }
@@ -100,8 +103,32 @@ KH_VECTORSTORE = {
     "__type__": "kotaemon.storages.ChromaVectorStore",
     # "__type__": "kotaemon.storages.MilvusVectorStore",
     # "__type__": "kotaemon.storages.QdrantVectorStore",
+    # "__type__": "kotaemon.storages.NumpyFlatVectorStore",
     "path": str(KH_USER_DATA_DIR / "vectorstore"),
 }
+# cache the computed embeddings on disk, so re-indexing the same content does
+# not call the embedding models again. Set "path" to None to disable.
+KH_EMBEDDING_CACHE = {
+    "path": str(KH_USER_DATA_DIR / "embedding_cache.db"),
+    "max_size_bytes": config(
+        "KH_EMBEDDING_CACHE_MAX_SIZE", default=1024 * 1024 * 1024, cast=int
+    ),
+}
+# cache the responses of the auxiliary LLM calls (citations, mindmaps, relevance
+# scores, conversation names, follow-up and rewritten questions) on disk, so the
+# same request is not sent again. Enabled with KH_LLM_CACHE, disabled when "path"
+# is None. Setting "similarity_threshold" (e.g. 0.98) also reuses the rewrites of
+# similar questions.
+KH_LLM_CACHE = {
+    "path": (
+        str(KH_USER_DATA_DIR / "llm_cache.db")
+        if config("KH_LLM_CACHE", default=False, cast=bool)
+        else None
+    ),
+    "ttl": config("KH_LLM_CACHE_TTL", default=7 * 24 * 3600, cast=int),
+    "max_entries": config("KH_LLM_CACHE_MAX_ENTRIES", default=100000, cast=int),
+    "similarity_threshold": None,
+}
 KH_LLMS = {}
 KH_EMBEDDINGS = {}
 KH_RERANKINGS = {}
@@ -315,6 +342,18 @@ KH_RERANKINGS["cohere"] = {
     },
     "default": True,
 }
+# in-process cross-encoder on CPU, e.g. KH_LOCAL_RERANKING=Xenova/bge-reranker-base
+if config("KH_LOCAL_RERANKING", default=""):
+    KH_RERANKINGS["local"] = {
+        "spec": {
+            "__type__": "kotaemon.rerankings.ONNXCrossEncoderReranking",
+            "model_name": config("KH_LOCAL_RERANKING", default=""),
+            "quantized": config(
+                "KH_LOCAL_RERANKING_QUANTIZED", default=True, cast=bool
+            ),
+        },
+        "default": False,
+    }
 
 KH_REASONINGS = [
     "ktem.reasoning.simple.FullQAPipeline",
@@ -323,6 +362,13 @@ KH_REASONINGS = [
     "ktem.reasoning.rewoo.RewooAgentPipeline",
 ]
 KH_REASONINGS_USE_MULTIMODAL = config("USE_MULTIMODAL", default=False, cast=bool)
+# seconds without tool calls before shutting down an MCP server session (0 to
+# keep the sessions open)
+KH_MCP_IDLE_TIMEOUT = config("KH_MCP_IDLE_TIMEOUT", default=600, cast=int)
+# the streamed answer is sent to the browser at most every this many seconds, or
+# when this many characters are pending (0 to send every chunk)
+KH_CHAT_STREAM_INTERVAL = config("KH_CHAT_STREAM_INTERVAL", default=0.1, cast=float)
+KH_CHAT_STREAM_MAX_CHARS = config("KH_CHAT_STREAM_MAX_CHARS", default=500, cast=int)
 KH_VLM_ENDPOINT = "{0}/openai/deployments/{1}/chat/completions?api-version={2}".format(
     config("AZURE_OPENAI_ENDPOINT", default=""),
     config("OPENAI_VISION_DEPLOYMENT_NAME", default="gpt-4o"),
@@ -367,6 +413,37 @@ if USE_NANO_GRAPHRAG:
 if USE_LIGHTRAG:
     GRAPHRAG_INDEX_TYPES.append("ktem.index.file.graph.LightRAGIndex")
 
+# overlap the loading, embedding and writing of the files when indexing several
+# of them, instead of indexing them one after the other
+FILE_INDEX_PIPELINE_PIPELINED = config("KH_INDEX_PIPELINED", default=False, cast=bool)
+# number of workers of each stage when indexing files: loading (conversion and
+# splitting), embedding, and writing to the doc store and vector store
+FILE_INDEX_PIPELINE_STAGE_WORKERS = {
+    "load": config("KH_INDEX_LOAD_WORKERS", default=1, cast=int),
+    "embed": config("KH_INDEX_EMBED_WORKERS", default=1, cast=int),
+    "write": 1,
+}
+# number of worker processes parsing the files when indexing (0 to parse them in
+# the indexing threads), large PDFs are split into tasks of this many pages
+FILE_INDEX_PIPELINE_PARSE_PROCESSES = config(
+    "KH_INDEX_PARSE_PROCESSES", default=0, cast=int
+)
+FILE_INDEX_PIPELINE_PDF_PAGES_PER_TASK = config(
+    "KH_INDEX_PDF_PAGES_PER_TASK", default=50, cast=int
+)
+# reuse the chunks and embeddings of an indexed file with the same content (e.g.
+# uploaded under another name, or by another user) instead of indexing it again
+FILE_INDEX_PIPELINE_DEDUP_CONTENT = config(
+    "KH_INDEX_DEDUP_CONTENT", default=False, cast=bool
+)
+# when reranking with the LLM relevance scores: number of documents graded by one
+# request (default 1 to grade them one by one, more to batch them), and number of
+# concurrent requests
+FILE_INDEX_PIPELINE_LLM_SCORING = {
+    "batch_size": config("KH_LLM_SCORING_BATCH_SIZE", default=1, cast=int),
+    "max_workers": config("KH_LLM_SCORING_MAX_WORKERS", default=4, cast=int),
+}
+
 KH_INDEX_TYPES = [
     "ktem.index.file.FileIndex",
     *GRAPHRAG_INDEX_TYPES,
@@ -1,8 +1,11 @@
 import logging
 import re
-from concurrent.futures import ThreadPoolExecutor
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from functools import partial
-from typing import Any
+from itertools import chain
+from typing import Any, Iterator, Optional
 
 import tiktoken
 
@@ -44,6 +47,23 @@ class RewooAgent(BaseAgent):
         help="Max context length for each tool output.",
     )
     trim_func: TokenSplitter | None = None
+    max_workers: Optional[int] = Param(
+        default=None,
+        help="Max number of tool calls running at the same time, None for the "
+        "default of ThreadPoolExecutor",
+    )
+    tool_concurrency: dict[str, int] = Param(
+        default_callback=lambda _: {},
+        help="Max number of concurrent calls of each tool, by tool name",
+    )
+    tool_timeout: Optional[float] = Param(
+        default=None,
+        help="Seconds to wait for a tool call before giving up on its evidence",
+    )
+    tool_timeouts: dict[str, float] = Param(
+        default_callback=lambda _: {},
+        help="Timeout of specific tools, by tool name, overriding `tool_timeout`",
+    )
 
     @Node.auto(depends_on=["planner_llm", "plugins", "prompt_template", "examples"])
     def planner(self):
@@ -107,19 +127,20 @@ class RewooAgent(BaseAgent):
 
     def _parse_planner_evidences(
         self, planner_response: str
-    ) -> tuple[dict[str, str], list[list[str]]]:
+    ) -> tuple[dict[str, str], dict[str, list[str]]]:
         """
         Parse planner output. This should return a mapping from #E to tool call.
-        It should also identify the level of each #E in dependency map.
+        It should also identify the #Es that each #E depends on.
         Example:
             {
-            "#E1": "Tool1", "#E2": "Tool2",
-            "#E3": "Tool3", "#E4": "Tool4"
-            }, [[#E1, #E2], [#E3, #E4]]
+            "#E1": "Tool1", "#E2": "Tool2[#E1]",
+            "#E3": "Tool3", "#E4": "Tool4[#E2, #E3]"
+            }, {"#E1": [], "#E2": ["#E1"], "#E3": [], "#E4": ["#E2", "#E3"]}
 
         Returns:
-            tuple[dict[str, str], List[List[str]]]:
-            A mapping from #E to tool call and a list of levels.
+            tuple[dict[str, str], dict[str, list[str]]]:
+            A mapping from #E to tool call and a mapping from #E to its
+            dependencies. #Es without dependency entry are not to be run.
         """
         evidences: dict[str, str] = dict()
         dependence: dict[str, list[str]] = dict()
@@ -131,24 +152,13 @@ class RewooAgent(BaseAgent):
                     dependence[e] = []
                     evidences[e] = tool_call
                     for var in re.findall(r"#E\d+", tool_call):
-                        if var in evidences:
+                        # only earlier #Es can be referred to, so there is no cycle
+                        if var in evidences and var != e:
                             dependence[e].append(var)
                 else:
                     evidences[e] = "No evidence found"
-        level = []
-        while dependence:
-            select = [i for i in dependence if not dependence[i]]
-            if len(select) == 0:
-                raise ValueError("Circular dependency detected.")
-            level.append(select)
-            for item in select:
-                dependence.pop(item)
-            for item in dependence:
-                for i in select:
-                    if i in dependence[item]:
-                        dependence[item].remove(i)
-
-        return evidences, level
+
+        return evidences, dependence
 
     def _run_plugin(
         self,
@@ -160,6 +170,8 @@ class RewooAgent(BaseAgent):
         """
         Run a plugin for a given evidence.
         This function should also cumulate the cost and tokens.
+
+        `worker_evidences` only needs to hold the evidences that `e` depends on.
         """
         result = dict(e=e, plugin_cost=0, plugin_token=0, evidence="")
         tool_call = planner_evidences[e]
@@ -170,9 +182,6 @@ class RewooAgent(BaseAgent):
             tool_input = tool_input[:-1]
             # find variables in input and replace with previous evidences
             for var in re.findall(r"#E\d+", tool_input):
-                print("Tool input: ", tool_input)
-                print("Var: ", var)
-                print("Worker evidences: ", worker_evidences)
                 if var in worker_evidences:
                     tool_input = tool_input.replace(
                         var, worker_evidences.get(var, "") or ""
@@ -191,10 +200,128 @@ class RewooAgent(BaseAgent):
                 )
         return result
 
+    def _tool_name(self, tool_call: str) -> Optional[str]:
+        if "[" not in tool_call:
+            return None
+        return tool_call.split("[", 1)[0]
+
+    def _iter_worker_evidence(
+        self,
+        planner_evidences: dict[str, str],
+        dependencies: dict[str, list[str]],
+        output=BaseScratchPad(),
+    ) -> Iterator[dict]:
+        """
+        Run the plugins as a DAG, and yield their results as they complete.
+
+        Each #E starts as soon as the #Es it depends on are resolved, rather than
+        waiting for a whole level of the DAG, so the latency is the one of the
+        critical path. The number of concurrent calls of a tool is limited by
+        `tool_concurrency`. A call running for longer than its timeout is given
+        up on (the thread is left to finish in the background) and resolves to
+        "No evidence found.", so that the #Es depending on it can proceed.
+
+        Args:
+            planner_evidences: A mapping from #E to tool call.
+            dependencies: A mapping from #E to the #Es it depends on, #Es not in
+                it resolve to their planner evidence.
+            output: Output object, defaults to BaseOutput().
+
+        Yields:
+            The result of each #E, as returned by `_run_plugin`, with its
+            evidence trimmed.
+        """
+        worker_evidences: dict[str, str] = dict()
+        waiting = {e: set(deps) for e, deps in dependencies.items()}
+        running: dict[Future, tuple[str, Optional[float]]] = dict()
+        # the timed out calls keep the slot of their tool until their thread ends
+        timed_out: dict[Future, Optional[str]] = dict()
+        running_tools: Counter = Counter()
+
+        def resolve(result: dict) -> dict:
+            e = result["e"]
+            result["evidence"] = self._trim_evidence(result["evidence"])
+            worker_evidences[e] = result["evidence"]
+            for deps in waiting.values():
+                deps.discard(e)
+            return result
+
+        for e, tool_call in planner_evidences.items():
+            if e not in waiting:
+                yield resolve(
+                    dict(e=e, plugin_cost=0, plugin_token=0, evidence=tool_call)
+                )
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while waiting or running:
+                # start the #Es whose dependencies are resolved, in plan order
+                for e in [e for e, deps in waiting.items() if not deps]:
+                    tool = self._tool_name(planner_evidences[e])
+                    limit = self.tool_concurrency.get(tool or "")
+                    if limit and running_tools[tool] >= limit:
+                        continue
+
+                    waiting.pop(e)
+                    running_tools[tool] += 1
+                    timeout = self.tool_timeouts.get(tool or "", self.tool_timeout)
+                    deadline = time.monotonic() + timeout if timeout else None
+                    output.update_status(f"Running task {e}.")
+                    future = pool.submit(
+                        self._run_plugin,
+                        e,
+                        planner_evidences,
+                        {dep: worker_evidences[dep] for dep in dependencies[e]},
+                        output,
+                    )
+                    running[future] = (e, deadline)
+
+                if not running and not timed_out:
+                    raise ValueError("Circular dependency detected.")
+
+                deadlines = [d for _, d in running.values() if d is not None]
+                done, _ = wait(
+                    [*running, *timed_out],
+                    timeout=(
+                        max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                    ),
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done & timed_out.keys():
+                    running_tools[timed_out.pop(future)] -= 1
+
+                now = time.monotonic()
+                for future in list(running):
+                    e, deadline = running[future]
+                    tool = self._tool_name(planner_evidences[e])
+                    if future in done:
+                        result = future.result()
+                        running_tools[tool] -= 1
+                    elif deadline is not None and now >= deadline:
+                        logging.warning(f"Tool call of {e} timed out")
+                        if future.cancel():
+                            running_tools[tool] -= 1
+                        else:
+                            timed_out[future] = tool
+                        result = dict(
+                            e=e,
+                            plugin_cost=0,
+                            plugin_token=0,
+                            evidence="No evidence found.",
+                        )
+                    else:
+                        continue
+
+                    running.pop(future)
+                    yield resolve(result)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            output.done()
+
     def _get_worker_evidence(
         self,
         planner_evidences: dict[str, str],
-        evidences_level: list[list[str]],
+        dependencies: dict[str, list[str]],
         output=BaseScratchPad(),
     ) -> Any:
         """
@@ -203,37 +330,17 @@ class RewooAgent(BaseAgent):
 
         Args:
             planner_evidences: A mapping from #E to tool call.
-            evidences_level: A list of levels of evidences.
-                Calculated from DAG of plugin calls.
+            dependencies: A mapping from #E to the #Es it depends on.
             output: Output object, defaults to BaseOutput().
         Returns:
             A mapping from #E to tool call.
         """
         worker_evidences: dict[str, str] = dict()
         plugin_cost, plugin_token = 0.0, 0.0
-        with ThreadPoolExecutor() as pool:
-            for level in evidences_level:
-                results = []
-                for e in level:
-                    results.append(
-                        pool.submit(
-                            self._run_plugin,
-                            e,
-                            planner_evidences,
-                            worker_evidences,
-                            output,
-                        )
-                    )
-                if len(results) > 1:
-                    output.update_status(f"Running tasks {level} in parallel.")
-                else:
-                    output.update_status(f"Running task {level[0]}.")
-                for r in results:
-                    resp = r.result()
-                    plugin_cost += resp["plugin_cost"]
-                    plugin_token += resp["plugin_token"]
-                    worker_evidences[resp["e"]] = self._trim_evidence(resp["evidence"])
-                output.done()
+        for resp in self._iter_worker_evidence(planner_evidences, dependencies, output):
+            plugin_cost += resp["plugin_cost"]
+            plugin_token += resp["plugin_token"]
+            worker_evidences[resp["e"]] = resp["evidence"]
 
         return worker_evidences, plugin_cost, plugin_token
 
@@ -276,13 +383,13 @@ class RewooAgent(BaseAgent):
         planner_output = self.planner(instruction)
         planner_text_output = planner_output.text
         plan_to_es, plans = self._parse_plan_map(planner_text_output)
-        planner_evidences, evidence_level = self._parse_planner_evidences(
+        planner_evidences, dependencies = self._parse_planner_evidences(
             planner_text_output
         )
 
         # Work
         worker_evidences, plugin_cost, plugin_token = self._get_worker_evidence(
-            planner_evidences, evidence_level
+            planner_evidences, dependencies
         )
         worker_log = ""
         for plan in plan_to_es:
@@ -321,7 +428,7 @@ class RewooAgent(BaseAgent):
         planner_output = self.planner(instruction)
         planner_text_output = planner_output.text
         plan_to_es, plans = self._parse_plan_map(planner_text_output)
-        planner_evidences, evidence_level = self._parse_planner_evidences(
+        planner_evidences, dependencies = self._parse_planner_evidences(
             planner_text_output
         )
 
@@ -334,27 +441,51 @@ class RewooAgent(BaseAgent):
             intermediate_steps=[{"planner_log": planner_text_output}],
         )
 
-        # Work
-        worker_evidences, plugin_cost, plugin_token = self._get_worker_evidence(
-            planner_evidences, evidence_level
-        )
-        worker_log = ""
-        for plan in plan_to_es:
-            worker_log += f"{plan}: {plans[plan]}\n"
-            current_progress = f"{plan}: {plans[plan]}\n"
+        # Work, output each plan to the info panel as soon as its evidences are
+        # all resolved
+        worker_evidences: dict[str, str] = dict()
+        pending_plans = list(plan_to_es)
+
+        def plan_log(plan: str) -> str:
+            log = f"{plan}: {plans[plan]}\n"
             for e in plan_to_es[plan]:
-                worker_log += f"#Action: {planner_evidences.get(e, None)}\n"
-                worker_log += f"{e}: {worker_evidences[e]}\n"
-                current_progress += f"#Action: {planner_evidences.get(e, None)}\n"
-                current_progress += f"{e}: {worker_evidences[e]}\n"
+                log += f"#Action: {planner_evidences.get(e, None)}\n"
+                log += f"{e}: {worker_evidences.get(e)}\n"
+            return log
+
+        def completed_plans() -> list[str]:
+            completed = [
+                plan
+                for plan in pending_plans
+                if all(e in worker_evidences for e in plan_to_es[plan])
+            ]
+            for plan in completed:
+                pending_plans.remove(plan)
+            return completed
+
+        results = self._iter_worker_evidence(planner_evidences, dependencies)
+        for resp in chain([None], results):
+            if resp is not None:
+                worker_evidences[resp["e"]] = resp["evidence"]
+            for plan in completed_plans():
+                yield AgentOutput(
+                    text="",
+                    agent_type=self.agent_type,
+                    status="thinking",
+                    intermediate_steps=[{"worker_log": plan_log(plan)}],
+                )
 
+        # plans referring to #Es that the planner did not define
+        for plan in pending_plans:
             yield AgentOutput(
                 text="",
                 agent_type=self.agent_type,
                 status="thinking",
-                intermediate_steps=[{"worker_log": current_progress}],
+                intermediate_steps=[{"worker_log": plan_log(plan)}],
             )
 
+        worker_log = "".join(plan_log(plan) for plan in plan_to_es)
+
         # Solve
         solver_response = ""
         for solver_output in self.solver.stream(instruction, worker_log):
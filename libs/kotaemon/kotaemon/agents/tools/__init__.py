@@ -2,6 +2,7 @@ from .base import BaseTool, ComponentTool
 from .google import GoogleSearchTool
 from .llm import LLMTool
 from .mcp import (
+    MCPSessionPool,
     MCPTool,
     build_args_model,
     create_tools_from_config,
@@ -18,6 +19,7 @@ __all__ = [
     "WikipediaTool",
     "LLMTool",
     "MCPTool",
+    "MCPSessionPool",
     "build_args_model",
     "create_tools_from_config",
     "discover_tools_info",
@@ -5,15 +5,21 @@ so MCP tools can be seamlessly used by ReAct/ReWOO agents.
 
 This module contains:
 - MCPTool: BaseTool wrapper for individual MCP server tools
+- MCPSessionPool: long-lived sessions to the MCP servers, shared by the tools
 - Tool discovery/creation functions for building MCPTool instances from config
 - Config parsing utilities
 """
 
 import asyncio
+import atexit
 import json
 import logging
 import shlex
-from typing import Any, Optional, Type
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Coroutine, Optional, Type
 
 from pydantic import BaseModel, Field, create_model
 
@@ -99,7 +105,9 @@ def parse_mcp_config(config: dict) -> dict:
 # ---------------------------------------------------------------------------
 
 
-def _make_tool(parsed: dict, tool_info: Any) -> "MCPTool":
+def _make_tool(
+    parsed: dict, tool_info: Any, session_pool: Optional["MCPSessionPool"] = None
+) -> "MCPTool":
     """Build an MCPTool from MCP tool info."""
     input_schema = tool_info.inputSchema if hasattr(tool_info, "inputSchema") else {}
     args_model = (
@@ -115,39 +123,44 @@ def _make_tool(parsed: dict, tool_info: Any) -> "MCPTool":
         server_args=parsed.get("args", []),
         server_env=parsed.get("env", {}),
         mcp_tool_name=tool_info.name,
+        session_pool=session_pool,
     )
 
 
-async def _async_discover_tools(parsed: dict) -> list["MCPTool"]:
-    """Async: connect to an MCP server and return MCPTool wrappers."""
+@asynccontextmanager
+async def _open_session(parsed: dict) -> AsyncIterator[Any]:
+    """Connect to an MCP server and yield its initialised ClientSession."""
     from mcp import ClientSession
     from mcp.client.sse import sse_client
     from mcp.client.stdio import StdioServerParameters, stdio_client
 
-    tools: list[MCPTool] = []
     transport = parsed["transport"]
-
     if transport == "stdio":
         server_params = StdioServerParameters(
             command=parsed["command"],
             args=parsed.get("args", []),
             env=parsed.get("env") or None,
         )
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.list_tools()
-                for tool_info in result.tools:
-                    tools.append(_make_tool(parsed, tool_info))
+        client = stdio_client(server_params)
     elif transport == "sse":
-        async with sse_client(url=parsed["command"]) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.list_tools()
-                for tool_info in result.tools:
-                    tools.append(_make_tool(parsed, tool_info))
+        client = sse_client(url=parsed["command"])
+    else:
+        raise ValueError(f"Unsupported transport: {transport}")
+
+    async with client as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            yield session
 
-    return tools
+
+async def _async_discover_tools(parsed: dict) -> list["MCPTool"]:
+    """Async: connect to an MCP server and return MCPTool wrappers."""
+    if parsed["transport"] not in ("stdio", "sse"):
+        return []
+
+    async with _open_session(parsed) as session:
+        result = await session.list_tools()
+        return [_make_tool(parsed, tool_info) for tool_info in result.tools]
 
 
 def _run_async(coro: Any) -> Any:
@@ -168,6 +181,7 @@ def _run_async(coro: Any) -> Any:
 def create_tools_from_config(
     config: dict,
     enabled_tools: Optional[list[str]] = None,
+    session_pool: Optional["MCPSessionPool"] = None,
 ) -> list["MCPTool"]:
     """Create MCPTool instances from an MCP server config dict.
 
@@ -175,12 +189,21 @@ def create_tools_from_config(
         config: MCP server JSON config with keys like transport, command, etc.
         enabled_tools: If provided, only return tools whose names are in this
             list.  If ``None`` or empty, return all discovered tools.
+        session_pool: If provided, discover the tools with the pool's cached
+            tool list, and make the tools call the server through its
+            persistent session instead of connecting on every call.
 
     Returns:
         List of MCPTool instances ready for use by agents.
     """
     parsed = parse_mcp_config(config)
-    tools = _run_async(_async_discover_tools(parsed))
+    if session_pool is not None:
+        tools = [
+            _make_tool(parsed, tool_info, session_pool)
+            for tool_info in session_pool.list_tools(parsed)
+        ]
+    else:
+        tools = _run_async(_async_discover_tools(parsed))
 
     if enabled_tools:
         tools = [t for t in tools if t.mcp_tool_name in enabled_tools]
@@ -194,45 +217,19 @@ async def async_discover_tools_info(config: dict) -> list[dict]:
     Returns a list of dicts with keys: name, description.
     Useful for UI display without instantiating full MCPTool objects.
     """
-    from mcp import ClientSession
-    from mcp.client.sse import sse_client
-    from mcp.client.stdio import StdioServerParameters, stdio_client
-
     parsed = parse_mcp_config(config)
-    transport = parsed["transport"]
-    tool_infos: list[dict] = []
+    if parsed["transport"] not in ("stdio", "sse"):
+        return []
 
-    if transport == "stdio":
-        server_params = StdioServerParameters(
-            command=parsed["command"],
-            args=parsed.get("args", []),
-            env=parsed.get("env") or None,
-        )
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.list_tools()
-                for t in result.tools:
-                    tool_infos.append(
-                        {
-                            "name": t.name,
-                            "description": t.description or "",
-                        }
-                    )
-    elif transport == "sse":
-        async with sse_client(url=parsed["command"]) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-                result = await session.list_tools()
-                for t in result.tools:
-                    tool_infos.append(
-                        {
-                            "name": t.name,
-                            "description": t.description or "",
-                        }
-                    )
-
-    return tool_infos
+    async with _open_session(parsed) as session:
+        result = await session.list_tools()
+        return [
+            {
+                "name": t.name,
+                "description": t.description or "",
+            }
+            for t in result.tools
+        ]
 
 
 def discover_tools_info(config: dict) -> list[dict]:
@@ -274,6 +271,236 @@ def format_tool_list(
     return "".join(lines)
 
 
+# ---------------------------------------------------------------------------
+# Persistent sessions
+# ---------------------------------------------------------------------------
+
+
+class _MCPServer:
+    """State of the connection to one MCP server, only used in the pool loop."""
+
+    def __init__(self, parsed: dict):
+        self.parsed = parsed
+        self.session: Any = None
+        self.tools: Optional[list] = None
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self.lock = asyncio.Lock()
+        self.stop = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.session is not None and self.task is not None and not self.task.done()
+        )
+
+
+class MCPSessionPool:
+    """Keep one initialised session per MCP server, shared by all the tool calls
+
+    Connecting to an MCP server means spawning its process (stdio) or opening a
+    connection (SSE), then running the initialisation handshake. The pool does
+    it once per server: the sessions live on a background event loop, where the
+    concurrent calls from any thread are multiplexed over the same session. The
+    tool lists are cached until `invalidate`, servers that crashed are restarted
+    on the next call, and servers without calls for `idle_timeout` seconds are
+    shut down (and started again when needed).
+
+    Args:
+        idle_timeout: seconds without calls before shutting a server down, 0 to
+            keep the servers running
+        start_timeout: seconds to wait for a server to start and initialise
+    """
+
+    def __init__(self, idle_timeout: float = 600, start_timeout: float = 60):
+        self.idle_timeout = idle_timeout
+        self.start_timeout = start_timeout
+        self._servers: dict[str, _MCPServer] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(parsed: dict) -> str:
+        """Identify a server by its parsed config"""
+        return json.dumps(parsed, sort_keys=True)
+
+    # -- background loop ---------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, name="mcp-sessions", daemon=True
+                )
+                self._thread.start()
+                self._loop = loop
+                if self.idle_timeout:
+                    asyncio.run_coroutine_threadsafe(self._reap_idle(), loop)
+                atexit.register(self.close)
+            return self._loop
+
+    def _submit(self, coro: Coroutine) -> Future:
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Cannot wait for the MCP session pool from its loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    # -- server lifecycle (in the background loop) -------------------------
+
+    async def _serve(self, server: _MCPServer, ready: asyncio.Future):
+        """Hold the server session open until it is stopped or it fails"""
+        try:
+            async with _open_session(server.parsed) as session:
+                server.session = session
+                if not ready.done():
+                    ready.set_result(session)
+                await server.stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning(f"MCP server {server.parsed['command']} stopped: {e}")
+        finally:
+            server.session = None
+            if not ready.done():
+                ready.set_exception(RuntimeError("MCP server stopped while starting"))
+
+    async def _start(self, server: _MCPServer):
+        async with server.lock:
+            if server.alive:
+                return
+            server.stop = asyncio.Event()
+            ready = asyncio.get_running_loop().create_future()
+            server.task = asyncio.create_task(self._serve(server, ready))
+            try:
+                await asyncio.wait_for(ready, timeout=self.start_timeout)
+            except BaseException:
+                server.stop.set()
+                raise
+
+    async def _stop(self, server: _MCPServer):
+        server.stop.set()
+        if server.task is not None:
+            try:
+                await asyncio.wait_for(server.task, timeout=self.start_timeout)
+            except Exception as e:
+                logger.warning(f"Failed to stop MCP server cleanly: {e}")
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout / 2, 30))
+            now = time.monotonic()
+            for server in list(self._servers.values()):
+                if (
+                    server.alive
+                    and not server.in_flight
+                    and now - server.last_used > self.idle_timeout
+                ):
+                    logger.info(f"Stop idle MCP server {server.parsed['command']}")
+                    await self._stop(server)
+
+    async def _request(self, parsed: dict, method: str, *args: Any) -> Any:
+        """Send the request over the server session, restarting it if needed"""
+        key = self.key(parsed)
+        if key not in self._servers:
+            self._servers[key] = _MCPServer(parsed)
+        server = self._servers[key]
+
+        server.in_flight += 1
+        try:
+            for attempt in range(2):
+                if not server.alive:
+                    await self._start(server)
+                try:
+                    return await getattr(server.session, method)(*args)
+                except Exception:
+                    # let the session notice that its server is gone
+                    await asyncio.sleep(0)
+                    if attempt or server.alive:
+                        raise
+                    logger.warning(
+                        f"MCP server {parsed['command']} crashed, restarting it"
+                    )
+        finally:
+            server.in_flight -= 1
+            server.last_used = time.monotonic()
+
+    async def _list_tools(self, parsed: dict, refresh: bool) -> list:
+        server = self._servers.get(self.key(parsed))
+        if not refresh and server is not None and server.tools is not None:
+            return server.tools
+
+        result = await self._request(parsed, "list_tools")
+        server = self._servers.get(self.key(parsed))
+        if server is not None:
+            server.tools = result.tools
+        return result.tools
+
+    async def _invalidate(self, key: Optional[str]):
+        keys = list(self._servers) if key is None else [key]
+        for each in keys:
+            server = self._servers.pop(each, None)
+            if server is not None:
+                await self._stop(server)
+
+    async def _shutdown(self):
+        await self._invalidate(None)
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # -- public API --------------------------------------------------------
+
+    def list_tools(self, parsed: dict, refresh: bool = False) -> list:
+        """Get the tool infos of the server, cached after the first call"""
+        return self._submit(self._list_tools(parsed, refresh)).result()
+
+    def call_tool(self, parsed: dict, name: str, arguments: dict) -> Any:
+        """Call a tool of the server and return its CallToolResult"""
+        future = self._submit(self._request(parsed, "call_tool", name, arguments))
+        return future.result()
+
+    async def acall_tool(self, parsed: dict, name: str, arguments: dict) -> Any:
+        """Call a tool of the server from any event loop"""
+        return await asyncio.wrap_future(
+            self._submit(self._request(parsed, "call_tool", name, arguments))
+        )
+
+    def invalidate(self, config: Optional[dict] = None):
+        """Shut down the server of the config (all if None) and drop its cache
+
+        Args:
+            config: the raw MCP server config, as stored by the user
+        """
+        if self._loop is None:
+            return
+        key = None if config is None else self.key(parse_mcp_config(config))
+        self._submit(self._invalidate(key)).result()
+
+    def close(self):
+        """Shut down all the servers and the background loop"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+        if loop is None or not loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(
+                timeout=self.start_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Failed to close the MCP sessions: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=self.start_timeout)
+        with self._lock:
+            self._loop = self._thread = None
+
+
 # ---------------------------------------------------------------------------
 # MCPTool class
 # ---------------------------------------------------------------------------
@@ -311,58 +538,60 @@ class MCPTool(BaseTool):
     # The original MCP tool name (on the server)
     mcp_tool_name: str = ""
 
+    # Persistent sessions to call the server with, a new session is opened for
+    # every call if not set
+    session_pool: Optional[MCPSessionPool] = None
+
     def _run_tool(self, *args: Any, **kwargs: Any) -> str:
         """Invoke the MCP tool by establishing a session."""
+        if self.session_pool is not None and self.server_transport in ("stdio", "sse"):
+            result = self.session_pool.call_tool(
+                self._parsed_config(), self.mcp_tool_name, self._tool_args(args, kwargs)
+            )
+            return self._format_result(result)
         return _run_async(self._arun_tool(*args, **kwargs))
 
     async def _arun_tool(self, *args: Any, **kwargs: Any) -> str:
         """Async implementation that connects to the MCP server and calls
         the tool."""
-        from mcp import ClientSession
-        from mcp.client.sse import sse_client
-        from mcp.client.stdio import StdioServerParameters, stdio_client
+        if self.server_transport not in ("stdio", "sse"):
+            return f"Unsupported transport: {self.server_transport}"
 
-        # Build tool arguments
+        tool_args = self._tool_args(args, kwargs)
+        if self.session_pool is not None:
+            result = await self.session_pool.acall_tool(
+                self._parsed_config(), self.mcp_tool_name, tool_args
+            )
+            return self._format_result(result)
+
+        async with _open_session(self._parsed_config()) as session:
+            result = await session.call_tool(self.mcp_tool_name, tool_args)
+            return self._format_result(result)
+
+    def _parsed_config(self) -> dict:
+        """The server config, as returned by parse_mcp_config"""
+        return parse_mcp_config(
+            {
+                "transport": self.server_transport,
+                "command": self.server_command,
+                "url": self.server_command,
+                "args": self.server_args,
+                "env": self.server_env,
+            }
+        )
+
+    def _tool_args(self, args: tuple, kwargs: dict) -> dict:
+        """Build the tool arguments from the agent input"""
         if args and isinstance(args[0], str):
             try:
-                tool_args = json.loads(args[0])
+                return json.loads(args[0])
             except json.JSONDecodeError:
                 # If not JSON, assume single string argument
                 if self.args_schema:
                     first_field = next(iter(self.args_schema.model_fields.keys()))
-                    tool_args = {first_field: args[0]}
-                else:
-                    tool_args = {"input": args[0]}
-        else:
-            tool_args = kwargs
-
-        if self.server_transport == "stdio":
-            cmd = self.server_command
-            cmd_args = self.server_args
-            # Auto-split if full command string with no separate args
-            if not cmd_args and " " in cmd:
-                parts = shlex.split(cmd)
-                cmd = parts[0]
-                cmd_args = parts[1:]
-
-            server_params = StdioServerParameters(
-                command=cmd,
-                args=cmd_args,
-                env=self.server_env if self.server_env else None,
-            )
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.call_tool(self.mcp_tool_name, tool_args)
-                    return self._format_result(result)
-        elif self.server_transport == "sse":
-            async with sse_client(url=self.server_command) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.call_tool(self.mcp_tool_name, tool_args)
-                    return self._format_result(result)
-        else:
-            return f"Unsupported transport: {self.server_transport}"
+                    return {first_field: args[0]}
+                return {"input": args[0]}
+        return kwargs
 
     def _format_result(self, result: Any) -> str:
         """Format MCP CallToolResult into a string."""
@@ -0,0 +1,167 @@
+"""Process-wide registry of API clients with pooled HTTP connections
+
+Creating an `openai.OpenAI` client creates a new HTTP connection pool, so creating
+one per request pays a new TCP + TLS handshake every time. The models get their
+clients from this registry instead, which keeps one client per endpoint and
+credentials, and reuses its keep-alive connections across requests.
+
+The pool limits are configured with the environment variables:
+    - KH_HTTP_MAX_CONNECTIONS: maximum number of connections per client
+    - KH_HTTP_MAX_KEEPALIVE_CONNECTIONS: maximum number of idle connections kept
+    - KH_HTTP_KEEPALIVE_EXPIRY: seconds before closing an idle connection
+    - KH_HTTP2: use HTTP/2 when the endpoint supports it (needs the `h2` package)
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = config("KH_HTTP_MAX_CONNECTIONS", default=100, cast=int)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = config(
+    "KH_HTTP_MAX_KEEPALIVE_CONNECTIONS", default=20, cast=int
+)
+HTTP_KEEPALIVE_EXPIRY = config("KH_HTTP_KEEPALIVE_EXPIRY", default=30.0, cast=float)
+HTTP2 = config("KH_HTTP2", default=False, cast=bool)
+
+
+def _http2_available() -> bool:
+    if not HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("KH_HTTP2 is set but `h2` is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def _freeze(params: dict) -> Optional[Hashable]:
+    """Hashable key of the client parameters, None if they are not hashable"""
+    key = tuple(sorted(params.items()))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class ClientRegistry:
+    """Keep the API clients, so requests with the same parameters share them
+
+    Sync clients are shared by the whole process. Async clients are bound to the
+    event loop of their connections, so they are shared per event loop and
+    dropped with it.
+
+    A dropped sync client may still be serving a request in another thread, so
+    it isn't closed right away: the HTTP clients created by `openai_client` are
+    closed when their API client is garbage collected, i.e. once no request uses
+    it anymore.
+
+    Args:
+        max_size: maximum number of sync clients kept, the least recently used
+            ones are dropped first
+    """
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._clients: OrderedDict[Hashable, Any] = OrderedDict()
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[Hashable, Any]
+        ] = weakref.WeakKeyDictionary()
+        self._http2: Optional[bool] = None
+
+    def http_client_kwargs(self) -> dict:
+        """Connection pool settings of the HTTP clients"""
+        import httpx
+
+        if self._http2 is None:
+            self._http2 = _http2_available()
+
+        return {
+            "limits": httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            "http2": self._http2,
+        }
+
+    def get(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        async_version: bool = False,
+    ) -> Any:
+        """Get the client of the key, create it with `factory` if needed"""
+        if not async_version:
+            with self._lock:
+                if key in self._clients:
+                    self._clients.move_to_end(key)
+                    return self._clients[key]
+
+                client = self._clients[key] = factory()
+                if len(self._clients) > self.max_size:
+                    self._clients.popitem(last=False)
+                return client
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # no loop to bind the client to
+            return factory()
+
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            if key not in clients:
+                clients[key] = factory()
+            return clients[key]
+
+    def clear(self):
+        """Drop all the clients"""
+        with self._lock:
+            self._clients.clear()
+            self._async_clients.clear()
+
+    def openai_client(self, client_cls: type, async_version: bool = False, **params):
+        """Get a shared client of the openai library
+
+        Args:
+            client_cls: the client class, e.g. `openai.OpenAI` or
+                `openai.AsyncAzureOpenAI`, matching `async_version`
+            async_version: whether the client is async
+            params: the parameters of the client
+        """
+        key = _freeze(params)
+        if key is None:
+            return client_cls(**params)
+
+        def factory():
+            import openai
+
+            http_client_cls = (
+                openai.DefaultAsyncHttpxClient
+                if async_version
+                else openai.DefaultHttpxClient
+            )
+            http_client = http_client_cls(**self.http_client_kwargs())
+            client = client_cls(http_client=http_client, **params)
+            if not async_version:
+                # close the connections once the client is dropped and unused
+                weakref.finalize(client, http_client.close)
+            return client
+
+        return self.get(
+            (client_cls.__module__, client_cls.__qualname__, key),
+            factory,
+            async_version=async_version,
+        )
+
+
+clients = ClientRegistry()
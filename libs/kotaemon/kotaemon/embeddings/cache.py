@@ -0,0 +1,351 @@
+"""Persistent on-disk cache for embedding models."""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from kotaemon.base import Document, DocumentWithEmbedding, Param
+
+from .base import BaseEmbeddings
+
+# parameters that do not change the produced embeddings, and should not leak
+# into the cache database
+_NON_IDENTITY_PARAMS = (
+    "key",
+    "token",
+    "secret",
+    "password",
+    "timeout",
+    "retries",
+    "batch",
+    "concurrency",
+    "per_minute",
+)
+
+
+def _identity_spec(spec: dict) -> dict:
+    return {
+        "function": spec.get("function"),
+        "params": {
+            name: value
+            for name, value in spec.get("params", {}).items()
+            if not any(word in name.lower() for word in _NON_IDENTITY_PARAMS)
+        },
+        "nodes": {
+            name: _identity_spec(node) for name, node in spec.get("nodes", {}).items()
+        },
+    }
+
+
+def embedding_model_identity(spec: dict) -> str:
+    """Return a stable identifier of an embedding model from its dumped spec
+
+    The identifier is derived from the class and the parameters of the model
+    (e.g. model name, dimensions, endpoint), ignoring credentials and transport
+    settings, so that two instances configured the same way share cache entries.
+    """
+    return hashlib.sha256(
+        json.dumps(_identity_spec(spec), sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class EmbeddingCacheStore:
+    """SQLite store of embedding vectors with size-based LRU eviction
+
+    Vectors are stored as float32 blobs keyed by a content hash. Once the total
+    size of the stored vectors exceeds `max_size_bytes`, the least recently
+    used entries are evicted until the size goes under `evict_ratio` of the
+    limit.
+
+    Args:
+        path: path of the SQLite database file
+        max_size_bytes: maximum size of the stored vectors, unlimited if None
+        evict_ratio: fraction of `max_size_bytes` to keep after an eviction
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_size_bytes: Optional[int] = None,
+        evict_ratio: float = 0.9,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.evict_ratio = evict_ratio
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, "
+            "model TEXT NOT NULL, "
+            "vector BLOB NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access "
+            "ON embeddings (last_access)"
+        )
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Return the cached vectors of the keys found in the store"""
+        found: dict[str, list[float]] = {}
+        if not keys:
+            return found
+
+        with self._lock:
+            # stay under SQLite's default limit of host parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+
+        return found
+
+    def set_many(self, items: list[tuple[str, str, list[float]]]):
+        """Store (key, model identity, vector) entries"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, model, vector in items:
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, model, blob, len(blob), now))
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings "
+                    "(key, model, vector, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._maybe_evict()
+
+    def size(self) -> int:
+        """Total size in bytes of the stored vectors"""
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+        ).fetchone()
+        return total
+
+    def count(self) -> int:
+        (total,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return total
+
+    def _maybe_evict(self):
+        if not self.max_size_bytes:
+            return
+
+        total = self.size()
+        if total <= self.max_size_bytes:
+            return
+
+        target = total - int(self.max_size_bytes * self.evict_ratio)
+        rows = self._conn.execute(
+            "SELECT key, size FROM embeddings ORDER BY last_access"
+        )
+        evicted, freed = [], 0
+        for key, size in rows:
+            if freed >= target:
+                break
+            evicted.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(BaseEmbeddings):
+    """Wrap an embedding model with a persistent cache of the computed vectors
+
+    Each text is keyed by the identity of the wrapped model (class and
+    configuration, including the output dimensions) and the SHA-256 of its
+    content, so re-indexing the same corpus or embedding duplicated chunks only
+    calls the wrapped model for texts that were never embedded before.
+
+    Example:
+        ```python
+        embedding = CachedEmbeddings(
+            embedding=OpenAIEmbeddings(model="text-embedding-3-small", api_key="..."),
+            cache_path="./embedding_cache.db",
+        )
+        ```
+    """
+
+    embedding: BaseEmbeddings
+    cache_path: str = Param(
+        "embedding_cache.db", help="Path of the SQLite cache database"
+    )
+    max_size_bytes: Optional[int] = Param(
+        1024 * 1024 * 1024,
+        help="Maximum size of the cached vectors, unlimited if None",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hits = 0
+        self._misses = 0
+        self._counter_lock = threading.Lock()
+        self._store: Optional[EmbeddingCacheStore] = None
+        self._model_identity: Optional[str] = None
+
+    @property
+    def cache_store(self) -> EmbeddingCacheStore:
+        if self._store is None:
+            self._store = EmbeddingCacheStore(
+                self.cache_path, max_size_bytes=self.max_size_bytes
+            )
+        return self._store
+
+    @property
+    def model_identity(self) -> str:
+        if self._model_identity is None:
+            self._model_identity = embedding_model_identity(
+                self.dump()["nodes"]["embedding"]
+            )
+        return self._model_identity
+
+    @property
+    def hits(self) -> int:
+        """Number of texts served from the cache"""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """Number of texts sent to the wrapped embedding model"""
+        return self._misses
+
+    def stats(self) -> dict:
+        """Return the cache statistics"""
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0,
+            "entries": self.cache_store.count(),
+            "size_bytes": self.cache_store.size(),
+        }
+
+    def reset_stats(self):
+        with self._counter_lock:
+            self._hits = 0
+            self._misses = 0
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8", errors="surrogatepass"))
+        return f"{self.model_identity}:{digest.hexdigest()}"
+
+    def _lookup(
+        self, docs: list[Document]
+    ) -> tuple[list[str], list[Optional[DocumentWithEmbedding]], list[int]]:
+        keys = [self._key(doc.text or "") for doc in docs]
+        cached = self.cache_store.get_many(list(set(keys)))
+        output: list[Optional[DocumentWithEmbedding]] = []
+        missing = []
+        for idx, (doc, key) in enumerate(zip(docs, keys)):
+            if key in cached:
+                output.append(DocumentWithEmbedding(embedding=cached[key], content=doc))
+            else:
+                output.append(None)
+                missing.append(idx)
+
+        with self._counter_lock:
+            self._hits += len(docs) - len(missing)
+            self._misses += len(missing)
+
+        return keys, output, missing
+
+    def _fill(
+        self,
+        keys: list[str],
+        output: list[Optional[DocumentWithEmbedding]],
+        missing: list[int],
+        computed: list[DocumentWithEmbedding],
+    ) -> list[DocumentWithEmbedding]:
+        if len(computed) != len(missing):
+            raise ValueError(
+                f"Expected {len(missing)} embeddings from {self.embedding}, "
+                f"got {len(computed)}"
+            )
+
+        to_store = {}
+        for idx, doc in zip(missing, computed):
+            output[idx] = doc
+            to_store[keys[idx]] = (keys[idx], self.model_identity, doc.embedding)
+        self.cache_store.set_many(list(to_store.values()))
+
+        return output  # type: ignore[return-value]
+
+    def _unique_missing(
+        self, keys: list[str], docs: list[Document], missing: list[int]
+    ) -> tuple[list[Document], list[int]]:
+        """Only embed once the texts duplicated within the same call"""
+        first: dict[str, int] = {}
+        unique_docs, positions = [], []
+        for idx in missing:
+            if keys[idx] not in first:
+                first[keys[idx]] = len(unique_docs)
+                unique_docs.append(docs[idx])
+            positions.append(first[keys[idx]])
+        return unique_docs, positions
+
+    def invoke(
+        self, text: str | list[str] | Document | list[Document], *args, **kwargs
+    ) -> list[DocumentWithEmbedding]:
+        docs = self.prepare_input(text)
+        keys, output, missing = self._lookup(docs)
+        if not missing:
+            return output  # type: ignore[return-value]
+
+        unique_docs, positions = self._unique_missing(keys, docs, missing)
+        computed = self.embedding(unique_docs, *args, **kwargs)
+        return self._fill(keys, output, missing, [computed[i] for i in positions])
+
+    async def ainvoke(
+        self, text: str | list[str] | Document | list[Document], *args, **kwargs
+    ) -> list[DocumentWithEmbedding]:
+        docs = self.prepare_input(text)
+        keys, output, missing = self._lookup(docs)
+        if not missing:
+            return output  # type: ignore[return-value]
+
+        unique_docs, positions = self._unique_missing(keys, docs, missing)
+        computed = await self.embedding.ainvoke(unique_docs, *args, **kwargs)
+        return self._fill(keys, output, missing, [computed[i] for i in positions])
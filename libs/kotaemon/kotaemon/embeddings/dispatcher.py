@@ -0,0 +1,250 @@
+"""Split embedding requests into batches and send them concurrently."""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Hashable, Optional, Sequence, TypeVar
+
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper estimate of the number of tokens of a text
+
+    Byte-pair tokenizers produce roughly one token per 4 bytes of English text,
+    and about one token per character of CJK text (3 bytes in UTF-8), so 3 bytes
+    per token rarely under-estimates the real count.
+    """
+    return len(text.encode("utf-8", errors="ignore")) // 3 + 1
+
+
+def plan_batches(
+    sizes: Sequence[int], max_batch_size: int, max_batch_tokens: Optional[int] = None
+) -> list[tuple[int, int]]:
+    """Group consecutive items into batches
+
+    A batch is closed when adding the next item would exceed `max_batch_size`
+    items or `max_batch_tokens` tokens. An item larger than the token budget is
+    sent in its own batch.
+
+    Args:
+        sizes: token count of each item
+        max_batch_size: maximum number of items per batch
+        max_batch_tokens: maximum number of tokens per batch, unlimited if None
+
+    Returns:
+        list of (start, end) slices of the items
+    """
+    batches: list[tuple[int, int]] = []
+    start, tokens = 0, 0
+    for idx, size in enumerate(sizes):
+        if idx > start and (
+            idx - start >= max_batch_size
+            or (max_batch_tokens is not None and tokens + size > max_batch_tokens)
+        ):
+            batches.append((start, idx))
+            start, tokens = idx, 0
+        tokens += size
+    if start < len(sizes):
+        batches.append((start, len(sizes)))
+    return batches
+
+
+class RateLimiter:
+    """Space out the requests to stay under a number of requests per minute"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def _reserve(self) -> float:
+        """Reserve the next request slot and return the time to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.interval
+            return start - now
+
+    def wait(self):
+        if self.interval:
+            delay = self._reserve()
+            if delay > 0:
+                time.sleep(delay)
+
+    async def await_(self):
+        if self.interval:
+            delay = self._reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+class BatchDispatcher:
+    """Send batches of inputs to an embedding provider concurrently
+
+    The inputs are split with `plan_batches`, up to `max_concurrency` batches
+    are in flight at the same time, and each failed batch is retried on its own
+    with exponential backoff. The outputs are returned in the input order.
+
+    The concurrency and rate limits hold across the concurrent calls of `run`
+    (and the calls of `arun` in the same event loop), so the models should share
+    their dispatcher, see `shared_dispatcher`.
+
+    Args:
+        max_batch_size: maximum number of inputs per request
+        max_batch_tokens: maximum estimated tokens per request, unlimited if None
+        max_concurrency: maximum number of requests in flight
+        max_retries: number of attempts of each batch (1 to disable retrying)
+        requests_per_minute: request rate limit of the provider, if any
+        retry_on: predicate selecting the exceptions worth retrying
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 64,
+        max_batch_tokens: Optional[int] = None,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        requests_per_minute: Optional[float] = None,
+        retry_on: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(1, max_retries)
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.retry_on = retry_on or (lambda exc: True)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._async_slots: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        """The request slots of the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._async_slots:
+                self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+            return self._async_slots[loop]
+
+    def _batches(
+        self, items: Sequence[T], sizes: Optional[Sequence[int]]
+    ) -> list[tuple[int, int]]:
+        if sizes is None:
+            sizes = [1] * len(items)
+            return plan_batches(sizes, self.max_batch_size)
+        return plan_batches(sizes, self.max_batch_size, self.max_batch_tokens)
+
+    def _check_output(self, batch: Sequence, output: Sequence):
+        if len(output) != len(batch):
+            raise ValueError(
+                f"Expected {len(batch)} outputs for the batch, got {len(output)}"
+            )
+
+    def run(
+        self,
+        fn: Callable[[list[T]], Sequence[R]],
+        items: Sequence[T],
+        sizes: Optional[Sequence[int]] = None,
+    ) -> list[R]:
+        """Call `fn` on batches of `items` and concatenate the outputs
+
+        Args:
+            fn: function that takes a batch of inputs and returns one output per
+                input, in the same order
+            items: the inputs
+            sizes: token count of each input, used for the token budget
+        """
+        batches = self._batches(items, sizes)
+
+        def call(batch: tuple[int, int]) -> Sequence[R]:
+            inputs = list(items[batch[0] : batch[1]])
+            for attempt in Retrying(
+                retry=retry_if_exception(self.retry_on),
+                wait=wait_random_exponential(min=1, max=40),
+                stop=stop_after_attempt(self.max_retries),
+                reraise=True,
+            ):
+                with attempt, self._slots:
+                    self.rate_limiter.wait()
+                    output = fn(inputs)
+            self._check_output(inputs, output)
+            return output
+
+        if len(batches) <= 1 or self.max_concurrency == 1:
+            results = [call(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrency, len(batches))
+            ) as executor:
+                results = list(executor.map(call, batches))
+
+        return [output for result in results for output in result]
+
+    async def arun(
+        self,
+        fn: Callable[[list[T]], Awaitable[Sequence[R]]],
+        items: Sequence[T],
+        sizes: Optional[Sequence[int]] = None,
+    ) -> list[R]:
+        """Async version of `run`, `fn` is a coroutine function"""
+        batches = self._batches(items, sizes)
+        semaphore = self._loop_slots()
+
+        async def call(batch: tuple[int, int]) -> Sequence[R]:
+            inputs = list(items[batch[0] : batch[1]])
+            async with semaphore:
+                async for attempt in AsyncRetrying(
+                    retry=retry_if_exception(self.retry_on),
+                    wait=wait_random_exponential(min=1, max=40),
+                    stop=stop_after_attempt(self.max_retries),
+                    reraise=True,
+                ):
+                    with attempt:
+                        await self.rate_limiter.await_()
+                        output = await fn(inputs)
+            self._check_output(inputs, output)
+            return output
+
+        results = await asyncio.gather(*(call(batch) for batch in batches))
+        return [output for result in results for output in result]
+
+
+_shared_dispatchers: dict[Hashable, BatchDispatcher] = {}
+_shared_dispatchers_lock = threading.Lock()
+
+
+def shared_dispatcher(
+    model: Any, factory: Callable[[], BatchDispatcher], *key: Hashable
+) -> BatchDispatcher:
+    """Get the dispatcher of the model, create it with `factory` if needed
+
+    The models of the same class and parameters (so the same endpoint and limits)
+    share one dispatcher, so the concurrent calls from several threads share its
+    `max_concurrency` and `requests_per_minute` budgets.
+
+    Args:
+        model: the embedding model
+        factory: create the dispatcher of the model
+        key: extra values telling apart the dispatchers of a model
+    """
+    params = json.dumps(model.dump()["params"], sort_keys=True, default=str)
+    dispatcher_key = (type(model).__module__, type(model).__qualname__, params, key)
+    with _shared_dispatchers_lock:
+        if dispatcher_key not in _shared_dispatchers:
+            _shared_dispatchers[dispatcher_key] = factory()
+        return _shared_dispatchers[dispatcher_key]
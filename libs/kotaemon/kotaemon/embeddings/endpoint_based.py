@@ -1,8 +1,9 @@
 import requests
 
-from kotaemon.base import Document, DocumentWithEmbedding
+from kotaemon.base import Document, DocumentWithEmbedding, Param
 
 from .base import BaseEmbeddings
+from .dispatcher import BatchDispatcher
 
 
 class EndpointEmbeddings(BaseEmbeddings):
@@ -14,6 +15,10 @@ class EndpointEmbeddings(BaseEmbeddings):
     """
 
     endpoint_url: str
+    concurrency: int = Param(
+        4, help="Maximum number of embedding requests sent concurrently"
+    )
+    max_retries: int = Param(3, help="Number of attempts of each request")
 
     def run(
         self, text: str | list[str] | Document | list[Document]
@@ -28,19 +33,24 @@ class EndpointEmbeddings(BaseEmbeddings):
         if not isinstance(text, list):
             text = [text]
 
-        outputs = []
-
-        for item in text:
-            response = requests.post(
-                self.endpoint_url, json={"input": str(item)}
-            ).json()
-            outputs.append(
+        def embed(batch: list) -> list[DocumentWithEmbedding]:
+            # the endpoint embeds one input per request
+            item = batch[0]
+            response = requests.post(self.endpoint_url, json={"input": str(item)})
+            response.raise_for_status()
+            response_json = response.json()
+            return [
                 DocumentWithEmbedding(
                     text=str(item),
-                    embedding=response["data"][0]["embedding"],
-                    total_tokens=response["usage"]["total_tokens"],
-                    prompt_tokens=response["usage"]["prompt_tokens"],
+                    embedding=response_json["data"][0]["embedding"],
+                    total_tokens=response_json["usage"]["total_tokens"],
+                    prompt_tokens=response_json["usage"]["prompt_tokens"],
                 )
-            )
-
-        return outputs
+            ]
+
+        dispatcher = BatchDispatcher(
+            max_batch_size=1,
+            max_concurrency=self.concurrency,
+            max_retries=self.max_retries,
+        )
+        return dispatcher.run(embed, text)
@@ -13,8 +13,10 @@ from tenacity import (
 from theflow.utils.modules import import_dotted_string
 
 from kotaemon.base import Param
+from kotaemon.base.http_clients import clients
 
 from .base import BaseEmbeddings, Document, DocumentWithEmbedding
+from .dispatcher import BatchDispatcher, estimate_tokens, shared_dispatcher
 
 
 def split_text_by_chunk_size(text: str, chunk_size: int) -> list[list[int]]:
@@ -63,6 +65,18 @@ class BaseOpenAIEmbeddings(BaseEmbeddings):
     context_length: Optional[int] = Param(
         None, help="The maximum context length of the embedding model"
     )
+    batch_size: int = Param(
+        512, help="Maximum number of texts sent in one embedding request"
+    )
+    max_batch_tokens: Optional[int] = Param(
+        100_000, help="Maximum (estimated) number of tokens in one embedding request"
+    )
+    concurrency: int = Param(
+        4, help="Maximum number of embedding requests sent concurrently"
+    )
+    requests_per_minute: Optional[int] = Param(
+        None, help="Rate limit of the embedding requests, unlimited if None"
+    )
 
     @Param.auto(depends_on=["max_retries"])
     def max_retries_(self):
@@ -84,59 +98,113 @@ class BaseOpenAIEmbeddings(BaseEmbeddings):
         """Get the openai response"""
         raise NotImplementedError
 
-    def invoke(
-        self, text: str | list[str] | Document | list[Document], *args, **kwargs
-    ) -> list[DocumentWithEmbedding]:
-        input_doc = self.prepare_input(text)
-        client = self.prepare_client(async_version=False)
+    def dispatcher(self, async_version: bool = False) -> BatchDispatcher:
+        """Get the dispatcher that sends the embedding requests by batch
+
+        The sync `openai_response` already retries each request on its own, the
+        async requests are retried by the dispatcher. The dispatcher is shared by
+        the models of the same configuration.
+        """
 
+        def factory():
+            return BatchDispatcher(
+                max_batch_size=self.batch_size,
+                max_batch_tokens=self.max_batch_tokens,
+                max_concurrency=self.concurrency,
+                max_retries=6 if async_version else 1,
+                requests_per_minute=self.requests_per_minute,
+                retry_on=lambda exc: not isinstance(
+                    exc, (openai.NotFoundError, openai.BadRequestError)
+                ),
+            )
+
+        return shared_dispatcher(self, factory, async_version)
+
+    def _prepare_request_input(
+        self, input_doc: list[Document]
+    ) -> tuple[list[str | list[int]], dict[int, tuple[int, int]], list[int]]:
+        """Build the request inputs, splitting the texts longer than the context
+
+        Returns:
+            the request inputs, the (start, end) inputs of each document, and the
+            (estimated) token count of each input
+        """
         input_: list[str | list[int]] = []
+        sizes: list[int] = []
         splitted_indices = {}
         for idx, text in enumerate(input_doc):
             if self.context_length:
                 chunks = split_text_by_chunk_size(text.text or " ", self.context_length)
                 splitted_indices[idx] = (len(input_), len(input_) + len(chunks))
                 input_.extend(chunks)
+                sizes.extend(len(chunk) for chunk in chunks)
             else:
                 splitted_indices[idx] = (len(input_), len(input_) + 1)
-                input_.append(text.text)
+                input_.append(text.text or " ")
+                sizes.append(estimate_tokens(text.text or " "))
 
-        resp = self.openai_response(client, input=input_, **kwargs).dict()
-        output_ = list(sorted(resp["data"], key=lambda x: x["index"]))
+        return input_, splitted_indices, sizes
 
+    def _prepare_output(
+        self,
+        input_doc: list[Document],
+        input_: list[str | list[int]],
+        splitted_indices: dict[int, tuple[int, int]],
+        embeddings: list[list[float]],
+    ) -> list[DocumentWithEmbedding]:
+        """Average the embeddings of the documents split into several inputs"""
         output = []
         for idx, doc in enumerate(input_doc):
-            embs = output_[splitted_indices[idx][0] : splitted_indices[idx][1]]
+            embs = embeddings[splitted_indices[idx][0] : splitted_indices[idx][1]]
             if len(embs) == 1:
-                output.append(
-                    DocumentWithEmbedding(embedding=embs[0]["embedding"], content=doc)
-                )
+                output.append(DocumentWithEmbedding(embedding=embs[0], content=doc))
                 continue
 
             chunk_lens = [
                 len(_)
                 for _ in input_[splitted_indices[idx][0] : splitted_indices[idx][1]]
             ]
-            vs: list[list[float]] = [_["embedding"] for _ in embs]
-            emb = np.average(vs, axis=0, weights=chunk_lens)
+            emb = np.average(embs, axis=0, weights=chunk_lens)
             emb = emb / np.linalg.norm(emb)
             output.append(DocumentWithEmbedding(embedding=emb.tolist(), content=doc))
 
         return output
 
+    def invoke(
+        self, text: str | list[str] | Document | list[Document], *args, **kwargs
+    ) -> list[DocumentWithEmbedding]:
+        input_doc = self.prepare_input(text)
+        client = self.prepare_client(async_version=False)
+        input_, splitted_indices, sizes = self._prepare_request_input(input_doc)
+
+        def embed(batch: list[str | list[int]]) -> list[list[float]]:
+            resp = self.openai_response(client, input=batch, **kwargs).dict()
+            return [
+                item["embedding"]
+                for item in sorted(resp["data"], key=lambda x: x["index"])
+            ]
+
+        embeddings = self.dispatcher().run(embed, input_, sizes)
+        return self._prepare_output(input_doc, input_, splitted_indices, embeddings)
+
     async def ainvoke(
         self, text: str | list[str] | Document | list[Document], *args, **kwargs
     ) -> list[DocumentWithEmbedding]:
-        input_ = self.prepare_input(text)
+        input_doc = self.prepare_input(text)
         client = self.prepare_client(async_version=True)
-        resp = await self.openai_response(
-            client, input=[_.text if _.text else " " for _ in input_], **kwargs
-        ).dict()
-        output_ = sorted(resp["data"], key=lambda x: x["index"])
-        return [
-            DocumentWithEmbedding(embedding=o["embedding"], content=i)
-            for i, o in zip(input_, output_)
-        ]
+        input_, splitted_indices, sizes = self._prepare_request_input(input_doc)
+
+        async def embed(batch: list[str | list[int]]) -> list[list[float]]:
+            resp = (await self.openai_response(client, input=batch, **kwargs)).dict()
+            return [
+                item["embedding"]
+                for item in sorted(resp["data"], key=lambda x: x["index"])
+            ]
+
+        embeddings = await self.dispatcher(async_version=True).arun(
+            embed, input_, sizes
+        )
+        return self._prepare_output(input_doc, input_, splitted_indices, embeddings)
 
 
 class OpenAIEmbeddings(BaseOpenAIEmbeddings):
@@ -154,7 +222,7 @@ class OpenAIEmbeddings(BaseOpenAIEmbeddings):
     )
 
     def prepare_client(self, async_version: bool = False):
-        """Get the OpenAI client
+        """Get the OpenAI client, shared with the models of the same endpoint
 
         Args:
             async_version (bool): Whether to get the async version of the client
@@ -169,11 +237,11 @@ class OpenAIEmbeddings(BaseOpenAIEmbeddings):
         if async_version:
             from openai import AsyncOpenAI
 
-            return AsyncOpenAI(**params)
+            return clients.openai_client(AsyncOpenAI, async_version=True, **params)
 
         from openai import OpenAI
 
-        return OpenAI(**params)
+        return clients.openai_client(OpenAI, **params)
 
     @retry(
         retry=retry_if_not_exception_type(
@@ -215,7 +283,7 @@ class AzureOpenAIEmbeddings(BaseOpenAIEmbeddings):
             return import_dotted_string(self.azure_ad_token_provider, safe=False)
 
     def prepare_client(self, async_version: bool = False):
-        """Get the OpenAI client
+        """Get the OpenAI client, shared with the models of the same endpoint
 
         Args:
             async_version (bool): Whether to get the async version of the client
@@ -232,11 +300,11 @@ class AzureOpenAIEmbeddings(BaseOpenAIEmbeddings):
         if async_version:
             from openai import AsyncAzureOpenAI
 
-            return AsyncAzureOpenAI(**params)
+            return clients.openai_client(AsyncAzureOpenAI, async_version=True, **params)
 
         from openai import AzureOpenAI
 
-        return AzureOpenAI(**params)
+        return clients.openai_client(AzureOpenAI, **params)
 
     @retry(
         retry=retry_if_not_exception_type(
@@ -4,6 +4,7 @@ import requests
 from kotaemon.base import Document, DocumentWithEmbedding, Param
 
 from .base import BaseEmbeddings
+from .dispatcher import BatchDispatcher, shared_dispatcher
 
 session = requests.session()
 
@@ -31,75 +32,76 @@ class TeiEndpointEmbeddings(BaseEmbeddings):
         True,
         help="Truncate embeddings to a fixed/default length",
     )
+    batch_size: int = Param(
+        32,
+        help=(
+            "Maximum number of texts per request, should not exceed the "
+            "`--max-client-batch-size` of the TEI server"
+        ),
+    )
+    concurrency: int = Param(
+        4, help="Maximum number of embedding requests sent concurrently"
+    )
+    max_retries: int = Param(3, help="Number of attempts of each request")
+
+    def dispatcher(self) -> BatchDispatcher:
+        """Get the dispatcher shared by the models of the same configuration"""
+        return shared_dispatcher(
+            self,
+            lambda: BatchDispatcher(
+                max_batch_size=self.batch_size,
+                max_concurrency=self.concurrency,
+                max_retries=self.max_retries,
+            ),
+        )
+
+    def _payload(self, inputs: list[str]) -> dict:
+        return {
+            "inputs": inputs,
+            "normalize": self.normalize,
+            "truncate": self.truncate,
+        }
 
     async def client_(self, inputs: list[str]):
         async with aiohttp.ClientSession() as session:
             async with session.post(
-                url=self.endpoint_url,
-                json={
-                    "inputs": inputs,
-                    "normalize": self.normalize,
-                    "truncate": self.truncate,
-                },
+                url=self.endpoint_url, json=self._payload(inputs)
             ) as resp:
+                resp.raise_for_status()
                 embeddings = await resp.json()
         return embeddings
 
+    def sync_client_(self, inputs: list[str]):
+        resp = session.post(url=self.endpoint_url, json=self._payload(inputs))
+        resp.raise_for_status()
+        return resp.json()
+
     async def ainvoke(
         self, text: str | list[str] | Document | list[Document], *args, **kwargs
     ) -> list[DocumentWithEmbedding]:
         if not isinstance(text, list):
             text = [text]
-        text = self.prepare_input(text)
-
-        outputs = []
-        batch_size = 6
-        num_batch = max(len(text) // batch_size, 1)
-        for i in range(num_batch):
-            if i == num_batch - 1:
-                mini_batch = text[batch_size * i :]
-            else:
-                mini_batch = text[batch_size * i : batch_size * (i + 1)]
-            mini_batch = [x.content for x in mini_batch]
-            embeddings = await self.client_(mini_batch)  # type: ignore
-            outputs.extend(
-                [
-                    DocumentWithEmbedding(content=doc, embedding=embedding)
-                    for doc, embedding in zip(mini_batch, embeddings)
-                ]
-            )
-
-        return outputs
+        docs = self.prepare_input(text)
+
+        embeddings = await self.dispatcher().arun(
+            self.client_, [doc.content for doc in docs]
+        )
+        return [
+            DocumentWithEmbedding(content=doc.content, embedding=embedding)
+            for doc, embedding in zip(docs, embeddings)
+        ]
 
     def invoke(
         self, text: str | list[str] | Document | list[Document], *args, **kwargs
     ) -> list[DocumentWithEmbedding]:
         if not isinstance(text, list):
             text = [text]
+        docs = self.prepare_input(text)
 
-        text = self.prepare_input(text)
-
-        outputs = []
-        batch_size = 6
-        num_batch = max(len(text) // batch_size, 1)
-        for i in range(num_batch):
-            if i == num_batch - 1:
-                mini_batch = text[batch_size * i :]
-            else:
-                mini_batch = text[batch_size * i : batch_size * (i + 1)]
-            mini_batch = [x.content for x in mini_batch]
-            embeddings = session.post(
-                url=self.endpoint_url,
-                json={
-                    "inputs": mini_batch,
-                    "normalize": self.normalize,
-                    "truncate": self.truncate,
-                },
-            ).json()
-            outputs.extend(
-                [
-                    DocumentWithEmbedding(content=doc, embedding=embedding)
-                    for doc, embedding in zip(mini_batch, embeddings)
-                ]
-            )
-        return outputs
+        embeddings = self.dispatcher().run(
+            self.sync_client_, [doc.content for doc in docs]
+        )
+        return [
+            DocumentWithEmbedding(content=doc.content, embedding=embedding)
+            for doc, embedding in zip(docs, embeddings)
+        ]
@@ -24,6 +24,7 @@ from kotaemon.loaders import (
     UnstructuredReader,
     WebReader,
 )
+from kotaemon.storages.blobstores import get_default_blob_store
 
 web_reader = WebReader()
 unstructured = UnstructuredReader()
@@ -37,6 +38,9 @@ docling_reader = DoclingReader()
 adobe_reader.vlm_endpoint = (
     azure_reader.vlm_endpoint
 ) = docling_reader.vlm_endpoint = getattr(flowsettings, "KH_VLM_ENDPOINT", "")
+adobe_reader.blob_store = (
+    azure_reader.blob_store
+) = docling_reader.blob_store = get_default_blob_store()
 
 
 KH_DEFAULT_FILE_EXTRACTORS: dict[str, BaseReader] = {
@@ -52,7 +56,7 @@ KH_DEFAULT_FILE_EXTRACTORS: dict[str, BaseReader] = {
     ".jpg": unstructured,
     ".tiff": unstructured,
     ".tif": unstructured,
-    ".pdf": PDFThumbnailReader(),
+    ".pdf": PDFThumbnailReader(blob_store=get_default_blob_store()),
     ".txt": TxtReader(),
     ".md": TxtReader(),
 }
@@ -0,0 +1,166 @@
+"""Parse files in worker processes, so CPU-heavy loaders can use several cores."""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import pickle
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from kotaemon.base import Document
+from kotaemon.loaders import PDFThumbnailReader
+
+logger = logging.getLogger(__name__)
+
+
+def _load_data(
+    loader, file_path: Path, extra_info: dict, page_range: Optional[tuple[int, int]]
+) -> list[Document]:
+    """Run the loader, inside a worker process"""
+    if page_range is None:
+        return loader.load_data(file_path, extra_info=extra_info)
+    return loader.load_data(file_path, extra_info=extra_info, page_range=page_range)
+
+
+def _count_pdf_pages(file_path: Path) -> int:
+    import pypdf
+
+    with open(file_path, "rb") as fp:
+        return len(pypdf.PdfReader(fp).pages)
+
+
+class ProcessPoolLoader:
+    """Load files with their loaders in a pool of worker processes
+
+    Text extraction and page rendering hold the GIL, so loading files in threads
+    does not use more than one core. This pool sends the loading to worker
+    processes instead, and large PDFs are further split into page ranges parsed
+    in parallel. The loaders and their outputs must be picklable, otherwise the
+    file is loaded in the calling thread.
+
+    The pool uses the default start method of the platform. With "spawn" (macOS,
+    Windows), the main script of the application must be import-safe.
+
+    Args:
+        max_workers: number of worker processes
+        pdf_pages_per_task: PDFs with more pages than this are split into tasks of
+            this many pages, 0 to never split them
+        mp_context: multiprocessing start method, default to the platform one
+
+    Example:
+        ```python
+        with ProcessPoolLoader(max_workers=4) as pool:
+            docs = pool.load_data(PDFThumbnailReader(), Path("report.pdf"), {})
+        ```
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        pdf_pages_per_task: int = 0,
+        mp_context: Optional[str] = None,
+    ):
+        self.max_workers = max_workers
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context(mp_context),
+        )
+        self._picklable: dict[int, bool] = {}
+
+    def is_picklable(self, loader) -> bool:
+        """Whether the loader can be sent to the worker processes"""
+        key = id(loader)
+        if key not in self._picklable:
+            try:
+                pickle.dumps(loader)
+                self._picklable[key] = True
+            except Exception as e:
+                logger.warning(
+                    f"Loader {loader.__class__.__name__} cannot be pickled, it will "
+                    f"run in the indexing thread: {e}"
+                )
+                self._picklable[key] = False
+        return self._picklable[key]
+
+    def page_ranges(self, loader, file_path: Path) -> list[Optional[tuple[int, int]]]:
+        """The page ranges of the file to load in separate tasks
+
+        Only `PDFThumbnailReader` can load a page range, other loaders load the
+        whole file in one task (represented as a `None` range).
+        """
+        if (
+            not self.pdf_pages_per_task
+            or not isinstance(loader, PDFThumbnailReader)
+            or file_path.suffix.lower() != ".pdf"
+        ):
+            return [None]
+
+        n_pages = _count_pdf_pages(file_path)
+        if n_pages <= self.pdf_pages_per_task:
+            return [None]
+
+        return [
+            (start, min(start + self.pdf_pages_per_task, n_pages))
+            for start in range(0, n_pages, self.pdf_pages_per_task)
+        ]
+
+    def submit(
+        self, loader, file_path: str | Path, extra_info: Optional[dict] = None
+    ) -> list[Future]:
+        """Submit the loading tasks of the file, in page order
+
+        URLs and loaders that cannot be pickled are loaded right away in the
+        calling thread, and returned as an already completed future.
+        """
+        extra_info = extra_info or {}
+        if not isinstance(file_path, Path) or not self.is_picklable(loader):
+            future: Future = Future()
+            try:
+                future.set_result(loader.load_data(file_path, extra_info=extra_info))
+            except Exception as e:
+                future.set_exception(e)
+            return [future]
+
+        return [
+            self._executor.submit(_load_data, loader, file_path, extra_info, pages)
+            for pages in self.page_ranges(loader, file_path)
+        ]
+
+    def load_data(
+        self, loader, file_path: str | Path, extra_info: Optional[dict] = None
+    ) -> list[Document]:
+        """Load the file with the loader, and wait for the resulting documents
+
+        Documents of the different page ranges are concatenated in page order,
+        so the output matches loading the file in one go.
+        """
+        return self.collect(self.submit(loader, file_path, extra_info))
+
+    def collect(self, futures: list[Future]) -> list[Document]:
+        """Wait for the loading tasks of a file returned by `submit`, and merge
+        their documents in page order
+        """
+        if len(futures) == 1:
+            return futures[0].result()
+
+        # keep all the pages before the thumbnails, as with a single task
+        page_docs: list[Document] = []
+        thumbnail_docs: list[Document] = []
+        for future in futures:
+            for doc in future.result():
+                if doc.metadata.get("type") == "thumbnail":
+                    thumbnail_docs.append(doc)
+                else:
+                    page_docs.append(doc)
+        return page_docs + thumbnail_docs
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __enter__(self) -> "ProcessPoolLoader":
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,220 @@
+"""Run ingestion steps as concurrent stages connected by bounded queues."""
+from __future__ import annotations
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Generator, Hashable, Iterable, Iterator, Optional
+
+# how long blocked workers wait before checking if the run was cancelled
+_POLL_INTERVAL = 0.1
+
+
+@dataclass
+class StageOutput:
+    """Wrap a value yielded by a stage to send it to the next stage"""
+
+    value: Any
+
+
+@dataclass
+class Stage:
+    """A step of a staged pipeline
+
+    Args:
+        name: name of the stage, used in the thread names
+        fn: generator function called with each input of the stage. It yields
+            progress `Document` (forwarded to the consumer of the pipeline) and
+            `StageOutput` (sent to the next stage, or returned as results of the
+            item for the last stage), and can yield any number of them.
+        workers: number of threads running this stage
+        queue_size: maximum number of inputs waiting for this stage, the previous
+            stage blocks when the queue is full
+    """
+
+    name: str
+    fn: Callable[[Any], Iterator]
+    workers: int = 1
+    queue_size: int = 2
+
+
+@dataclass
+class StageEvent:
+    """Event streamed by `StagedPipeline.stream`
+
+    Args:
+        kind: "progress" (value is a Document), "error" (value is the exception)
+            or "done" (value is the list of outputs of the last stage)
+        key: key of the item that triggered the event
+        value: payload of the event
+    """
+
+    kind: str
+    key: Hashable
+    value: Any
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class StagedPipeline:
+    """Process items through stages running concurrently
+
+    Each stage has its own worker threads and a bounded input queue, so while
+    the last stage is storing the outputs of an item, the first stages can
+    already process the next items, and a slow stage applies back-pressure to
+    the previous ones instead of letting intermediate results pile up in memory.
+
+    All the values derived from an item keep the key of this item. Once a stage
+    fails on a value, the error is reported and the remaining values of the item
+    are skipped. An item is done once all its values went through all stages.
+
+    Example:
+        ```python
+        pipeline = StagedPipeline([
+            Stage("load", load_fn, workers=2),
+            Stage("embed", embed_fn),
+            Stage("write", write_fn),
+        ])
+        for event in pipeline.stream([("a", path_a), ("b", path_b)]):
+            ...
+        ```
+    """
+
+    def __init__(self, stages: list[Stage]):
+        if not stages:
+            raise ValueError("StagedPipeline needs at least one stage")
+        self.stages = stages
+
+    def stream(
+        self, items: Iterable[tuple[Hashable, Any]]
+    ) -> Generator[StageEvent, None, None]:
+        """Process the (key, item) pairs, and stream the events as they happen
+
+        For each key, a "done" or an "error" event is emitted exactly once, after
+        all the "progress" events of this key.
+        """
+        queues: list[queue.Queue] = [
+            queue.Queue(maxsize=max(1, stage.queue_size)) for stage in self.stages
+        ]
+        events: queue.Queue = queue.Queue()
+        cancelled = threading.Event()
+        lock = threading.Lock()
+        pending: dict[Hashable, int] = {}
+        failed: set[Hashable] = set()
+        results: dict[Hashable, list] = {}
+
+        def put(q: queue.Queue, entry):
+            while True:
+                if cancelled.is_set():
+                    raise _Cancelled()
+                try:
+                    q.put(entry, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    continue
+
+        def release(key: Hashable):
+            with lock:
+                pending[key] -= 1
+                if pending[key]:
+                    return
+                del pending[key]
+                # emit under the lock, so the consumer never sees an empty
+                # `pending` before the last event is queued
+                if key not in failed:
+                    events.put(StageEvent("done", key, results.pop(key, [])))
+
+        def worker(stage_idx: int):
+            stage = self.stages[stage_idx]
+            in_queue = queues[stage_idx]
+            is_last = stage_idx == len(self.stages) - 1
+            while True:
+                try:
+                    entry = in_queue.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    if cancelled.is_set():
+                        return
+                    continue
+                if entry is None:
+                    return
+
+                key, value = entry
+                try:
+                    if key in failed:
+                        continue
+                    for output in stage.fn(value):
+                        if cancelled.is_set():
+                            raise _Cancelled()
+                        if isinstance(output, StageOutput):
+                            with lock:
+                                if is_last:
+                                    results.setdefault(key, []).append(output.value)
+                                else:
+                                    pending[key] += 1
+                            if not is_last:
+                                put(queues[stage_idx + 1], (key, output.value))
+                        else:
+                            events.put(StageEvent("progress", key, output))
+                except _Cancelled:
+                    return
+                except Exception as e:
+                    with lock:
+                        if key not in failed:
+                            failed.add(key)
+                            results.pop(key, None)
+                            events.put(StageEvent("error", key, e))
+                finally:
+                    if not cancelled.is_set():
+                        release(key)
+
+        feeding_done = threading.Event()
+
+        def feeder():
+            try:
+                for key, item in items:
+                    with lock:
+                        if key in pending:
+                            raise ValueError(f"Duplicated key {key}")
+                        pending[key] = 1
+                    put(queues[0], (key, item))
+            except _Cancelled:
+                pass
+            except Exception as e:
+                events.put(StageEvent("error", None, e))
+            finally:
+                feeding_done.set()
+                events.put(None)
+
+        threads = [threading.Thread(target=feeder, name="staged-feeder", daemon=True)]
+        for stage_idx, stage in enumerate(self.stages):
+            for worker_idx in range(max(1, stage.workers)):
+                threads.append(
+                    threading.Thread(
+                        target=worker,
+                        args=(stage_idx,),
+                        name=f"staged-{stage.name}-{worker_idx}",
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                with lock:
+                    finished = feeding_done.is_set() and not pending
+                if finished and events.empty():
+                    break
+
+                try:
+                    event: Optional[StageEvent] = events.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if event is not None:
+                    yield event
+        finally:
+            cancelled.set()
+            for thread in threads:
+                thread.join()
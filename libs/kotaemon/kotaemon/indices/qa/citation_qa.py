@@ -15,6 +15,7 @@ from kotaemon.base import (
     SystemMessage,
 )
 from kotaemon.llms import ChatLLM, PromptTemplate
+from kotaemon.storages.blobstores import resolve_blob
 
 from .citation import CitationPipeline
 from .format_context import (
@@ -22,7 +23,7 @@ from .format_context import (
     EVIDENCE_MODE_TABLE,
     EVIDENCE_MODE_TEXT,
 )
-from .utils import find_text
+from .span_matching import SpanMatcher
 
 try:
     from ktem.llms.manager import llms
@@ -99,10 +100,12 @@ class AnswerWithContextPipeline(BaseComponent):
     vlm_endpoint: str = getattr(flowsettings, "KH_VLM_ENDPOINT", "")
     use_multimodal: bool = getattr(flowsettings, "KH_REASONINGS_USE_MULTIMODAL", True)
     citation_pipeline: CitationPipeline = Node(
-        default_callback=lambda _: CitationPipeline(llm=llms.get_default())
+        default_callback=lambda _: CitationPipeline(llm=llms.cached(llms.get_default()))
     )
     create_mindmap_pipeline: CreateMindmapPipeline = Node(
-        default_callback=lambda _: CreateMindmapPipeline(llm=llms.get_default())
+        default_callback=lambda _: CreateMindmapPipeline(
+            llm=llms.cached(llms.get_default())
+        )
     )
 
     qa_template: str = DEFAULT_QA_TEXT_PROMPT
@@ -249,7 +252,7 @@ class AnswerWithContextPipeline(BaseComponent):
                     + [
                         {
                             "type": "image_url",
-                            "image_url": {"url": image},
+                            "image_url": {"url": resolve_blob(image)},
                         }
                         for image in images[:MAX_IMAGES]
                     ],
@@ -301,10 +304,12 @@ class AnswerWithContextPipeline(BaseComponent):
             return spans
 
         evidences = answer.metadata["citation"].evidences
+        # index each document once for all the quotes
+        matchers = [SpanMatcher(doc.text) for doc in docs]
         for quote in evidences:
             matched_excerpts = []
-            for doc in docs:
-                matches = find_text(quote, doc.text)
+            for doc, matcher in zip(docs, matchers):
+                matches = matcher.find_text(quote)
 
                 for start, end in matches:
                     if "|" not in doc.text[start:end]:
@@ -8,10 +8,11 @@ import numpy as np
 
 from kotaemon.base import AIMessage, Document, HumanMessage, SystemMessage
 from kotaemon.llms import PromptTemplate
+from kotaemon.storages.blobstores import resolve_blob
 
 from .citation_qa import CITATION_TIMEOUT, MAX_IMAGES, AnswerWithContextPipeline
 from .format_context import EVIDENCE_MODE_FIGURE
-from .utils import find_start_end_phrase
+from .span_matching import SpanMatcher
 
 DEFAULT_QA_CITATION_PROMPT = """
 Use the following pieces of context to answer the question at the end.
@@ -242,7 +243,7 @@ class AnswerWithInlineCitation(AnswerWithContextPipeline):
                     + [
                         {
                             "type": "image_url",
-                            "image_url": {"url": image},
+                            "image_url": {"url": resolve_blob(image)},
                         }
                         for image in images[:MAX_IMAGES]
                     ],
@@ -327,6 +328,8 @@ class AnswerWithInlineCitation(AnswerWithContextPipeline):
             return spans
 
         evidences = answer.metadata["citation"]
+        # index each document once for all the evidences
+        matchers = [SpanMatcher(doc.text) for doc in docs]
 
         for e_id, evidence in enumerate(evidences):
             start_phrase, end_phrase = evidence.start_phrase, evidence.end_phrase
@@ -339,9 +342,9 @@ class AnswerWithInlineCitation(AnswerWithContextPipeline):
             best_match_length = 0
             best_match_doc_idx = None
 
-            for doc in docs:
-                match, match_length = find_start_end_phrase(
-                    start_phrase, end_phrase, doc.text
+            for doc, matcher in zip(docs, matchers):
+                match, match_length = matcher.find_start_end_phrase(
+                    start_phrase, end_phrase
                 )
                 if best_match is None or (
                     match is not None and match_length > best_match_length
@@ -1,5 +1,7 @@
+import hashlib
 import html
-from functools import partial
+from functools import lru_cache
+from typing import Optional
 
 import tiktoken
 
@@ -12,90 +14,150 @@ EVIDENCE_MODE_CHATBOT = 2
 EVIDENCE_MODE_FIGURE = 3
 
 
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-3.5-turbo") -> tiktoken.Encoding:
+    """The tokenizer used to measure the evidence, loaded once per model"""
+    return tiktoken.encoding_for_model(model)
+
+
 class PrepareEvidencePipeline(BaseComponent):
     """Prepare the evidence text from the list of retrieved documents
 
     This step usually happens after `DocumentRetrievalPipeline`.
 
+    The evidence is assembled document by document, each one tokenized once,
+    until `max_context_length` tokens are reached: the document that goes over
+    the budget is truncated, and the following ones are not processed.
+    Documents with the same content are only added once.
+
     Args:
+        max_context_length: maximum number of tokens of the evidence
         trim_func: a callback function or a BaseComponent, that splits a large
-            chunk of text into smaller ones. The first one will be retained.
+            chunk of text into smaller ones. The first one will be retained. If
+            set, the evidence of all the documents is assembled, then trimmed
+            with it, instead of being assembled within `max_context_length`.
+        sort_by_score: add the documents from the highest score to the lowest,
+            instead of in the retrieval order
+        pack: skip the documents that do not fit in the remaining budget, and
+            try the next ones, instead of truncating the first one that does not
     """
 
     max_context_length: int = 32000
     trim_func: TokenSplitter | None = None
+    sort_by_score: bool = False
+    pack: bool = False
+
+    def format_evidence(
+        self, retrieved_item: RetrievedDocument, table_found: int
+    ) -> tuple[int, Optional[str], str, Optional[str]]:
+        """Format a retrieved document into its evidence
+
+        Returns:
+            the evidence mode, the content to de-duplicate the document on (None
+            to not de-duplicate it), the evidence text (empty to skip the
+            document) and the image of the document
+        """
+        page = retrieved_item.metadata.get("page_label", None)
+        source = filename = retrieved_item.metadata.get("file_name", "-")
+        if page:
+            source += f" (Page {page})"
+
+        doc_type = retrieved_item.metadata.get("type", "")
+        if doc_type == "table":
+            if table_found >= 5:
+                return EVIDENCE_MODE_TABLE, None, "", None
+            retrieved_content = retrieved_item.metadata.get(
+                "table_origin", retrieved_item.text
+            )
+            return (
+                EVIDENCE_MODE_TABLE,
+                retrieved_content,
+                f"<br><b>Table from {source}</b>\n" + retrieved_content + "\n<br>",
+                None,
+            )
+        elif doc_type == "chatbot":
+            retrieved_content = retrieved_item.metadata["window"]
+            return (
+                EVIDENCE_MODE_CHATBOT,
+                None,
+                f"<br><b>Chatbot scenario from {filename} (Row {page})</b>\n"
+                + retrieved_content
+                + "\n<br>",
+                None,
+            )
+        elif doc_type == "image":
+            retrieved_caption = html.escape(retrieved_item.get_content())
+            return (
+                EVIDENCE_MODE_FIGURE,
+                None,
+                f"<br><b>Figure from {source}</b>\n"
+                + "<img width='85%' src='<src>' "
+                + f"alt='{retrieved_caption}'/>"
+                + "\n<br>",
+                retrieved_item.metadata.get("image_origin", ""),
+            )
+
+        if "window" in retrieved_item.metadata:
+            retrieved_content = retrieved_item.metadata["window"]
+        else:
+            retrieved_content = retrieved_item.text
+        retrieved_content = retrieved_content.replace("\n", " ")
+        return (
+            EVIDENCE_MODE_TEXT,
+            retrieved_content,
+            f"<br><b>Content from {source}: </b> " + retrieved_content + " \n<br>",
+            None,
+        )
 
     def run(self, docs: list[RetrievedDocument]) -> Document:
-        evidence = ""
+        evidences: list[str] = []
         images = []
         table_found = 0
         evidence_modes = []
+        seen: set[bytes] = set()
 
-        evidence_trim_func = (
-            self.trim_func
-            if self.trim_func
-            else TokenSplitter(
-                chunk_size=self.max_context_length,
-                chunk_overlap=0,
-                separator=" ",
-                tokenizer=partial(
-                    tiktoken.encoding_for_model("gpt-3.5-turbo").encode,
-                    allowed_special=set(),
-                    disallowed_special="all",
-                ),
+        encoding = get_encoding()
+        budget = self.max_context_length
+        if self.sort_by_score:
+            docs = sorted(docs, key=lambda doc: doc.score, reverse=True)
+
+        for retrieved_item in docs:
+            mode, content, text, image = self.format_evidence(
+                retrieved_item, table_found
             )
-        )
+            evidence_modes.append(mode)
+            if not text:
+                continue
 
-        for _, retrieved_item in enumerate(docs):
-            retrieved_content = ""
-            page = retrieved_item.metadata.get("page_label", None)
-            source = filename = retrieved_item.metadata.get("file_name", "-")
-            if page:
-                source += f" (Page {page})"
-            if retrieved_item.metadata.get("type", "") == "table":
-                evidence_modes.append(EVIDENCE_MODE_TABLE)
-                if table_found < 5:
-                    retrieved_content = retrieved_item.metadata.get(
-                        "table_origin", retrieved_item.text
-                    )
-                    if retrieved_content not in evidence:
-                        table_found += 1
-                        evidence += (
-                            f"<br><b>Table from {source}</b>\n"
-                            + retrieved_content
-                            + "\n<br>"
-                        )
-            elif retrieved_item.metadata.get("type", "") == "chatbot":
-                evidence_modes.append(EVIDENCE_MODE_CHATBOT)
-                retrieved_content = retrieved_item.metadata["window"]
-                evidence += (
-                    f"<br><b>Chatbot scenario from {filename} (Row {page})</b>\n"
-                    + retrieved_content
-                    + "\n<br>"
-                )
-            elif retrieved_item.metadata.get("type", "") == "image":
-                evidence_modes.append(EVIDENCE_MODE_FIGURE)
-                retrieved_content = retrieved_item.metadata.get("image_origin", "")
-                retrieved_caption = html.escape(retrieved_item.get_content())
-                evidence += (
-                    f"<br><b>Figure from {source}</b>\n"
-                    + "<img width='85%' src='<src>' "
-                    + f"alt='{retrieved_caption}'/>"
-                    + "\n<br>"
-                )
-                images.append(retrieved_content)
-            else:
-                if "window" in retrieved_item.metadata:
-                    retrieved_content = retrieved_item.metadata["window"]
+            if content is not None:
+                key = hashlib.sha1(content.encode("utf-8")).digest()
+                if key in seen:
+                    continue
+
+            if not self.trim_func:
+                tokens = encoding.encode_ordinary(text)
+                if len(tokens) > budget:
+                    if self.pack:
+                        continue
+                    # the budget is reached: keep the beginning of this document
+                    # and leave out the rest
+                    text = encoding.decode(tokens[:budget])
+                    budget = 0
                 else:
-                    retrieved_content = retrieved_item.text
-                retrieved_content = retrieved_content.replace("\n", " ")
-                if retrieved_content not in evidence:
-                    evidence += (
-                        f"<br><b>Content from {source}: </b> "
-                        + retrieved_content
-                        + " \n<br>"
-                    )
+                    budget -= len(tokens)
+
+            if content is not None:
+                seen.add(key)
+            if mode == EVIDENCE_MODE_TABLE:
+                table_found += 1
+            if image is not None:
+                images.append(image)
+            evidences.append(text)
+
+            if not self.trim_func and budget <= 0:
+                break
+
+        evidence = "".join(evidences)
 
         # resolve evidence mode
         evidence_mode = EVIDENCE_MODE_TEXT
@@ -106,8 +168,8 @@ class PrepareEvidencePipeline(BaseComponent):
 
         # trim context by trim_len
         print("len (original)", len(evidence))
-        if evidence:
-            texts = evidence_trim_func([Document(text=evidence)])
+        if evidence and self.trim_func:
+            texts = self.trim_func([Document(text=evidence)])
             evidence = texts[0].text
             print("len (trimmed)", len(evidence))
 
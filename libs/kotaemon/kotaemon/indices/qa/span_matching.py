@@ -0,0 +1,192 @@
+from bisect import bisect_left
+from typing import Optional
+
+
+class SpanMatcher:
+    """Locate the quotes of an answer in a document text
+
+    This gives the same spans as running `difflib.SequenceMatcher(autojunk=False)`
+    between each quote and the document, without its quadratic cost:
+
+    - a quote found verbatim in the document is matched with `str.find`
+    - otherwise, only the matching blocks long enough to be kept are searched,
+      seeded by the n-grams of the quote found in an index of the document, and
+      extended to maximal blocks. The index is built once per document, so the
+      matcher should be reused for all the quotes of an answer.
+
+    Args:
+        context: the document text, matched case-insensitively and with its new
+            lines as spaces. The returned offsets are the ones of `context`.
+        ngram_size: max length of the n-grams of the index
+    """
+
+    def __init__(self, context: str, ngram_size: int = 8):
+        self.context = context.lower().replace("\n", " ")
+        self.ngram_size = ngram_size
+        self._indices: dict[int, dict[str, list[int]]] = {}
+
+    def _index(self, size: int) -> dict[str, list[int]]:
+        """Positions of each n-gram of the context, in increasing order"""
+        if size not in self._indices:
+            index: dict[str, list[int]] = {}
+            for pos in range(len(self.context) - size + 1):
+                index.setdefault(self.context[pos : pos + size], []).append(pos)
+            self._indices[size] = index
+        return self._indices[size]
+
+    def longest_match(
+        self,
+        sentence: str,
+        alo: int,
+        ahi: int,
+        blo: int,
+        bhi: int,
+        min_size: int,
+    ) -> Optional[tuple[int, int, int]]:
+        """Longest block of sentence[alo:ahi] matching context[blo:bhi]
+
+        Same as `SequenceMatcher.find_longest_match`, for the blocks of at least
+        `min_size` characters: ties go to the block starting earliest in the
+        sentence, then in the context.
+
+        Returns:
+            (start in sentence, start in context, size), None if no block is at
+            least `min_size` long
+        """
+        size = min(self.ngram_size, min_size)
+        if size <= 0 or ahi - alo < min_size or bhi - blo < min_size:
+            return None
+
+        index = self._index(size)
+        context = self.context
+        best = None
+        best_size = min_size - 1
+        for i in range(alo, ahi - size + 1):
+            positions = index.get(sentence[i : i + size])
+            if not positions:
+                continue
+            for j in positions[bisect_left(positions, blo) :]:
+                if j + size > bhi:
+                    break
+                # only extend the blocks from their first character
+                if i > alo and j > blo and sentence[i - 1] == context[j - 1]:
+                    continue
+                k = size
+                while i + k < ahi and j + k < bhi and sentence[i + k] == context[j + k]:
+                    k += 1
+                if k > best_size:
+                    best, best_size = (i, j, k), k
+        return best
+
+    def matching_blocks(
+        self, sentence: str, min_size: int
+    ) -> list[tuple[int, int, int]]:
+        """Blocks of at least `min_size` characters of `get_matching_blocks`
+
+        As in `SequenceMatcher`, the longest block is matched first, then the
+        blocks before and after it on both sides, recursively. A region whose
+        longest block is shorter than `min_size` has no longer block inside, so
+        it is not searched further.
+        """
+        blocks = []
+        queue = [(0, len(sentence), 0, len(self.context))]
+        while queue:
+            alo, ahi, blo, bhi = queue.pop()
+            match = self.longest_match(sentence, alo, ahi, blo, bhi, min_size)
+            if match is None:
+                continue
+            i, j, k = match
+            blocks.append(match)
+            queue.append((alo, i, blo, j))
+            queue.append((i + k, ahi, j + k, bhi))
+        blocks.sort()
+        return blocks
+
+    def find_text(self, search_span: str, min_length: int = 5) -> list[tuple]:
+        """Drop-in for `kotaemon.indices.qa.utils.find_text` on this context"""
+        search_span = search_span.lower()
+
+        matches_span = []
+        # don't search for small text
+        if len(search_span) > min_length:
+            for sentence in search_span.split("\n"):
+                # no block of it would be long enough to be kept
+                if len(sentence) <= min_length:
+                    continue
+
+                start = self.context.find(sentence)
+                if start != -1:
+                    matches_span.append((start, start + len(sentence)))
+                    continue
+
+                # blocks are kept if longer than this
+                min_block = int(max(len(sentence) * 0.25, min_length)) + 1
+                matched_blocks = [
+                    (start, start + length)
+                    for _, start, length in self.matching_blocks(sentence, min_block)
+                ]
+
+                if matched_blocks:
+                    start_index = min(start for start, _ in matched_blocks)
+                    end_index = max(end for _, end in matched_blocks)
+                    length = end_index - start_index
+
+                    if length > max(len(sentence) * 0.35, min_length):
+                        matches_span.append((start_index, end_index))
+
+        if matches_span:
+            # merge all matches into one span
+            final_span = min(start for start, _ in matches_span), max(
+                end for _, end in matches_span
+            )
+            matches_span = [final_span]
+
+        return matches_span
+
+    def find_start_end_phrase(
+        self,
+        start_phrase: Optional[str],
+        end_phrase: Optional[str],
+        min_length: int = 5,
+        max_excerpt_length: int = 300,
+    ) -> tuple[Optional[tuple[int, int]], int]:
+        """Drop-in for `kotaemon.indices.qa.utils.find_start_end_phrase` on this
+        context"""
+        matches = []
+        matched_length = 0
+        for sentence in [start_phrase, end_phrase]:
+            if sentence is None:
+                continue
+            sentence = sentence.lower()
+
+            start = self.context.find(sentence) if sentence else -1
+            if start != -1:
+                match: Optional[tuple[int, int, int]] = (0, start, len(sentence))
+            else:
+                min_size = int(max(len(sentence) * 0.35, min_length)) + 1
+                match = self.longest_match(
+                    sentence, 0, len(sentence), 0, len(self.context), min_size
+                )
+
+            if match is not None and match[2] > max(len(sentence) * 0.35, min_length):
+                matches.append((match[1], match[1] + match[2]))
+                matched_length += match[2]
+
+        # check if second match is before the first match
+        if len(matches) == 2 and matches[1][0] < matches[0][0]:
+            # if so, keep only the first match
+            matches = [matches[0]]
+
+        if matches:
+            start_idx = min(start for start, _ in matches)
+            end_idx = max(end for _, end in matches)
+
+            # check if the excerpt is too long
+            if end_idx - start_idx > max_excerpt_length:
+                end_idx = start_idx + max_excerpt_length
+
+            final_match = (start_idx, end_idx)
+        else:
+            final_match = None
+
+        return final_match, matched_length
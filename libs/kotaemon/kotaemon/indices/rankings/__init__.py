@@ -1,5 +1,6 @@
 from .base import BaseReranking
 from .cohere import CohereReranking
+from .fusion import reciprocal_rank_fusion, weighted_score_fusion
 from .llm import LLMReranking
 from .llm_scoring import LLMScoring
 from .llm_trulens import LLMTrulensScoring
@@ -10,4 +11,6 @@ __all__ = [
     "LLMScoring",
     "BaseReranking",
     "LLMTrulensScoring",
+    "reciprocal_rank_fusion",
+    "weighted_score_fusion",
 ]
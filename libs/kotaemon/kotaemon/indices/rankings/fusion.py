@@ -0,0 +1,100 @@
+"""Merge several ranked candidate lists into a single ranking.
+
+These helpers are used by hybrid retrieval to combine the results of the vector
+search and the full-text search. They operate on document ids so that the same
+chunk returned by several retrievers is only kept once.
+"""
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[str]],
+    k: int = RRF_K,
+    weights: Optional[Sequence[float]] = None,
+) -> list[tuple[str, float]]:
+    """Fuse ranked lists of ids with Reciprocal Rank Fusion
+
+    Each id receives `sum(weight / (k + rank))` over the lists it appears in,
+    where `rank` starts from 1. Duplicated ids inside a list only count once
+    (at their best rank).
+
+    Args:
+        ranked_lists: lists of ids, each ordered from most to least relevant
+        k: smoothing constant, larger values flatten the contribution of the
+            top ranks
+        weights: optional weight of each list, default to 1.0 for all lists
+
+    Returns:
+        list of (id, fused score), ordered by decreasing fused score
+    """
+    if weights is None:
+        weights = [1.0] * len(ranked_lists)
+    if len(weights) != len(ranked_lists):
+        raise ValueError("weights must have the same length as ranked_lists")
+
+    fused: dict[str, float] = {}
+    for ids, weight in zip(ranked_lists, weights):
+        seen: set[str] = set()
+        for rank, id_ in enumerate(ids, start=1):
+            if id_ in seen:
+                continue
+            seen.add(id_)
+            fused[id_] = fused.get(id_, 0.0) + weight / (k + rank)
+
+    # sorted() is stable so ties keep the first-seen order
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted_score_fusion(
+    scored_lists: Sequence[Sequence[tuple[str, float]]],
+    weights: Optional[Sequence[float]] = None,
+) -> list[tuple[str, float]]:
+    """Fuse scored lists of ids with a weighted sum of min-max normalized scores
+
+    Scores of each list are normalized into [0, 1] independently, so that lists
+    with different score ranges (e.g. cosine similarity and BM25) can be
+    combined. An id missing from a list contributes 0 for that list.
+
+    Args:
+        scored_lists: lists of (id, score), higher score means more relevant
+        weights: optional weight of each list, default to 1.0 for all lists
+
+    Returns:
+        list of (id, fused score), ordered by decreasing fused score
+    """
+    if weights is None:
+        weights = [1.0] * len(scored_lists)
+    if len(weights) != len(scored_lists):
+        raise ValueError("weights must have the same length as scored_lists")
+
+    fused: dict[str, float] = {}
+    for items, weight in zip(scored_lists, weights):
+        if not items:
+            continue
+
+        best: dict[str, float] = {}
+        for id_, score in items:
+            if id_ not in best or score > best[id_]:
+                best[id_] = score
+
+        low, high = min(best.values()), max(best.values())
+        span = high - low
+        for id_, score in best.items():
+            normalized = (score - low) / span if span > 0 else 1.0
+            fused[id_] = fused.get(id_, 0.0) + weight * normalized
+
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def rank_based_scores(ids: Sequence[str]) -> list[tuple[str, float]]:
+    """Assign linearly decreasing scores to a ranked list without scores
+
+    Useful to feed `weighted_score_fusion` with results from stores that only
+    return an ordering (e.g. the full-text search of the document stores).
+    """
+    n = len(ids)
+    return [(id_, 1.0 - idx / n) for idx, id_ in enumerate(ids)]
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import json
+import logging
 import re
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from typing import Optional
 
 import tiktoken
 
@@ -12,11 +15,9 @@ from kotaemon.llms import BaseLLM, PromptTemplate
 
 from .llm import LLMReranking
 
-SYSTEM_PROMPT_TEMPLATE = PromptTemplate(
-    """You are a RELEVANCE grader; providing the relevance of the given CONTEXT to the given QUESTION.
-        Respond only as a number from 0 to 10 where 0 is the least relevant and 10 is the most relevant.
+logger = logging.getLogger(__name__)
 
-        A few additional scoring guidelines:
+SCORING_GUIDELINES = """A few additional scoring guidelines:
 
         - Long CONTEXTS should score equally well as short CONTEXTS.
 
@@ -33,6 +34,13 @@ SYSTEM_PROMPT_TEMPLATE = PromptTemplate(
         - CONTEXT must be relevant and helpful for answering the entire QUESTION to get a score of 10.
 
         - Never elaborate."""  # noqa: E501
+
+SYSTEM_PROMPT_TEMPLATE = PromptTemplate(
+    """You are a RELEVANCE grader; providing the relevance of the given CONTEXT to the given QUESTION.
+        Respond only as a number from 0 to 10 where 0 is the least relevant and 10 is the most relevant.
+
+        """  # noqa: E501
+    + SCORING_GUIDELINES
 )
 
 USER_PROMPT_TEMPLATE = PromptTemplate(
@@ -43,11 +51,33 @@ USER_PROMPT_TEMPLATE = PromptTemplate(
         RELEVANCE: """
 )  # noqa
 
+BATCH_SYSTEM_PROMPT_TEMPLATE = PromptTemplate(
+    """You are a RELEVANCE grader; providing the relevance of each of the given CONTEXTS to the given QUESTION.
+        Grade each CONTEXT on its own, as a number from 0 to 10 where 0 is the least relevant and 10 is the most relevant.
+        Respond only with a JSON object mapping the number of each CONTEXT to its score, e.g. {{"1": 7, "2": 0}}.
+
+        """  # noqa: E501
+    + SCORING_GUIDELINES
+)
+
+BATCH_USER_PROMPT_TEMPLATE = PromptTemplate(
+    """QUESTION: {question}
+
+        {contexts}
+
+        RELEVANCE: """
+)  # noqa
+
 PATTERN_INTEGER: re.Pattern = re.compile(r"([+-]?[1-9][0-9]*|0)")
 """Regex that matches integers."""
 
+PATTERN_JSON_OBJECT: re.Pattern = re.compile(r"\{.*\}", re.DOTALL)
+"""Regex that matches a JSON object."""
+
 MAX_CONTEXT_LEN = 7500
 
+_encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+
 
 def validate_rating(rating) -> int:
     """Validate a rating is between 0 and 10."""
@@ -93,23 +123,146 @@ def re_0_10_rating(s: str) -> int:
     return min(vals)
 
 
+def parse_batch_ratings(s: str, n: int) -> list[Optional[int]]:
+    """Extract the 0-10 ratings of `n` contexts from a JSON object answer.
+
+    The object maps the numbers of the contexts (starting from 1) to their
+    ratings, e.g. `{"1": 7, "2": 0}`.
+
+    Args:
+        s: String to extract the ratings from.
+        n: Number of contexts.
+
+    Returns:
+        list: The rating of each context, None if missing or invalid.
+    """
+    ratings: list[Optional[int]] = [None] * n
+
+    match = PATTERN_JSON_OBJECT.search(s)
+    if not match:
+        return ratings
+
+    try:
+        answer = json.loads(match.group())
+    except ValueError:
+        return ratings
+
+    if not isinstance(answer, dict):
+        return ratings
+
+    for key, value in answer.items():
+        # accept keys like "1" or "CONTEXT 1"
+        number = PATTERN_INTEGER.search(str(key))
+        if not number or isinstance(value, bool):
+            continue
+        try:
+            rating = validate_rating(int(value))
+        except (TypeError, ValueError):
+            continue
+
+        idx = int(number.group()) - 1
+        if 0 <= idx < n:
+            ratings[idx] = rating
+
+    return ratings
+
+
 class LLMTrulensScoring(LLMReranking):
+    """Score the relevance of the documents to the query with the LLM
+
+    With `batch_size` > 1, the documents are scored in groups: one request grades
+    up to `batch_size` documents of at most `batch_max_tokens` tokens in total,
+    and answers a JSON object of their scores. The documents missing from a
+    parsed answer are scored one by one.
+    """
+
     llm: BaseLLM
     system_prompt_template: PromptTemplate = SYSTEM_PROMPT_TEMPLATE
     user_prompt_template: PromptTemplate = USER_PROMPT_TEMPLATE
+    batch_system_prompt_template: PromptTemplate = BATCH_SYSTEM_PROMPT_TEMPLATE
+    batch_user_prompt_template: PromptTemplate = BATCH_USER_PROMPT_TEMPLATE
     concurrent: bool = True
+    max_workers: int = 4
+    batch_size: int = 1
+    batch_max_tokens: int = MAX_CONTEXT_LEN
     normalize: float = 10
     trim_func: TokenSplitter = TokenSplitter.withx(
         chunk_size=MAX_CONTEXT_LEN,
         chunk_overlap=0,
         separator=" ",
         tokenizer=partial(
-            tiktoken.encoding_for_model("gpt-3.5-turbo").encode,
+            _encoding.encode,
             allowed_special=set(),
             disallowed_special="all",
         ),
     )
 
+    def _trim(self, content: str) -> tuple[str, int]:
+        """Trim the content to the max context length, return it and its tokens"""
+        n_tokens = len(_encoding.encode_ordinary(content))
+        if n_tokens <= MAX_CONTEXT_LEN:
+            return content, n_tokens
+
+        # skip metadata which cause troubles
+        content = self.trim_func([Document(content=content)])[0].text
+        return content, min(n_tokens, MAX_CONTEXT_LEN)
+
+    def _batches(self, n_tokens: list[int]) -> list[list[int]]:
+        """Group the indices of the contexts into the scoring requests"""
+        batches: list[list[int]] = []
+        size = 0
+        for idx, length in enumerate(n_tokens):
+            if (
+                not batches
+                or len(batches[-1]) >= self.batch_size
+                or size + length > self.batch_max_tokens
+            ):
+                batches.append([])
+                size = 0
+            batches[-1].append(idx)
+            size += length
+        return batches
+
+    def _score(self, query: str, context: str) -> float:
+        messages = [
+            SystemMessage(self.system_prompt_template.populate()),
+            HumanMessage(
+                self.user_prompt_template.populate(question=query, context=context)
+            ),
+        ]
+        result = self.llm(messages).text
+        return float(re_0_10_rating(result))
+
+    def _score_batch(self, query: str, contexts: list[str]) -> list[Optional[float]]:
+        if len(contexts) == 1:
+            return [self._score(query, contexts[0])]
+
+        messages = [
+            SystemMessage(self.batch_system_prompt_template.populate()),
+            HumanMessage(
+                self.batch_user_prompt_template.populate(
+                    question=query,
+                    contexts="\n\n".join(
+                        f"CONTEXT {idx}: {context}"
+                        for idx, context in enumerate(contexts, start=1)
+                    ),
+                )
+            ),
+        ]
+        try:
+            result = self.llm(messages).text
+        except Exception as e:
+            logger.warning(f"Batched relevance scoring failed: {e}")
+            return [None] * len(contexts)
+
+        ratings = parse_batch_ratings(result, len(contexts))
+        if None in ratings:
+            logger.warning(
+                f"Could not parse {ratings.count(None)} of {len(ratings)} "
+                "relevance scores, scoring them one by one"
+            )
+        return [float(rating) if rating is not None else None for rating in ratings]
+
     def run(
         self,
         documents: list[Document],
@@ -119,53 +272,39 @@ class LLMTrulensScoring(LLMReranking):
         filtered_docs = []
 
         documents = sorted(documents, key=lambda doc: doc.get_content())
-        if self.concurrent:
-            with ThreadPoolExecutor() as executor:
-                futures = []
-                for doc in documents:
-                    chunked_doc_content = self.trim_func(
-                        [
-                            Document(content=doc.get_content())
-                            # skip metadata which cause troubles
-                        ]
-                    )[0].text
-
-                    messages = []
-                    messages.append(
-                        SystemMessage(self.system_prompt_template.populate())
-                    )
-                    messages.append(
-                        HumanMessage(
-                            self.user_prompt_template.populate(
-                                question=query, context=chunked_doc_content
-                            )
-                        )
-                    )
-
-                    def llm_call():
-                        return self.llm(messages).text
-
-                    futures.append(executor.submit(llm_call))
-
-                results = [future.result() for future in futures]
-        else:
-            results = []
-            for doc in documents:
-                messages = []
-                messages.append(SystemMessage(self.system_prompt_template.populate()))
-                messages.append(
-                    SystemMessage(
-                        self.user_prompt_template.populate(
-                            question=query, context=doc.get_content()
-                        )
-                    )
-                )
-                results.append(self.llm(messages).text)
+        contexts, n_tokens = [], []
+        for doc in documents:
+            context, length = self._trim(doc.get_content())
+            contexts.append(context)
+            n_tokens.append(length)
+
+        batches = (
+            self._batches(n_tokens)
+            if self.batch_size > 1
+            else [[idx] for idx in range(len(documents))]
+        )
+        max_workers = max(self.max_workers, 1) if self.concurrent else 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            batch_scores = executor.map(
+                lambda batch: self._score_batch(query, [contexts[i] for i in batch]),
+                batches,
+            )
+            scores: list[Optional[float]] = [None] * len(documents)
+            for batch, batch_score in zip(batches, batch_scores):
+                for idx, score in zip(batch, batch_score):
+                    scores[idx] = score
+
+            # fall back to scoring one by one the documents missing from the answers
+            missing = [idx for idx, score in enumerate(scores) if score is None]
+            for idx, score in zip(
+                missing,
+                executor.map(lambda idx: self._score(query, contexts[idx]), missing),
+            ):
+                scores[idx] = score
 
-        # use Boolean parser to extract relevancy output from LLM
         results = [
-            (r_idx, float(re_0_10_rating(result)) / self.normalize)
-            for r_idx, result in enumerate(results)
+            (r_idx, score / self.normalize)  # type: ignore[operator]
+            for r_idx, score in enumerate(scores)
         ]
         results.sort(key=lambda x: x[1], reverse=True)
 
@@ -10,9 +10,16 @@ from theflow.settings import settings as flowsettings
 from kotaemon.base import BaseComponent, Document, RetrievedDocument
 from kotaemon.embeddings import BaseEmbeddings
 from kotaemon.storages import BaseDocumentStore, BaseVectorStore
+from kotaemon.storages.blobstores import blob_url
 
 from .base import BaseIndexing, BaseRetrieval
 from .rankings import BaseReranking, LLMReranking
+from .rankings.fusion import (
+    RRF_K,
+    rank_based_scores,
+    reciprocal_rank_fusion,
+    weighted_score_fusion,
+)
 
 VECTOR_STORE_FNAME = "vectorstore"
 DOC_STORE_FNAME = "docstore"
@@ -63,7 +70,7 @@ class VectorIndexing(BaseIndexing):
                     markdown_content += f"\nSection: {section}"
                 if "type" in docs[i].metadata:
                     if docs[i].metadata["type"] == "image":
-                        image_origin = docs[i].metadata["image_origin"]
+                        image_origin = blob_url(docs[i].metadata["image_origin"])
                         image_origin = f'<p><img src="{image_origin}"></p>'
                         markdown_content += f"\nImage origin: {image_origin}"
                 if docs[i].text:
@@ -76,16 +83,19 @@ class VectorIndexing(BaseIndexing):
                 ) as f:
                     f.write(markdown_content)
 
-    def add_to_docstore(self, docs: list[Document]):
+    def add_to_docstore(self, docs: list[Document], **kwargs):
         if self.doc_store:
             print("Adding documents to doc store")
-            self.doc_store.add(docs)
+            self.doc_store.add(docs, **kwargs)
 
-    def add_to_vectorstore(self, docs: list[Document]):
+    def add_to_vectorstore(
+        self, docs: list[Document], embeddings: Optional[list] = None
+    ):
         # in case we want to skip embedding
         if self.vector_store:
-            print(f"Getting embeddings for {len(docs)} nodes")
-            embeddings = self.embedding(docs)
+            if embeddings is None:
+                print(f"Getting embeddings for {len(docs)} nodes")
+                embeddings = self.embedding(docs)
             print("Adding embeddings to vector store")
             self.vector_store.add(
                 embeddings=embeddings,
@@ -107,14 +117,20 @@ class VectorIndexing(BaseIndexing):
                     f"Invalid input type {type(item)}, should be str or Document"
                 )
 
-        self.add_to_vectorstore(input_)
+        # stores sharing a backend expect the documents before their embeddings
         self.add_to_docstore(input_)
+        self.add_to_vectorstore(input_)
         self.write_chunk_to_file(input_)
         self.count_ += len(input_)
 
 
 class VectorRetrieval(BaseRetrieval):
-    """Retrieve list of documents from vector store"""
+    """Retrieve list of documents from vector store
+
+    In hybrid mode, if the doc store and the vector store are served by the same
+    backend (`doc_store.supports_hybrid_query(vector_store)`), the full-text and
+    vector searches run in one `hybrid_query` request, fused by the backend.
+    """
 
     vector_store: BaseVectorStore
     doc_store: Optional[BaseDocumentStore] = None
@@ -123,6 +139,11 @@ class VectorRetrieval(BaseRetrieval):
     top_k: int = 5
     first_round_top_k_mult: int = 10
     retrieval_mode: str = "hybrid"  # vector, text, hybrid
+    hybrid_fusion: str = "rrf"  # rrf, weighted
+    hybrid_text_weight: float = 0.5
+    rrf_k: int = RRF_K
+    # if set, only pass the top `top_k * rerank_top_k_mult` documents to rerankers
+    rerank_top_k_mult: Optional[int] = None
 
     def _filter_docs(
         self, documents: list[RetrievedDocument], top_k: int | None = None
@@ -131,6 +152,55 @@ class VectorRetrieval(BaseRetrieval):
             documents = documents[:top_k]
         return documents
 
+    def _fuse_results(
+        self,
+        vs_ids: list[str],
+        vs_scores: list[float],
+        vs_docs: list[Document],
+        ds_docs: list[Document],
+    ) -> list[RetrievedDocument]:
+        """Merge the vector search and full-text search results into one ranking
+
+        Documents are de-duplicated by doc_id. The `score` of each output document
+        is kept as the vector similarity (or -1.0 if the document only comes from
+        full-text search), while the fused score is stored in
+        `retrieval_metadata["fusion_score"]`.
+        """
+        vs_score_by_id = dict(zip(vs_ids, vs_scores))
+        docs_by_id: dict[str, Document] = {doc.doc_id: doc for doc in ds_docs}
+        docs_by_id.update({doc.doc_id: doc for doc in vs_docs})
+
+        # ignore ids that cannot be found in the doc store
+        vs_ranked = [id_ for id_ in vs_ids if id_ in docs_by_id]
+        ds_ranked = [doc.doc_id for doc in ds_docs]
+        weights = [1.0 - self.hybrid_text_weight, self.hybrid_text_weight]
+
+        if self.hybrid_fusion == "rrf":
+            fused = reciprocal_rank_fusion(
+                [vs_ranked, ds_ranked], k=self.rrf_k, weights=weights
+            )
+        elif self.hybrid_fusion == "weighted":
+            fused = weighted_score_fusion(
+                [
+                    [(id_, vs_score_by_id[id_]) for id_ in vs_ranked],
+                    # full-text search results from doc stores don't carry scores
+                    rank_based_scores(ds_ranked),
+                ],
+                weights=weights,
+            )
+        else:
+            raise ValueError(f"Invalid hybrid fusion method: {self.hybrid_fusion}")
+
+        result = []
+        for id_, fusion_score in fused:
+            doc = RetrievedDocument(
+                **docs_by_id[id_].to_dict(), score=vs_score_by_id.get(id_, -1.0)
+            )
+            doc.retrieval_metadata["fusion_score"] = fusion_score
+            result.append(doc)
+
+        return result
+
     def run(
         self, text: str | Document, top_k: Optional[int] = None, **kwargs
     ) -> list[RetrievedDocument]:
@@ -139,6 +209,10 @@ class VectorRetrieval(BaseRetrieval):
         Args:
             text: the text to retrieve similar documents
             top_k: number of top similar documents to return
+            scope: only retrieve among these document ids
+            file_ids: only retrieve among the documents of these files. The
+                vector store should also be scoped by a `file_id` filter in
+                `filters`, as the doc store is scoped with its native filter.
 
         Returns:
             list[RetrievedDocument]: list of retrieved documents
@@ -163,6 +237,12 @@ class VectorRetrieval(BaseRetrieval):
         result: list[RetrievedDocument] = []
         # TODO: should declare scope directly in the run params
         scope = kwargs.pop("scope", None)
+        file_ids = kwargs.pop("file_ids", None)
+        ds_scope: dict = {}
+        if scope:
+            ds_scope["doc_ids"] = scope
+        if file_ids is not None:
+            ds_scope["file_ids"] = file_ids
         emb: list[float]
 
         if self.retrieval_mode == "vector":
@@ -178,15 +258,35 @@ class VectorRetrieval(BaseRetrieval):
         elif self.retrieval_mode == "text":
             query = text.text if isinstance(text, Document) else text
             docs = []
-            if scope:
-                docs = self.doc_store.query(
-                    query, top_k=top_k_first_round, doc_ids=scope
-                )
+            if ds_scope:
+                docs = self.doc_store.query(query, top_k=top_k_first_round, **ds_scope)
             result = [RetrievedDocument(**doc.to_dict(), score=-1.0) for doc in docs]
+        elif (
+            self.retrieval_mode == "hybrid"
+            and ds_scope
+            # the other vector store arguments are only supported by the queries
+            # of the vector store
+            and not kwargs.keys() - {"filters"}
+            and self.doc_store.supports_hybrid_query(self.vector_store)
+        ):
+            # one backend serves both stores, and fuses the results itself
+            emb = self.embedding(text)[0].embedding
+            query = text.text if isinstance(text, Document) else text
+            result = self.doc_store.hybrid_query(
+                query,
+                emb,
+                top_k=top_k_first_round,
+                fusion=self.hybrid_fusion,
+                text_weight=self.hybrid_text_weight,
+                rrf_k=self.rrf_k,
+                filters=kwargs.get("filters"),
+                **ds_scope,
+            )
+            print(f"Got {len(result)} from hybrid query")
         elif self.retrieval_mode == "hybrid":
             # similarity search section
             emb = self.embedding(text)[0].embedding
-            vs_docs: list[RetrievedDocument] = []
+            vs_docs: list[Document] = []
             vs_ids: list[str] = []
             vs_scores: list[float] = []
 
@@ -203,16 +303,16 @@ class VectorRetrieval(BaseRetrieval):
                     vs_docs = self.doc_store.get(vs_ids)
 
             # full-text search section
-            ds_docs: list[RetrievedDocument] = []
+            ds_docs: list[Document] = []
 
             def query_docstore():
                 nonlocal ds_docs
 
                 assert self.doc_store is not None
                 query = text.text if isinstance(text, Document) else text
-                if scope:
+                if ds_scope:
                     ds_docs = self.doc_store.query(
-                        query, top_k=top_k_first_round, doc_ids=scope
+                        query, top_k=top_k_first_round, **ds_scope
                     )
 
             vs_query_thread = threading.Thread(target=query_vectorstore)
@@ -224,20 +324,15 @@ class VectorRetrieval(BaseRetrieval):
             vs_query_thread.join()
             ds_query_thread.join()
 
-            result = [
-                RetrievedDocument(**doc.to_dict(), score=-1.0)
-                for doc in ds_docs
-                if doc not in vs_ids
-            ]
-            result += [
-                RetrievedDocument(**doc.to_dict(), score=score)
-                for doc, score in zip(vs_docs, vs_scores)
-            ]
+            result = self._fuse_results(vs_ids, vs_scores, vs_docs, ds_docs)
             print(f"Got {len(vs_docs)} from vectorstore")
             print(f"Got {len(ds_docs)} from docstore")
+            print(f"Got {len(result)} after fusion")
 
         # use additional reranker to re-order the document list
         if self.rerankers and text:
+            if self.rerank_top_k_mult:
+                result = self._filter_docs(result, top_k=top_k * self.rerank_top_k_mult)
             for reranker in self.rerankers:
                 # if reranker is LLMReranking, limit the document with top_k items only
                 if isinstance(reranker, LLMReranking):
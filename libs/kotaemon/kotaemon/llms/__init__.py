@@ -4,6 +4,7 @@ from .base import BaseLLM
 from .branching import GatedBranchingPipeline, SimpleBranchingPipeline
 from .chats import (
     AzureChatOpenAI,
+    CachedChatLLM,
     ChatLLM,
     ChatOpenAI,
     EndpointChatLLM,
@@ -25,6 +26,7 @@ __all__ = [
     "BaseLLM",
     # chat-specific components
     "ChatLLM",
+    "CachedChatLLM",
     "EndpointChatLLM",
     "BaseMessage",
     "HumanMessage",
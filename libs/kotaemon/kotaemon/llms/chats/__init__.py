@@ -1,4 +1,5 @@
 from .base import ChatLLM
+from .cache import CachedChatLLM
 from .endpoint_based import EndpointChatLLM
 from .langchain_based import (
     LCAnthropicChat,
@@ -16,6 +17,7 @@ __all__ = [
     "ChatOpenAI",
     "AzureChatOpenAI",
     "ChatLLM",
+    "CachedChatLLM",
     "EndpointChatLLM",
     "ChatOpenAI",
     "StructuredOutputChatOpenAI",
@@ -0,0 +1,454 @@
+"""Persistent response cache for chat models."""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import AsyncGenerator, Iterator, Optional
+
+import numpy as np
+
+from kotaemon.base import BaseMessage, HumanMessage, LLMInterface, Node, Param
+from kotaemon.embeddings import BaseEmbeddings
+from kotaemon.embeddings.cache import _identity_spec
+
+from .base import ChatLLM
+
+# the fields of LLMInterface that are stored with a cached response
+_RESPONSE_FIELDS = (
+    "candidates",
+    "completion_tokens",
+    "total_tokens",
+    "prompt_tokens",
+    "total_cost",
+    "logprobs",
+)
+
+
+def llm_identity(spec: dict) -> str:
+    """Return a stable identifier of a chat model from its dumped spec
+
+    As for the embedding cache, the credentials and transport settings of the
+    model are left out, while the model name, endpoint and sampling parameters
+    are part of the identity.
+    """
+    return hashlib.sha256(
+        json.dumps(_identity_spec(spec), sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _hash(value) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode(
+            "utf-8", errors="surrogatepass"
+        )
+    ).hexdigest()
+
+
+class LLMCacheStore:
+    """SQLite store of LLM responses with time-to-live and LRU eviction
+
+    Responses are stored as JSON keyed by a hash of the request. They expire
+    `ttl` seconds after being stored. Once more than `max_entries` responses
+    are stored, the least recently used ones are evicted until the count goes
+    under `evict_ratio` of the limit.
+
+    For the similarity lookup, the embedding of the query of a request can be
+    stored along the response, under a scope hashing the rest of the request.
+
+    Args:
+        path: path of the SQLite database file, or ":memory:"
+        ttl: seconds before a response expires, never if None
+        max_entries: maximum number of responses, unlimited if None
+        evict_ratio: fraction of `max_entries` to keep after an eviction
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        evict_ratio: float = 0.9,
+    ):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_ratio = evict_ratio
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, "
+            "model TEXT NOT NULL, "
+            "response TEXT NOT NULL, "
+            "created REAL NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access "
+            "ON responses (last_access)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            "key TEXT PRIMARY KEY, "
+            "scope TEXT NOT NULL, "
+            "vector BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS queries_scope ON queries (scope)"
+        )
+
+    def _expired(self, created: float, now: float) -> bool:
+        return bool(self.ttl) and created < now - self.ttl  # type: ignore
+
+    def _delete(self, keys: list[str]):
+        rows = [(key,) for key in keys]
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", rows)
+        self._conn.executemany("DELETE FROM queries WHERE key = ?", rows)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached response of the key, None if missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            now = time.time()
+            if self._expired(row[1], now):
+                self._delete([key])
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def set(
+        self,
+        key: str,
+        model: str,
+        response: dict,
+        scope: Optional[str] = None,
+        vector: Optional[list[float]] = None,
+    ):
+        """Store the response of the key, and the query embedding if given"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(key, model, response, created, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, model, json.dumps(response, default=str), now, now),
+                )
+                if scope is not None and vector is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO queries (key, scope, vector) "
+                        "VALUES (?, ?, ?)",
+                        (key, scope, np.asarray(vector, dtype=np.float32).tobytes()),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._maybe_evict()
+
+    def search(
+        self, scope: str, vector: list[float], threshold: float
+    ) -> Optional[str]:
+        """Return the key of the most similar query of the scope
+
+        Args:
+            scope: only the queries stored with this scope are compared
+            vector: the embedding of the query
+            threshold: minimum cosine similarity of the returned query
+
+        Returns:
+            the key of the query, None if no query is similar enough
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT queries.key, queries.vector, responses.created "
+                "FROM queries JOIN responses ON queries.key = responses.key "
+                "WHERE queries.scope = ?",
+                (scope,),
+            ).fetchall()
+
+        now = time.time()
+        rows = [row for row in rows if not self._expired(row[2], now)]
+        if not rows:
+            return None
+
+        query = np.asarray(vector, dtype=np.float32)
+        matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        similarities = matrix @ query / np.where(norms == 0, 1, norms)
+
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+        return rows[best][0]
+
+    def count(self) -> int:
+        (total,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return total
+
+    def _maybe_evict(self):
+        if self.ttl:
+            expired = self._conn.execute(
+                "SELECT key FROM responses WHERE created < ?",
+                (time.time() - self.ttl,),
+            ).fetchall()
+            self._delete([key for (key,) in expired])
+
+        if not self.max_entries:
+            return
+
+        total = self.count()
+        if total <= self.max_entries:
+            return
+
+        excess = total - int(self.max_entries * self.evict_ratio)
+
+        rows = self._conn.execute(
+            "SELECT key FROM responses ORDER BY last_access LIMIT ?", (excess,)
+        ).fetchall()
+        self._delete([key for (key,) in rows])
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.execute("DELETE FROM queries")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_stores: dict[str, LLMCacheStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_cache_store(
+    path: str | Path,
+    ttl: Optional[float] = None,
+    max_entries: Optional[int] = None,
+) -> LLMCacheStore:
+    """Return the store of the path, shared by the models caching to it"""
+    with _stores_lock:
+        store = _stores.get(str(path))
+        if store is None:
+            store = _stores[str(path)] = LLMCacheStore(
+                path, ttl=ttl, max_entries=max_entries
+            )
+        return store
+
+
+class CachedChatLLM(ChatLLM):
+    """Wrap a chat model with a persistent cache of its responses
+
+    A request is keyed by the identity of the wrapped model (class and
+    configuration), the messages and the call parameters, so a request sent
+    again, e.g. when an answer is regenerated or the same question is asked over
+    the same files, is answered from the cache instead of the model.
+
+    When `embedding` is set, a request missing from the cache is also matched by
+    the similarity of its last message (the query) with the queries of the
+    cached requests that have the same model, parameters and previous messages.
+    This should only be used for requests whose last message is a short query.
+
+    Only plain text and tool call responses are cached, and streamed responses
+    are replayed as a single chunk.
+
+    Example:
+        ```python
+        llm = CachedChatLLM(
+            llm=ChatOpenAI(model="gpt-4o-mini", api_key="..."),
+            cache_path="./llm_cache.db",
+        )
+        ```
+    """
+
+    llm: ChatLLM
+    cache_path: str = Param(
+        "llm_cache.db", help="Path of the SQLite cache database, or :memory:"
+    )
+    ttl: Optional[float] = Param(
+        7 * 24 * 3600, help="Seconds before a cached response expires, never if None"
+    )
+    max_entries: Optional[int] = Param(
+        100_000, help="Maximum number of cached responses, unlimited if None"
+    )
+    embedding: Optional[BaseEmbeddings] = Node(
+        None, help="Embedding model of the queries, for the similarity lookup"
+    )
+    similarity_threshold: float = Param(
+        0.95, help="Minimum cosine similarity of a query to reuse its response"
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hits = 0
+        self._misses = 0
+        self._counter_lock = threading.Lock()
+        self._model_identity: Optional[str] = None
+
+    @property
+    def cache_store(self) -> LLMCacheStore:
+        return get_cache_store(
+            self.cache_path, ttl=self.ttl, max_entries=self.max_entries
+        )
+
+    @property
+    def model_identity(self) -> str:
+        if self._model_identity is None:
+            self._model_identity = llm_identity(self.get_from_path("llm").dump())
+        return self._model_identity
+
+    @property
+    def hits(self) -> int:
+        """Number of requests served from the cache"""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """Number of requests sent to the wrapped model"""
+        return self._misses
+
+    def stats(self) -> dict:
+        """Return the cache statistics"""
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / total if total else 0.0,
+            "entries": self.cache_store.count(),
+        }
+
+    def _count(self, hit: bool):
+        with self._counter_lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def _request(self, messages, args, kwargs) -> tuple[str, str, Optional[str]]:
+        """Return the key, the scope and the query of a request"""
+        if isinstance(messages, (str, BaseMessage)):
+            messages = [messages]
+        items = [
+            ("HumanMessage", msg)
+            if isinstance(msg, str)
+            else (type(msg).__name__, msg.content)
+            for msg in messages
+        ]
+
+        params = [self.model_identity, list(args), kwargs]
+        key = _hash([params, items])
+        scope = _hash([params, items[:-1]])
+
+        query = None
+        if items and items[-1][0] == HumanMessage.__name__:
+            if isinstance(items[-1][1], str):
+                query = items[-1][1]
+        return key, scope, query
+
+    def _lookup(self, key: str, scope: str, query: Optional[str]):
+        """Return the cached response of the request, and the query embedding"""
+        cached = self.cache_store.get(key)
+        vector = None
+        if cached is None and self.embedding is not None and query:
+            vector = self.embedding(query)[0].embedding
+            similar = self.cache_store.search(scope, vector, self.similarity_threshold)
+            if similar is not None:
+                cached = self.cache_store.get(similar)
+
+        self._count(hit=cached is not None)
+        if cached is None:
+            return None, vector
+        return LLMInterface(**cached), vector
+
+    def _store(
+        self,
+        key: str,
+        scope: str,
+        vector: Optional[list[float]],
+        output: LLMInterface,
+    ):
+        if type(output) is not LLMInterface:
+            # e.g. structured outputs, which can't be rebuilt from JSON
+            return
+        if not output.content and not output.additional_kwargs:
+            return
+
+        response = {
+            "content": output.content,
+            "additional_kwargs": output.additional_kwargs,
+        }
+        for name in _RESPONSE_FIELDS:
+            response[name] = getattr(output, name)
+        self.cache_store.set(key, self.model_identity, response, scope, vector)
+
+    def invoke(self, messages, *args, **kwargs) -> LLMInterface:
+        key, scope, query = self._request(messages, args, kwargs)
+        cached, vector = self._lookup(key, scope, query)
+        if cached is not None:
+            return cached
+
+        output = self.get_from_path("llm").invoke(messages, *args, **kwargs)
+        self._store(key, scope, vector, output)
+        return output
+
+    async def ainvoke(self, messages, *args, **kwargs) -> LLMInterface:
+        key, scope, query = self._request(messages, args, kwargs)
+        cached, vector = self._lookup(key, scope, query)
+        if cached is not None:
+            return cached
+
+        output = await self.get_from_path("llm").ainvoke(messages, *args, **kwargs)
+        self._store(key, scope, vector, output)
+        return output
+
+    def stream(self, messages, *args, **kwargs) -> Iterator[LLMInterface]:
+        key, scope, query = self._request(messages, args, kwargs)
+        cached, vector = self._lookup(key, scope, query)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        for chunk in self.get_from_path("llm").stream(messages, *args, **kwargs):
+            chunks.append(chunk.content)
+            yield chunk
+
+        # only store the responses that were streamed until the end
+        self._store(key, scope, vector, LLMInterface(content="".join(chunks)))
+
+    async def astream(
+        self, messages, *args, **kwargs
+    ) -> AsyncGenerator[LLMInterface, None]:
+        key, scope, query = self._request(messages, args, kwargs)
+        cached, vector = self._lookup(key, scope, query)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        async for chunk in self.get_from_path("llm").astream(messages, *args, **kwargs):
+            chunks.append(chunk.content)
+            yield chunk
+
+        self._store(key, scope, vector, LLMInterface(content="".join(chunks)))
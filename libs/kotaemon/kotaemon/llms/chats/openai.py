@@ -11,6 +11,7 @@ from kotaemon.base import (
     Param,
     StructuredOutputLLMInterface,
 )
+from kotaemon.base.http_clients import clients
 
 from .base import ChatLLM
 
@@ -283,7 +284,7 @@ class ChatOpenAI(BaseChatOpenAI):
     model: str = Param(help="OpenAI model", required=True)
 
     def prepare_client(self, async_version: bool = False):
-        """Get the OpenAI client
+        """Get the OpenAI client, shared with the models of the same endpoint
 
         Args:
             async_version (bool): Whether to get the async version of the client
@@ -298,11 +299,11 @@ class ChatOpenAI(BaseChatOpenAI):
         if async_version:
             from openai import AsyncOpenAI
 
-            return AsyncOpenAI(**params)
+            return clients.openai_client(AsyncOpenAI, async_version=True, **params)
 
         from openai import OpenAI
 
-        return OpenAI(**params)
+        return clients.openai_client(OpenAI, **params)
 
     def prepare_params(self, **kwargs):
         if "tools_pydantic" in kwargs:
@@ -442,7 +443,7 @@ class AzureChatOpenAI(BaseChatOpenAI):
             return import_dotted_string(self.azure_ad_token_provider, safe=False)
 
     def prepare_client(self, async_version: bool = False):
-        """Get the OpenAI client
+        """Get the OpenAI client, shared with the models of the same endpoint
 
         Args:
             async_version (bool): Whether to get the async version of the client
@@ -459,11 +460,11 @@ class AzureChatOpenAI(BaseChatOpenAI):
         if async_version:
             from openai import AsyncAzureOpenAI
 
-            return AsyncAzureOpenAI(**params)
+            return clients.openai_client(AsyncAzureOpenAI, async_version=True, **params)
 
         from openai import AzureOpenAI
 
-        return AzureOpenAI(**params)
+        return clients.openai_client(AzureOpenAI, **params)
 
     def prepare_params(self, **kwargs):
         if "tools_pydantic" in kwargs:
@@ -9,6 +9,7 @@ from decouple import config
 from llama_index.core.readers.base import BaseReader
 
 from kotaemon.base import Document
+from kotaemon.storages.blobstores import BaseBlobStore
 
 logger = logging.getLogger(__name__)
 
@@ -37,12 +38,16 @@ class AdobeReader(BaseReader):
 
         max_figures_to_caption: an int decides how many figured will be captioned.
         The rest will be ignored (are indexed without captions).
+
+        blob_store: if given, store the figures in it and keep their blob URI in
+        the documents, instead of inlining them as base64
     """
 
     def __init__(
         self,
         vlm_endpoint: Optional[str] = None,
         max_figures_to_caption: int = 100,
+        blob_store: Optional[BaseBlobStore] = None,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -52,6 +57,7 @@ class AdobeReader(BaseReader):
         self.figure_regex = r"/Figure(\[\d+\])?$"
         self.vlm_endpoint = vlm_endpoint or DEFAULT_VLM_ENDPOINT
         self.max_figures_to_caption = max_figures_to_caption
+        self.blob_store = blob_store
 
     def load_data(
         self, file: Path, extra_info: Optional[Dict] = None, **kwargs
@@ -171,6 +177,8 @@ class AdobeReader(BaseReader):
 
         # figure elements
         for page_number, figure_content, figure_caption in figures:
+            if self.blob_store is not None:
+                figure_content = self.blob_store.put_data_uri(figure_content)
             documents.append(
                 Document(
                     text=figure_caption,
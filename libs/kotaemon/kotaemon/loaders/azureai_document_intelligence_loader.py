@@ -7,6 +7,7 @@ from typing import Optional
 from PIL import Image
 
 from kotaemon.base import Document, Param
+from kotaemon.storages.blobstores import BaseBlobStore
 
 from .base import BaseReader
 from .utils.adobe import generate_single_figure_caption
@@ -106,6 +107,13 @@ class AzureAIDocumentIntelligenceLoader(BaseReader):
         None,
         help="Directory to cache the downloaded files. Default is None",
     )
+    blob_store: Optional[BaseBlobStore] = Param(
+        None,
+        help=(
+            "Store the figures in this blob store and keep their blob URI in the "
+            "documents, instead of inlining them as base64"
+        ),
+    )
 
     @Param.auto(depends_on=["endpoint", "credential"])
     def client_(self):
@@ -178,6 +186,8 @@ class AzureAIDocumentIntelligenceLoader(BaseReader):
             )
 
             # store the image into document
+            if self.blob_store is not None:
+                img_base64 = self.blob_store.put_data_uri(img_base64)
             figure_metadata = {
                 "image_origin": img_base64,
                 "type": "image",
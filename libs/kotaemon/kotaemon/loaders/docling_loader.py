@@ -5,6 +5,7 @@ from pathlib import Path
 from typing import List, Optional
 
 from kotaemon.base import Document, Param
+from kotaemon.storages.blobstores import BaseBlobStore
 
 from .azureai_document_intelligence_loader import crop_image
 from .base import BaseReader
@@ -31,6 +32,13 @@ class DoclingReader(BaseReader):
         ),
     )
 
+    blob_store: Optional[BaseBlobStore] = Param(
+        None,
+        help=(
+            "Store the figures in this blob store and keep their blob URI in the "
+            "documents, instead of inlining them as base64"
+        ),
+    )
     figure_friendly_filetypes: list[str] = Param(
         [".pdf", ".jpeg", ".jpg", ".png", ".bmp", ".tiff", ".heif", ".tif"],
         help=(
@@ -131,6 +139,8 @@ class DoclingReader(BaseReader):
             caption = "\n".join(extractive_captions + [gen_caption])
 
             # store the image into document
+            if self.blob_store is not None:
+                img_base64 = self.blob_store.put_data_uri(img_base64)
             figure_metadata = {
                 "image_origin": img_base64,
                 "type": "image",
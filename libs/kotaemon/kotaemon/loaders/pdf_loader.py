@@ -1,7 +1,7 @@
 import base64
 from io import BytesIO
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from decouple import config
 from fsspec import AbstractFileSystem
@@ -9,6 +9,7 @@ from llama_index.readers.file import PDFReader
 from PIL import Image
 
 from kotaemon.base import Document
+from kotaemon.storages.blobstores import BaseBlobStore
 
 PDF_LOADER_DPI = config("PDF_LOADER_DPI", default=40, cast=int)
 
@@ -57,22 +58,39 @@ def convert_image_to_base64(img: Image.Image) -> str:
 
 
 class PDFThumbnailReader(PDFReader):
-    """PDF parser with thumbnail for each page."""
+    """PDF parser with thumbnail for each page.
 
-    def __init__(self) -> None:
+    Args:
+        blob_store: if given, store the thumbnails in it and keep their blob URI
+            in the documents, instead of inlining them as base64
+    """
+
+    def __init__(self, blob_store: Optional[BaseBlobStore] = None) -> None:
         """
         Initialize PDFReader.
         """
         super().__init__(return_full_document=False)
+        self.blob_store = blob_store
 
     def load_data(
         self,
         file: Path,
         extra_info: Optional[Dict] = None,
         fs: Optional[AbstractFileSystem] = None,
+        page_range: Optional[Tuple[int, int]] = None,
     ) -> List[Document]:
-        """Parse file."""
-        documents = super().load_data(file, extra_info, fs)
+        """Parse file.
+
+        Args:
+            page_range: (start, end) indices of the pages to parse, end excluded,
+                to parse a large file in several parts. Default to all pages.
+        """
+        if page_range is None:
+            documents = super().load_data(file, extra_info, fs)
+            first_page = 0
+        else:
+            documents = self._load_page_range(file, page_range, extra_info)
+            first_page = page_range[0]
 
         page_numbers_str = []
         filtered_docs = []
@@ -91,10 +109,14 @@ class PDFThumbnailReader(PDFReader):
                     continue
 
         documents = filtered_docs
-        page_numbers = list(range(len(page_numbers_str)))
+        page_numbers = list(range(first_page, first_page + len(page_numbers_str)))
 
         print("Page numbers:", len(page_numbers))
         page_thumbnails = get_page_thumbnails(file, page_numbers)
+        if self.blob_store is not None:
+            page_thumbnails = [
+                self.blob_store.put_data_uri(thumbnail) for thumbnail in page_thumbnails
+            ]
 
         documents.extend(
             [
@@ -115,3 +137,26 @@ class PDFThumbnailReader(PDFReader):
         )
 
         return documents
+
+    def _load_page_range(
+        self, file: Path, page_range: Tuple[int, int], extra_info: Optional[Dict]
+    ) -> List[Document]:
+        """Extract the text of the pages in the range, like PDFReader does"""
+        import pypdf
+
+        start, end = page_range
+        documents = []
+        with open(file, "rb") as fp:
+            pdf = pypdf.PdfReader(fp)
+            for page in range(start, min(end, len(pdf.pages))):
+                metadata = {
+                    "page_label": pdf.page_labels[page],
+                    "file_name": Path(file).name,
+                }
+                if extra_info is not None:
+                    metadata.update(extra_info)
+                documents.append(
+                    Document(text=pdf.pages[page].extract_text(), metadata=metadata)
+                )
+
+        return documents
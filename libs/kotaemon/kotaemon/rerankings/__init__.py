@@ -1,6 +1,13 @@
 from .base import BaseReranking
 from .cohere import CohereReranking
+from .onnx_cross_encoder import ONNXCrossEncoderReranking
 from .tei_fast_rerank import TeiFastReranking
 from .voyageai import VoyageAIReranking
 
-__all__ = ["BaseReranking", "TeiFastReranking", "CohereReranking", "VoyageAIReranking"]
+__all__ = [
+    "BaseReranking",
+    "TeiFastReranking",
+    "CohereReranking",
+    "VoyageAIReranking",
+    "ONNXCrossEncoderReranking",
+]
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from kotaemon.base import Document, Param
+
+from .base import BaseReranking
+
+if TYPE_CHECKING:
+    from onnxruntime import InferenceSession
+    from tokenizers import Tokenizer
+
+_load_lock = threading.Lock()
+
+
+def plan_batches(lengths: list[int], max_tokens: int) -> list[list[int]]:
+    """Group the sequences in batches of at most `max_tokens` padded tokens
+
+    The sequences are sorted by length, so each batch is padded to the length of
+    its longest sequence with little waste: many short sequences go in one
+    batch, and long ones in smaller batches.
+
+    Args:
+        lengths: the number of tokens of each sequence
+        max_tokens: max number of sequences in a batch times their padded length
+
+    Returns:
+        the indices of the sequences of each batch
+    """
+    batches: list[list[int]] = []
+    for idx in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        # the longest sequence of the batch so far, as the lengths are sorted
+        length = max(lengths[idx], 1)
+        if batches and (len(batches[-1]) + 1) * length <= max_tokens:
+            batches[-1].append(idx)
+        else:
+            batches.append([idx])
+    return batches
+
+
+@lru_cache(maxsize=16)
+def _download_model(
+    model_name: str, onnx_file: str, cache_dir: Optional[str]
+) -> tuple[str, str]:
+    """Download the model once per process, return its model and tokenizer files"""
+    from huggingface_hub import hf_hub_download
+
+    return (
+        hf_hub_download(model_name, onnx_file, cache_dir=cache_dir),
+        hf_hub_download(model_name, "tokenizer.json", cache_dir=cache_dir),
+    )
+
+
+@lru_cache(maxsize=4)
+def _load_model(
+    model_file: str, tokenizer_file: str, max_length: int, threads: Optional[int]
+) -> tuple["InferenceSession", "Tokenizer"]:
+    """Load the ONNX session and the tokenizer, shared by the rerankers"""
+    try:
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+    except ImportError:
+        raise ImportError(
+            "Please install onnxruntime and tokenizers: "
+            "`pip install onnxruntime tokenizers`"
+        )
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+
+    session = ort.InferenceSession(
+        model_file, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+    tokenizer = Tokenizer.from_file(tokenizer_file)
+    tokenizer.no_padding()
+    # only the longer sequence of the pair is cut, usually the document
+    tokenizer.enable_truncation(max_length, strategy="longest_first")
+    return session, tokenizer
+
+
+class ONNXCrossEncoderReranking(BaseReranking):
+    """Cross-encoder reranking model running in-process on CPU with ONNX Runtime
+
+    The model is an ONNX export of a Hugging Face cross-encoder, with its
+    `tokenizer.json`, e.g. the `onnx/` folder of the Xenova repositories. The
+    query and document pairs are truncated to `max_length` tokens, and scored in
+    batches of similar lengths, so no compute is spent on padding.
+
+    The relevance score of each document is the sigmoid of the model logit,
+    stored in `reranking_score` as for the other rerankers.
+    """
+
+    model_name: str = Param(
+        "Xenova/ms-marco-MiniLM-L-6-v2",
+        help=(
+            "Hugging Face repository of the model, with an ONNX export and its "
+            "tokenizer.json (e.g. Xenova/ms-marco-MiniLM-L-6-v2, "
+            "Xenova/bge-reranker-base, jinaai/jina-reranker-v1-turbo-en)"
+        ),
+        required=True,
+    )
+    model_path: Optional[str] = Param(
+        None,
+        help=(
+            "Local folder of the model, used instead of downloading `model_name`. "
+            "It must hold `onnx_file` and tokenizer.json"
+        ),
+    )
+    onnx_file: str = Param(
+        "onnx/model.onnx", help="Path of the ONNX model inside the model folder"
+    )
+    quantized: bool = Param(
+        False,
+        help=(
+            "Use the int8 quantized model (onnx/model_quantized.onnx), which is "
+            "faster on CPU at a small loss of accuracy"
+        ),
+    )
+    max_length: int = Param(
+        512, help="Maximum number of tokens of a query and document pair"
+    )
+    batch_max_tokens: int = Param(
+        16384,
+        help="Maximum number of padded tokens scored in one batch",
+    )
+    threads: Optional[int] = Param(
+        None,
+        help=(
+            "Number of CPU threads of the ONNX Runtime session. "
+            "If None, use the default onnxruntime threading"
+        ),
+    )
+    cache_dir: Optional[str] = Param(
+        None, help="Cache folder of the downloaded models, the Hugging Face default"
+    )
+
+    def load(self) -> tuple["InferenceSession", "Tokenizer"]:
+        """Get the ONNX session and the tokenizer of the model"""
+        onnx_file = self.onnx_file
+        if self.quantized and not onnx_file.endswith("_quantized.onnx"):
+            onnx_file = onnx_file[: -len(".onnx")] + "_quantized.onnx"
+
+        with _load_lock:
+            if self.model_path:
+                folder = Path(self.model_path)
+                model_file = str(folder / onnx_file)
+                tokenizer_file = str(folder / "tokenizer.json")
+            else:
+                model_file, tokenizer_file = _download_model(
+                    self.model_name, onnx_file, self.cache_dir
+                )
+            return _load_model(
+                model_file, tokenizer_file, self.max_length, self.threads
+            )
+
+    def score(self, query: str, texts: list[str]) -> list[float]:
+        """Return the relevance score of each text to the query"""
+        if not texts:
+            return []
+
+        session, tokenizer = self.load()
+        encodings = tokenizer.encode_batch([(query, text) for text in texts])
+
+        input_names = {input_.name for input_ in session.get_inputs()}
+        scores = np.zeros(len(texts), dtype=np.float32)
+        for batch in plan_batches(
+            [len(encoding.ids) for encoding in encodings], self.batch_max_tokens
+        ):
+            length = max(len(encodings[idx].ids) for idx in batch)
+            input_ids = np.zeros((len(batch), length), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), length), dtype=np.int64)
+            token_type_ids = np.zeros((len(batch), length), dtype=np.int64)
+            for row, idx in enumerate(batch):
+                encoding = encodings[idx]
+                size = len(encoding.ids)
+                input_ids[row, :size] = encoding.ids
+                attention_mask[row, :size] = encoding.attention_mask
+                token_type_ids[row, :size] = encoding.type_ids
+
+            inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in input_names:
+                inputs["token_type_ids"] = token_type_ids
+
+            logits = session.run(None, inputs)[0]
+            if logits.ndim == 2 and logits.shape[1] == 2:
+                # classifiers with a (not relevant, relevant) output
+                logits = logits[:, 1] - logits[:, 0]
+            scores[batch] = logits.reshape(len(batch))
+
+        # sigmoid, without overflow for the large logits
+        return np.exp(-np.logaddexp(0, -scores)).tolist()
+
+    def run(self, documents: list[Document], query: str) -> list[Document]:
+        """Re-order the documents with their relevance score to the query"""
+        if not documents:
+            return []
+
+        scores = self.score(query, [doc.text for doc in documents])
+        for doc, score in zip(documents, scores):
+            doc.metadata["reranking_score"] = score
+
+        return sorted(
+            documents, key=lambda doc: doc.metadata["reranking_score"], reverse=True
+        )
@@ -1,33 +1,43 @@
+from .blobstores import BaseBlobStore, LocalFileBlobStore
 from .docstores import (
     BaseDocumentStore,
     ElasticsearchDocumentStore,
     InMemoryDocumentStore,
     LanceDBDocumentStore,
+    LogStructuredDocumentStore,
     SimpleFileDocumentStore,
 )
 from .vectorstores import (
     BaseVectorStore,
     ChromaVectorStore,
+    ElasticsearchVectorStore,
     InMemoryVectorStore,
     LanceDBVectorStore,
     MilvusVectorStore,
+    NumpyFlatVectorStore,
     QdrantVectorStore,
     SimpleFileVectorStore,
 )
 
 __all__ = [
+    # Blob stores
+    "BaseBlobStore",
+    "LocalFileBlobStore",
     # Document stores
     "BaseDocumentStore",
     "InMemoryDocumentStore",
     "ElasticsearchDocumentStore",
     "SimpleFileDocumentStore",
     "LanceDBDocumentStore",
+    "LogStructuredDocumentStore",
     # Vector stores
     "BaseVectorStore",
     "ChromaVectorStore",
+    "ElasticsearchVectorStore",
     "InMemoryVectorStore",
     "SimpleFileVectorStore",
     "LanceDBVectorStore",
     "MilvusVectorStore",
     "QdrantVectorStore",
+    "NumpyFlatVectorStore",
 ]
@@ -0,0 +1,53 @@
+from functools import cache
+from typing import Optional
+
+from theflow.settings import settings as flowsettings
+
+from .base import BLOB_URI_PREFIX, BaseBlobStore, is_blob_uri
+from .local import LocalFileBlobStore
+
+
+@cache
+def get_default_blob_store() -> Optional[BaseBlobStore]:
+    """The blob store at `KH_BLOB_STORE_PATH` in flowsettings, if configured"""
+    path = getattr(flowsettings, "KH_BLOB_STORE_PATH", None)
+    if not path:
+        return None
+    return LocalFileBlobStore(path)
+
+
+def resolve_blob(value: str) -> str:
+    """Load a blob URI as a base64 data URI, other values are returned unchanged
+
+    Use it where the image content is needed, e.g. to send it to a VLM.
+    """
+    if not is_blob_uri(value):
+        return value
+    store = get_default_blob_store()
+    if store is None:
+        raise ValueError(f"No blob store configured to resolve {value}")
+    return store.to_data_uri(value)
+
+
+def blob_url(value: str) -> str:
+    """The HTTP URL of a blob URI, other values are returned unchanged
+
+    Use it to display the image in HTML without inlining its content.
+    """
+    if not is_blob_uri(value):
+        return value
+    store = get_default_blob_store()
+    if store is None:
+        raise ValueError(f"No blob store configured to resolve {value}")
+    return store.url(value)
+
+
+__all__ = [
+    "BLOB_URI_PREFIX",
+    "BaseBlobStore",
+    "LocalFileBlobStore",
+    "blob_url",
+    "get_default_blob_store",
+    "is_blob_uri",
+    "resolve_blob",
+]
@@ -0,0 +1,84 @@
+import base64
+import binascii
+from abc import ABC, abstractmethod
+from typing import Optional
+
+BLOB_URI_PREFIX = "kh-blob://"
+
+
+def is_blob_uri(value) -> bool:
+    """Check if the value is a reference to a blob"""
+    return isinstance(value, str) and value.startswith(BLOB_URI_PREFIX)
+
+
+def parse_data_uri(uri: str) -> Optional[tuple[str, bytes]]:
+    """Return the mime type and content of a base64 data URI, or None"""
+    if not uri.startswith("data:"):
+        return None
+    header, _, data = uri.partition(",")
+    if not header.endswith(";base64"):
+        return None
+    try:
+        return header[len("data:") : -len(";base64")], base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        return None
+
+
+class BaseBlobStore(ABC):
+    """A blob store keeps binary content (images...) out of the documents
+
+    Blobs are addressed by the hash of their content: storing the same content
+    twice returns the same `kh-blob://` URI and keeps a single copy.
+    """
+
+    @abstractmethod
+    def put(self, data: bytes, mime_type: str = "image/png") -> str:
+        """Store the content and return its blob URI"""
+        ...
+
+    @abstractmethod
+    def get(self, uri: str) -> bytes:
+        """Get the content of the blob URI"""
+        ...
+
+    @abstractmethod
+    def exists(self, uri: str) -> bool:
+        """Check if the blob URI is stored"""
+        ...
+
+    @abstractmethod
+    def delete(self, uri: str):
+        """Delete the blob URI"""
+        ...
+
+    @abstractmethod
+    def url(self, uri: str) -> str:
+        """URL to serve the blob URI over HTTP"""
+        ...
+
+    def mime_type(self, uri: str) -> str:
+        """The mime type of the blob URI"""
+        from mimetypes import guess_type
+
+        return guess_type(uri)[0] or "application/octet-stream"
+
+    def put_data_uri(self, data_uri: str) -> str:
+        """Store the content of the base64 data URI and return its blob URI
+
+        Values that are not base64 data URIs are returned unchanged.
+        """
+        parsed = parse_data_uri(data_uri)
+        if parsed is None:
+            return data_uri
+        mime_type, data = parsed
+        return self.put(data, mime_type=mime_type)
+
+    def to_data_uri(self, uri: str) -> str:
+        """Load the blob URI as a base64 data URI
+
+        Values that are not blob URIs are returned unchanged.
+        """
+        if not is_blob_uri(uri):
+            return uri
+        data = base64.b64encode(self.get(uri)).decode("utf-8")
+        return f"data:{self.mime_type(uri)};base64,{data}"
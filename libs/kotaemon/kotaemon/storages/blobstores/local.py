@@ -0,0 +1,76 @@
+import hashlib
+import os
+import re
+import tempfile
+from mimetypes import guess_extension
+from pathlib import Path
+from typing import Union
+
+from .base import BLOB_URI_PREFIX, BaseBlobStore, is_blob_uri
+
+_BLOB_NAME_RE = re.compile(r"[0-9a-f]{64}(\.[A-Za-z0-9]+)?")
+
+
+class LocalFileBlobStore(BaseBlobStore):
+    """Store the blobs as files on disk, named by the sha256 of their content
+
+    The blob `kh-blob://<sha256><ext>` is stored in the file
+    `<path>/<sha256[:2]>/<sha256><ext>`.
+    Blobs are written to a temporary file then renamed, so concurrent writers of
+    the same content never expose a partial file.
+
+    Args:
+        path: the directory to store the blobs
+        url_prefix: prefix of the HTTP URLs of the blobs, the blob file path is
+            appended to it. Default to the gradio file route.
+    """
+
+    def __init__(self, path: Union[str, Path], url_prefix: str = "file="):
+        self._path = Path(path).resolve()
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._url_prefix = url_prefix
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def file_path(self, uri: str) -> Path:
+        """The path of the file storing the blob URI"""
+        if not is_blob_uri(uri):
+            raise ValueError(f"Not a blob URI: {uri[:64]}")
+        name = uri[len(BLOB_URI_PREFIX) :]
+        if not _BLOB_NAME_RE.fullmatch(name):
+            raise ValueError(f"Invalid blob URI: {uri}")
+        return self._path / name[:2] / name
+
+    def put(self, data: bytes, mime_type: str = "image/png") -> str:
+        ext = guess_extension(mime_type) or ""
+        uri = f"{BLOB_URI_PREFIX}{hashlib.sha256(data).hexdigest()}{ext}"
+        file_path = self.file_path(uri)
+        if file_path.exists():
+            return uri
+
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return uri
+
+    def get(self, uri: str) -> bytes:
+        return self.file_path(uri).read_bytes()
+
+    def exists(self, uri: str) -> bool:
+        return self.file_path(uri).exists()
+
+    def delete(self, uri: str):
+        self.file_path(uri).unlink(missing_ok=True)
+
+    def url(self, uri: str) -> str:
+        if not is_blob_uri(uri):
+            return uri
+        return f"{self._url_prefix}{self.file_path(uri)}"
@@ -2,6 +2,7 @@ from .base import BaseDocumentStore
 from .elasticsearch import ElasticsearchDocumentStore
 from .in_memory import InMemoryDocumentStore
 from .lancedb import LanceDBDocumentStore
+from .log_structured import LogStructuredDocumentStore
 from .simple_file import SimpleFileDocumentStore
 
 __all__ = [
@@ -10,4 +11,5 @@ __all__ = [
     "ElasticsearchDocumentStore",
     "SimpleFileDocumentStore",
     "LanceDBDocumentStore",
+    "LogStructuredDocumentStore",
 ]
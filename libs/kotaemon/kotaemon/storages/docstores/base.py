@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Union
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Iterator, List, Optional, Union
 
-from kotaemon.base import Document
+from kotaemon.base import Document, RetrievedDocument
+
+if TYPE_CHECKING:
+    from ..vectorstores import BaseVectorStore
 
 
 class BaseDocumentStore(ABC):
@@ -43,9 +47,21 @@ class BaseDocumentStore(ABC):
 
     @abstractmethod
     def query(
-        self, query: str, top_k: int = 10, doc_ids: Optional[list] = None
+        self,
+        query: str,
+        top_k: int = 10,
+        doc_ids: Optional[list] = None,
+        file_ids: Optional[list] = None,
     ) -> List[Document]:
-        """Search document store using search query"""
+        """Search document store using search query
+
+        Args:
+            query: query text
+            top_k: number of top documents to return
+            doc_ids: if provided, only search within these documents
+            file_ids: if provided, only search within the documents whose
+                `file_id` metadata is one of these
+        """
         ...
 
     @abstractmethod
@@ -57,3 +73,64 @@ class BaseDocumentStore(ABC):
     def drop(self):
         """Drop the document store"""
         ...
+
+    def supports_hybrid_query(self, vector_store: "BaseVectorStore") -> bool:
+        """Whether `hybrid_query` can search this store and the vector store at once
+
+        This is the case of the backends serving both roles, which keep the
+        embeddings of the vector store in the same collection as the documents.
+        """
+        return False
+
+    def hybrid_query(
+        self,
+        query: str,
+        embedding: list[float],
+        top_k: int = 10,
+        doc_ids: Optional[list] = None,
+        file_ids: Optional[list] = None,
+        fusion: str = "rrf",
+        text_weight: float = 0.5,
+        rrf_k: int = 60,
+        filters: Optional[Any] = None,
+    ) -> List[RetrievedDocument]:
+        """Search the documents with the query text and embedding in one request,
+        the results being fused by the backend
+
+        Args:
+            query: query text
+            embedding: embedding of the query
+            top_k: number of top documents to return
+            doc_ids: if provided, only search within these documents
+            file_ids: if provided, only search within the documents whose
+                `file_id` metadata is one of these
+            fusion: "rrf" or "weighted", as `VectorRetrieval.hybrid_fusion`
+            text_weight: weight of the full-text search in the fusion
+            rrf_k: constant of the reciprocal rank fusion
+            filters: if provided, llama-index `MetadataFilters` the documents must
+                match, as in the vector store queries
+
+        Returns:
+            the documents, with their vector similarity as `score` (-1.0 if they
+            don't have an embedding) and their fused score in
+            `retrieval_metadata["fusion_score"]`
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def deferred_indices(self) -> Iterator[None]:
+        """Defer the search index maintenance of `add` and `delete` to the end of
+        the block, where `optimize` is called once
+
+        Stores whose search index is updated in place don't need to defer it.
+        """
+        try:
+            yield
+        finally:
+            self.optimize()
+
+    def optimize(self):
+        """Bring the search indices and the storage up to date after bulk operations
+
+        Stores whose search index is updated in place have nothing to do.
+        """
@@ -0,0 +1,261 @@
+"""Lightweight BM25 inverted index used by the in-process document stores."""
+from __future__ import annotations
+
+import math
+import pickle
+import re
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+BM25_INDEX_VERSION = 1
+
+# CJK scripts are not space-separated, they are indexed as character bigrams
+_CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK_RANGES}]+|[^\W_{_CJK_RANGES}]+")
+_CJK_PATTERN = re.compile(rf"[{_CJK_RANGES}]")
+
+ENGLISH_STOPWORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such that "
+    "the their then there these they this to was will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lower-cased word tokens, and CJK text into bigrams"""
+    words = _TOKEN_PATTERN.findall(text.lower())
+    if not _CJK_PATTERN.search(text):
+        return [word for word in words if word not in ENGLISH_STOPWORDS]
+
+    tokens = []
+    for token in words:
+        if _CJK_PATTERN.match(token):
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i : i + 2] for i in range(len(token) - 1))
+        elif token not in ENGLISH_STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """In-memory inverted index with BM25 scoring
+
+    Each document is assigned an internal number. For every term, the posting list
+    keeps the document numbers and term frequencies in two compact int32 arrays,
+    which can be appended to incrementally and are scored with numpy at query time.
+    Deleted documents are masked out and physically removed from the posting lists
+    once they represent more than `compact_ratio` of the indexed documents.
+
+    Args:
+        k1: term frequency saturation parameter
+        b: document length normalization parameter
+        compact_ratio: fraction of deleted documents that triggers a compaction
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self._doc_ids: list[Optional[str]] = []
+        self._id_to_num: dict[str, int] = {}
+        self._lengths = array("i")
+        self._alive = bytearray()
+        self._postings: dict[str, tuple[array, array]] = {}
+        self._total_length = 0
+        self._n_deleted = 0
+
+    def __len__(self) -> int:
+        return len(self._id_to_num)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._id_to_num
+
+    def doc_ids(self) -> set[str]:
+        return set(self._id_to_num)
+
+    def add(self, doc_id: str, text: str):
+        """Add (or replace) a document in the index"""
+        self.add_many([(doc_id, text)])
+
+    def add_many(self, items: Iterable[tuple[str, str]]):
+        """Add (or replace) several documents in the index"""
+        with self._lock:
+            for doc_id, text in items:
+                if doc_id in self._id_to_num:
+                    self._delete(doc_id)
+
+                tokens = tokenize(text or "")
+                num = len(self._doc_ids)
+                self._doc_ids.append(doc_id)
+                self._id_to_num[doc_id] = num
+                self._lengths.append(len(tokens))
+                self._alive.append(1)
+                self._total_length += len(tokens)
+
+                for token, freq in Counter(tokens).items():
+                    posting = self._postings.get(token)
+                    if posting is None:
+                        posting = self._postings[token] = (array("i"), array("i"))
+                    posting[0].append(num)
+                    posting[1].append(freq)
+
+    def _delete(self, doc_id: str):
+        num = self._id_to_num.pop(doc_id, None)
+        if num is None:
+            return
+        self._doc_ids[num] = None
+        self._alive[num] = 0
+        self._total_length -= self._lengths[num]
+        self._n_deleted += 1
+
+    def delete(self, doc_ids: Iterable[str]):
+        """Remove documents from the index"""
+        with self._lock:
+            for doc_id in doc_ids:
+                self._delete(doc_id)
+
+            if self._n_deleted > self.compact_ratio * len(self._doc_ids):
+                self.compact()
+
+    def compact(self):
+        """Drop the deleted documents from the posting lists"""
+        with self._lock:
+            if not self._n_deleted:
+                return
+
+            alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+            # map old document numbers to new ones
+            remap = np.cumsum(alive, dtype=np.int32) - 1
+
+            postings = {}
+            for token, (docs, freqs) in self._postings.items():
+                docs_np = np.frombuffer(docs, dtype=np.int32)
+                keep = alive[docs_np]
+                if not keep.any():
+                    continue
+                postings[token] = (
+                    array("i", remap[docs_np[keep]].tobytes()),
+                    array("i", np.frombuffer(freqs, dtype=np.int32)[keep].tobytes()),
+                )
+
+            lengths = np.frombuffer(self._lengths, dtype=np.int32)[alive]
+            doc_ids = [doc_id for doc_id in self._doc_ids if doc_id is not None]
+
+            self._postings = postings
+            self._doc_ids = list(doc_ids)
+            self._id_to_num = {doc_id: num for num, doc_id in enumerate(doc_ids)}
+            self._lengths = array("i", lengths.tobytes())
+            self._alive = bytearray(b"\x01" * len(doc_ids))
+            self._n_deleted = 0
+
+    def search(
+        self, query: str, top_k: int = 10, doc_ids: Optional[Iterable[str]] = None
+    ) -> list[tuple[str, float]]:
+        """Return the (doc_id, score) of the top_k documents matching the query
+
+        Args:
+            query: the search query
+            top_k: number of documents to return
+            doc_ids: if provided, only search within these documents
+        """
+        terms = set(tokenize(query))
+
+        with self._lock:
+            n_docs = len(self._id_to_num)
+            if not n_docs or not terms or top_k <= 0:
+                return []
+
+            avgdl = max(self._total_length / n_docs, 1e-6)
+            lengths = np.frombuffer(self._lengths, dtype=np.int32)
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                docs = np.frombuffer(posting[0], dtype=np.int32)
+                freqs = np.frombuffer(posting[1], dtype=np.int32).astype(np.float32)
+                df = len(docs)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / avgdl)
+                scores[docs] += idf * freqs * (self.k1 + 1.0) / (freqs + norm)
+
+            if self._n_deleted:
+                scores *= np.frombuffer(self._alive, dtype=np.uint8)
+            if doc_ids is not None:
+                scope = np.zeros(len(self._doc_ids), dtype=bool)
+                nums = [
+                    self._id_to_num[doc_id]
+                    for doc_id in doc_ids
+                    if doc_id in self._id_to_num
+                ]
+                scope[nums] = True
+                scores[~scope] = 0.0
+
+            candidates = np.flatnonzero(scores > 0)
+            if not candidates.size:
+                return []
+            k = min(top_k, candidates.size)
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            top = top[np.argsort(-scores[top], kind="stable")]
+
+            return [
+                (self._doc_ids[num], float(scores[num]))  # type: ignore[misc]
+                for num in top
+            ]
+
+    def save(self, path: str | Path):
+        """Save the index to a file"""
+        with self._lock:
+            state = {
+                "version": BM25_INDEX_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "compact_ratio": self.compact_ratio,
+                "doc_ids": self._doc_ids,
+                "lengths": self._lengths.tobytes(),
+                "alive": bytes(self._alive),
+                "postings": {
+                    token: (docs.tobytes(), freqs.tobytes())
+                    for token, (docs, freqs) in self._postings.items()
+                },
+                "total_length": self._total_length,
+            }
+        tmp_path = Path(f"{path}.tmp")
+        with tmp_path.open("wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BM25Index":
+        """Load the index from a file created by `save`"""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != BM25_INDEX_VERSION:
+            raise ValueError(f"Unsupported BM25 index version in {path}")
+
+        index = cls(k1=state["k1"], b=state["b"], compact_ratio=state["compact_ratio"])
+        index._doc_ids = state["doc_ids"]
+        index._id_to_num = {
+            doc_id: num
+            for num, doc_id in enumerate(index._doc_ids)
+            if doc_id is not None
+        }
+        index._lengths = array("i", state["lengths"])
+        index._alive = bytearray(state["alive"])
+        index._postings = {
+            token: (array("i", docs), array("i", freqs))
+            for token, (docs, freqs) in state["postings"].items()
+        }
+        index._total_length = state["total_length"]
+        index._n_deleted = len(index._doc_ids) - len(index._id_to_num)
+        return index
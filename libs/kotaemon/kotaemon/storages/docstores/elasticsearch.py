@@ -1,12 +1,102 @@
-from typing import List, Optional, Union
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Union
 
-from kotaemon.base import Document
+from kotaemon.base import Document, RetrievedDocument
 
 from .base import BaseDocumentStore
 
+if TYPE_CHECKING:
+    from ..vectorstores import BaseVectorStore
+
 MAX_DOCS_TO_GET = 10**4
 
 
+def metadata_field(properties: dict, key: str) -> str:
+    """The field to filter the documents by a metadata key, its `.keyword`
+    sub-field if it is mapped as text
+
+    Args:
+        properties: the properties of the mappings of the index
+        key: the metadata key
+    """
+    metadata = properties.get("metadata", {}).get("properties", {})
+    if metadata.get(key, {}).get("type") == "text":
+        return f"metadata.{key}.keyword"
+    return f"metadata.{key}"
+
+
+def metadata_filters_query(filters, field: Callable[[str], str]) -> Optional[dict]:
+    """Build the Elasticsearch filter from llama-index `MetadataFilters`
+
+    Args:
+        filters: the metadata filters
+        field: gives the field to filter the documents by a metadata key
+    """
+    must: list[dict] = []
+    must_not: list[dict] = []
+    for each in filters.filters:
+        if hasattr(each, "filters"):
+            query = metadata_filters_query(each, field)
+            if query is not None:
+                must.append(query)
+            continue
+
+        field_name = field(each.key)
+        operator = getattr(each.operator, "value", each.operator)
+        if operator in ("==", "!="):
+            condition = {"term": {field_name: each.value}}
+        elif operator in ("in", "nin"):
+            condition = {"terms": {field_name: each.value}}
+        elif operator in (">", "<", ">=", "<="):
+            range_op = {">": "gt", "<": "lt", ">=": "gte", "<=": "lte"}[operator]
+            condition = {"range": {field_name: {range_op: each.value}}}
+        else:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+        (must_not if operator in ("!=", "nin") else must).append(condition)
+
+    if not must and not must_not:
+        return None
+
+    condition = getattr(filters, "condition", "and")
+    condition = getattr(condition, "value", condition) or "and"
+    if condition == "or":
+        should = must + [{"bool": {"must_not": [each]}} for each in must_not]
+        return {"bool": {"should": should, "minimum_should_match": 1}}
+    return {"bool": {"must": must, "must_not": must_not}}
+
+
+def create_index(client, index_name: str, k1: float = 2.0, b: float = 0.75):
+    """Create the index of the documents, if it doesn't exist yet
+
+    The index is shared by `ElasticsearchDocumentStore` and
+    `ElasticsearchVectorStore`, so both create it with the same mappings.
+    """
+    # Define the index settings and mappings
+    settings = {
+        "analysis": {"analyzer": {"default": {"type": "standard"}}},
+        "similarity": {
+            "custom_bm25": {
+                "type": "BM25",
+                "k1": k1,
+                "b": b,
+            }
+        },
+    }
+    mappings = {
+        "properties": {
+            "content": {
+                "type": "text",
+                "similarity": "custom_bm25",  # Use the custom BM25 similarity
+            },
+            # exact match, to scope the search to some files
+            "metadata": {"properties": {"file_id": {"type": "keyword"}}},
+        }
+    }
+
+    # Create the index with the specified settings and mappings
+    if not client.indices.exists(index=index_name):
+        client.indices.create(index=index_name, mappings=mappings, settings=settings)
+
+
 class ElasticsearchDocumentStore(BaseDocumentStore):
     """Simple memory document store that store document in a dictionary"""
 
@@ -34,31 +124,24 @@ class ElasticsearchDocumentStore(BaseDocumentStore):
         # Create an Elasticsearch client instance
         self.client = Elasticsearch(elasticsearch_url, **kwargs)
         self.es_bulk = bulk
-        # Define the index settings and mappings
-        settings = {
-            "analysis": {"analyzer": {"default": {"type": "standard"}}},
-            "similarity": {
-                "custom_bm25": {
-                    "type": "BM25",
-                    "k1": k1,
-                    "b": b,
-                }
-            },
-        }
-        mappings = {
-            "properties": {
-                "content": {
-                    "type": "text",
-                    "similarity": "custom_bm25",  # Use the custom BM25 similarity
-                }
-            }
-        }
+        create_index(self.client, self.index_name, k1=k1, b=b)
+        self._file_id_field: Optional[str] = None
 
-        # Create the index with the specified settings and mappings
-        if not self.client.indices.exists(index=self.index_name):
-            self.client.indices.create(
-                index=self.index_name, mappings=mappings, settings=settings
-            )
+    def get_file_id_field(self) -> str:
+        """The field to filter the documents by file id
+
+        Indices created before `file_id` was mapped as keyword only have the
+        `.keyword` sub-field of the dynamic mapping for exact matches.
+        """
+        if self._file_id_field is None:
+            mapping = self.client.indices.get_mapping(index=self.index_name)
+            properties = mapping[self.index_name]["mappings"].get("properties", {})
+            metadata = properties.get("metadata", {}).get("properties", {})
+            if metadata.get("file_id", {}).get("type") == "keyword":
+                self._file_id_field = "metadata.file_id"
+            else:
+                self._file_id_field = "metadata.file_id.keyword"
+        return self._file_id_field
 
     def add(
         self,
@@ -122,7 +205,11 @@ class ElasticsearchDocumentStore(BaseDocumentStore):
         return docs
 
     def query(
-        self, query: str, top_k: int = 10, doc_ids: Optional[list] = None
+        self,
+        query: str,
+        top_k: int = 10,
+        doc_ids: Optional[list] = None,
+        file_ids: Optional[list] = None,
     ) -> List[Document]:
         """Search Elasticsearch docstore using search query (BM25)
 
@@ -130,16 +217,123 @@ class ElasticsearchDocumentStore(BaseDocumentStore):
             query (str): query text
             top_k (int, optional): number of
                 top documents to return. Defaults to 10.
+            doc_ids (list, optional): only search within these documents
+            file_ids (list, optional): only search within the documents of
+                these files
 
         Returns:
             List[Document]: List of result documents
         """
         query_dict: dict = {"match": {"content": query}}
+        scopes: list[dict] = []
         if doc_ids is not None:
-            query_dict = {"bool": {"must": [query_dict, {"terms": {"_id": doc_ids}}]}}
+            scopes.append({"terms": {"_id": doc_ids}})
+        if file_ids is not None:
+            scopes.append({"terms": {self.get_file_id_field(): file_ids}})
+        if scopes:
+            query_dict = {"bool": {"must": [query_dict], "filter": scopes}}
         query_dict = {"query": query_dict, "size": top_k}
         return self.query_raw(query_dict)
 
+    def supports_hybrid_query(self, vector_store: "BaseVectorStore") -> bool:
+        """The vector store keeps its embeddings in the documents of this index"""
+        from ..vectorstores.elasticsearch import ElasticsearchVectorStore
+
+        return (
+            isinstance(vector_store, ElasticsearchVectorStore)
+            and vector_store.index_name == self.index_name
+            and vector_store.elasticsearch_url == self.elasticsearch_url
+        )
+
+    def hybrid_query(
+        self,
+        query: str,
+        embedding: list[float],
+        top_k: int = 10,
+        doc_ids: Optional[list] = None,
+        file_ids: Optional[list] = None,
+        fusion: str = "rrf",
+        text_weight: float = 0.5,
+        rrf_k: int = 60,
+        filters: Optional[Any] = None,
+    ) -> List[RetrievedDocument]:
+        """Search the documents with BM25 and kNN in one request
+
+        With the "weighted" fusion, the BM25 and kNN scores are summed with the
+        `text_weight` and `1 - text_weight` boosts. With "rrf", Elasticsearch
+        merges the two rankings with its reciprocal rank fusion, which needs a
+        license allowing it, and doesn't support weights.
+        """
+        from ..vectorstores.elasticsearch import EMBEDDING_FIELD, MAX_NUM_CANDIDATES
+
+        scopes: list[dict] = []
+        if doc_ids is not None:
+            scopes.append({"terms": {"_id": doc_ids}})
+        if file_ids is not None:
+            scopes.append({"terms": {self.get_file_id_field(): file_ids}})
+        if filters is not None and filters.filters:
+            mapping = self.client.indices.get_mapping(index=self.index_name)
+            properties = mapping[self.index_name]["mappings"].get("properties", {})
+            filters_query = metadata_filters_query(
+                filters, lambda key: metadata_field(properties, key)
+            )
+            if filters_query is not None:
+                scopes.append(filters_query)
+
+        text_query = {"match": {"content": query}}
+        knn: dict = {
+            "field": EMBEDDING_FIELD,
+            "query_vector": embedding,
+            "k": min(top_k, MAX_NUM_CANDIDATES),
+            "num_candidates": min(max(top_k * 10, 100), MAX_NUM_CANDIDATES),
+        }
+        if scopes:
+            knn["filter"] = scopes
+
+        body: dict = {
+            "query": {"bool": {"must": [text_query], "filter": scopes}},
+            "knn": knn,
+            "size": top_k,
+            "_source": ["content", "metadata"],
+            # the vector similarity of the hits, to keep it as their score
+            "script_fields": {
+                "similarity": {
+                    "script": {
+                        "source": (
+                            f"doc['{EMBEDDING_FIELD}'].size() == 0 ? -1.0 : "
+                            f"cosineSimilarity(params.query_vector, "
+                            f"'{EMBEDDING_FIELD}')"
+                        ),
+                        "params": {"query_vector": embedding},
+                    }
+                }
+            },
+        }
+        if fusion == "rrf":
+            body["rank"] = {"rrf": {"rank_constant": rrf_k}}
+        elif fusion == "weighted":
+            body["query"]["bool"]["boost"] = text_weight
+            knn["boost"] = 1.0 - text_weight
+        else:
+            raise ValueError(f"Invalid hybrid fusion method: {fusion}")
+
+        res = self.client.search(index=self.index_name, body=body)
+        docs = []
+        for r in res["hits"]["hits"]:
+            doc = RetrievedDocument(
+                id_=r["_id"],
+                text=r["_source"]["content"],
+                metadata=r["_source"]["metadata"],
+                score=r.get("fields", {}).get("similarity", [-1.0])[0],
+            )
+            if r.get("_score") is not None:
+                doc.retrieval_metadata["fusion_score"] = r["_score"]
+            else:
+                # the rrf hits only have their rank
+                doc.retrieval_metadata["fusion_score"] = 1.0 / (rrf_k + r["_rank"])
+            docs.append(doc)
+        return docs
+
     def get(self, ids: Union[List[str], str]) -> List[Document]:
         """Get document by id"""
         if not isinstance(ids, list):
@@ -1,17 +1,39 @@
 import json
+from collections import defaultdict
 from pathlib import Path
 from typing import List, Optional, Union
 
 from kotaemon.base import Document
 
 from .base import BaseDocumentStore
+from .bm25 import BM25Index
 
 
 class InMemoryDocumentStore(BaseDocumentStore):
-    """Simple memory document store that store document in a dictionary"""
+    """Simple memory document store that store document in a dictionary
+
+    Full-text search is served by an in-memory BM25 index, which is updated
+    whenever documents are added or deleted. The ids of the documents of each
+    `file_id` are also tracked, to scope the search to some files.
+    """
 
     def __init__(self):
         self._store = {}
+        self._bm25 = BM25Index()
+        self._file_doc_ids: dict[str, set[str]] = defaultdict(set)
+
+    def _track_file(self, doc_id: str, doc: Document):
+        file_id = doc.metadata.get("file_id")
+        if file_id is not None:
+            self._file_doc_ids[file_id].add(doc_id)
+
+    def _untrack_file(self, doc_id: str, doc: Document):
+        file_id = doc.metadata.get("file_id")
+        doc_ids = self._file_doc_ids.get(file_id)
+        if doc_ids is not None:
+            doc_ids.discard(doc_id)
+            if not doc_ids:
+                del self._file_doc_ids[file_id]
 
     def add(
         self,
@@ -39,7 +61,11 @@ class InMemoryDocumentStore(BaseDocumentStore):
         for doc_id, doc in zip(doc_ids, docs):
             if doc_id in self._store and not exist_ok:
                 raise ValueError(f"Document with id {doc_id} already exist")
+            if doc_id in self._store:
+                self._untrack_file(doc_id, self._store[doc_id])
             self._store[doc_id] = doc
+            self._track_file(doc_id, doc)
+            self._bm25.add(doc_id, doc.text)
 
     def get(self, ids: Union[List[str], str]) -> List[Document]:
         """Get document by id"""
@@ -62,7 +88,8 @@ class InMemoryDocumentStore(BaseDocumentStore):
             ids = [ids]
 
         for doc_id in ids:
-            del self._store[doc_id]
+            self._untrack_file(doc_id, self._store.pop(doc_id))
+        self._bm25.delete(ids)
 
     def save(self, path: Union[str, Path]):
         """Save document to path"""
@@ -80,12 +107,49 @@ class InMemoryDocumentStore(BaseDocumentStore):
         # For better query support, utilize SQLite as the default document store.
         # Also, for portability, use SQLAlchemy for document store.
         self._store = {key: Document.from_dict(value) for key, value in store.items()}
+        self._file_doc_ids = defaultdict(set)
+        for doc_id, doc in self._store.items():
+            self._track_file(doc_id, doc)
+        self._bm25 = self._load_bm25_index()
+
+    def _load_bm25_index(self) -> BM25Index:
+        """Build the full-text search index from the loaded documents"""
+        index = BM25Index()
+        index.add_many((doc_id, doc.text) for doc_id, doc in self._store.items())
+        return index
 
     def query(
-        self, query: str, top_k: int = 10, doc_ids: Optional[list] = None
+        self,
+        query: str,
+        top_k: int = 10,
+        doc_ids: Optional[list] = None,
+        file_ids: Optional[list] = None,
     ) -> List[Document]:
-        """Perform full-text search on document store"""
-        return []
+        """Perform full-text search (BM25) on document store
+
+        Args:
+            query: query text
+            top_k: number of top documents to return
+            doc_ids: if provided, only search within these documents
+            file_ids: if provided, only search within the documents of these files
+
+        Returns:
+            List[Document]: List of result documents, ordered by relevance
+        """
+        if file_ids is not None:
+            file_doc_ids: set[str] = set()
+            for file_id in file_ids:
+                file_doc_ids.update(self._file_doc_ids.get(file_id, ()))
+            doc_ids = (
+                list(file_doc_ids)
+                if doc_ids is None
+                else [doc_id for doc_id in doc_ids if doc_id in file_doc_ids]
+            )
+
+        return [
+            self._store[doc_id]
+            for doc_id, _ in self._bm25.search(query, top_k=top_k, doc_ids=doc_ids)
+        ]
 
     def __persist_flow__(self):
         return {}
@@ -93,3 +157,5 @@ class InMemoryDocumentStore(BaseDocumentStore):
     def drop(self):
         """Drop the document store"""
         self._store = {}
+        self._file_doc_ids = defaultdict(set)
+        self._bm25.clear()
@@ -1,15 +1,29 @@
 import json
-from typing import List, Optional, Union
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Union
 
 from kotaemon.base import Document
 
 from .base import BaseDocumentStore
 
-MAX_DOCS_TO_GET = 10**4
+# max number of ids in the filter of one lookup
+GET_BATCH_SIZE = 1000
 
 
 class LanceDBDocumentStore(BaseDocumentStore):
-    """LancdDB document store which support full-text search query"""
+    """LancdDB document store which support full-text search query
+
+    The `file_id` metadata of the documents is also stored in its own column, so
+    the search can be scoped to some files with a native filter.
+
+    The full-text index is rebuilt over the whole table, so inside a
+    `deferred_indices` block, `add` and `delete` only mark it as outdated and it
+    is rebuilt once at the end. An outdated index is also rebuilt before a query.
+
+    The table handle is opened once and reused, and the `id` column has a scalar
+    index, so `get` looks the documents up instead of scanning the table.
+    """
 
     def __init__(self, path: str = "lancedb", collection_name: str = "docstore"):
         try:
@@ -23,6 +37,11 @@ class LanceDBDocumentStore(BaseDocumentStore):
         self.collection_name = collection_name
         self.db_connection = lancedb.connect(self.db_uri)  # type: ignore
 
+        self._table = None
+        self._index_lock = threading.RLock()
+        self._deferred = 0
+        self._fts_outdated = False
+
     def add(
         self,
         docs: Union[Document, List[Document]],
@@ -41,34 +60,152 @@ class LanceDBDocumentStore(BaseDocumentStore):
             for doc_id, doc in zip(doc_ids, docs)
         ]
 
-        if self.collection_name not in self.db_connection.table_names():
+        document_collection = self._open_table()
+        if document_collection is None:
             if data:
-                document_collection = self.db_connection.create_table(
-                    self.collection_name, data=data, mode="overwrite"
-                )
+                self._add_file_ids(data, docs)
+                with self._index_lock:
+                    self._table = self.db_connection.create_table(
+                        self.collection_name, data=data, mode="overwrite"
+                    )
+                    self._create_id_index(self._table)
         else:
             # add data to existing table
-            document_collection = self.db_connection.open_table(self.collection_name)
             if data:
+                # tables created before the file_id column don't have it
+                if "file_id" in document_collection.schema.names:
+                    self._add_file_ids(data, docs)
                 document_collection.add(data)
 
-        if refresh_indices:
-            document_collection.create_fts_index(
-                "text",
-                tokenizer_name="en_stem",
-                replace=True,
-            )
+        if data:
+            self._mark_fts_outdated(refresh_indices)
+
+    def _open_table(self):
+        """Return the cached table handle, None if the table doesn't exist yet"""
+        if self._table is None:
+            with self._index_lock:
+                if (
+                    self._table is None
+                    and self.collection_name in self.db_connection.table_names()
+                ):
+                    table = self.db_connection.open_table(self.collection_name)
+                    self._create_id_index(table)
+                    self._table = table
+        return self._table
+
+    @staticmethod
+    def _create_id_index(document_collection):
+        """Create the scalar index of the `id` column, if missing
+
+        The rows added later are searched without the index until `optimize`
+        adds them to it.
+        """
+        # not available in older lancedb versions
+        if not hasattr(document_collection, "create_scalar_index") or not hasattr(
+            document_collection, "list_indices"
+        ):
+            return
+        for index in document_collection.list_indices():
+            if list(getattr(index, "columns", [])) == ["id"]:
+                return
+        document_collection.create_scalar_index("id", index_type="BTREE")
+
+    def _mark_fts_outdated(self, refresh_indices: bool = True):
+        """Record a change of the table, rebuild the index unless it is deferred"""
+        with self._index_lock:
+            self._fts_outdated = True
+            if refresh_indices and not self._deferred:
+                self._refresh_fts_index()
+
+    def _refresh_fts_index(self):
+        """Rebuild the full-text index if the table changed since the last build"""
+        with self._index_lock:
+            if not self._fts_outdated:
+                return
+            document_collection = self._open_table()
+            if document_collection is not None:
+                document_collection.create_fts_index(
+                    "text",
+                    tokenizer_name="en_stem",
+                    replace=True,
+                )
+            self._fts_outdated = False
+
+    @contextmanager
+    def deferred_indices(self) -> Iterator[None]:
+        """Rebuild the full-text index once at the end of the block, instead of
+        after each `add` and `delete`. The blocks can be nested, and used from
+        several threads: the index is rebuilt when the last one exits."""
+        with self._index_lock:
+            self._deferred += 1
+        try:
+            yield
+        finally:
+            with self._index_lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self.optimize()
+
+    def optimize(self):
+        """Compact the table and update its indices, if it changed
+
+        The compaction merges the small fragments written by the successive
+        batches and adds the new rows to the `id` index. It is done before the
+        rebuild of the full-text index, which indexes the row ids.
+        """
+        with self._index_lock:
+            if not self._fts_outdated:
+                return
+            document_collection = self._open_table()
+            if document_collection is not None:
+                # not available in older lancedb versions
+                if hasattr(document_collection, "optimize"):
+                    document_collection.optimize()
+            self._refresh_fts_index()
+
+    @staticmethod
+    def _add_file_ids(data: list[dict[str, str]], docs: List[Document]):
+        for record, doc in zip(data, docs):
+            record["file_id"] = str(doc.metadata.get("file_id", ""))
+
+    @staticmethod
+    def _file_filter(document_collection, file_ids: list) -> str:
+        """SQL filter matching the documents of the files"""
+        if "file_id" in document_collection.schema.names:
+            values = ", ".join([f"'{file_id}'" for file_id in file_ids])
+            return f"file_id in ({values})"
+
+        # match the serialized metadata of the tables without file_id column
+        return " OR ".join(
+            [
+                f"attributes LIKE '%{json.dumps({'file_id': file_id})[1:-1]}%'"
+                for file_id in file_ids
+            ]
+        )
 
     def query(
-        self, query: str, top_k: int = 10, doc_ids: Optional[list] = None
+        self,
+        query: str,
+        top_k: int = 10,
+        doc_ids: Optional[list] = None,
+        file_ids: Optional[list] = None,
     ) -> List[Document]:
+        if file_ids is not None and not file_ids:
+            return []
+
+        filters = []
         if doc_ids:
             id_filter = ", ".join([f"'{_id}'" for _id in doc_ids])
-            query_filter = f"id in ({id_filter})"
-        else:
-            query_filter = None
+            filters.append(f"id in ({id_filter})")
         try:
-            document_collection = self.db_connection.open_table(self.collection_name)
+            # documents changed in a deferred block are searchable right away
+            self._refresh_fts_index()
+            document_collection = self._open_table()
+            if document_collection is None:
+                return []
+            if file_ids:
+                filters.append(self._file_filter(document_collection, file_ids))
+            query_filter = " AND ".join([f"({each})" for each in filters])
             if query_filter:
                 docs = (
                     document_collection.search(query, query_type="fts")
@@ -101,16 +238,24 @@ class LanceDBDocumentStore(BaseDocumentStore):
         if len(ids) == 0:
             return []
 
-        id_filter = ", ".join([f"'{_id}'" for _id in ids])
+        document_collection = self._open_table()
+        if document_collection is None:
+            return []
+
+        # the ids are looked up in the `id` index, by batches to bound the filter
+        unique_ids = list(dict.fromkeys(ids))
+        docs = []
         try:
-            document_collection = self.db_connection.open_table(self.collection_name)
-            query_filter = f"id in ({id_filter})"
-            docs = (
-                document_collection.search()
-                .where(query_filter)
-                .limit(MAX_DOCS_TO_GET)
-                .to_list()
-            )
+            for i in range(0, len(unique_ids), GET_BATCH_SIZE):
+                batch_ids = unique_ids[i : i + GET_BATCH_SIZE]
+                id_filter = ", ".join([f"'{_id}'" for _id in batch_ids])
+                docs.extend(
+                    document_collection.search()
+                    .where(f"id in ({id_filter})")
+                    .select(["id", "text", "attributes"])
+                    .limit(len(batch_ids))
+                    .to_list()
+                )
         except (ValueError, FileNotFoundError):
             docs = []
 
@@ -131,21 +276,22 @@ class LanceDBDocumentStore(BaseDocumentStore):
         if not isinstance(ids, list):
             ids = [ids]
 
-        document_collection = self.db_connection.open_table(self.collection_name)
+        document_collection = self._open_table()
+        if len(ids) == 0 or document_collection is None:
+            return
+
         id_filter = ", ".join([f"'{_id}'" for _id in ids])
         query_filter = f"id in ({id_filter})"
         document_collection.delete(query_filter)
 
-        if refresh_indices:
-            document_collection.create_fts_index(
-                "text",
-                tokenizer_name="en_stem",
-                replace=True,
-            )
+        self._mark_fts_outdated(refresh_indices)
 
     def drop(self):
         """Drop the document store"""
-        self.db_connection.drop_table(self.collection_name)
+        with self._index_lock:
+            self.db_connection.drop_table(self.collection_name)
+            self._table = None
+            self._fts_outdated = False
 
     def count(self) -> int:
         raise NotImplementedError
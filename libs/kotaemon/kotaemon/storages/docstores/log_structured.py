@@ -0,0 +1,473 @@
+import json
+import os
+import shutil
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+from kotaemon.base import Document
+
+from .base import BaseDocumentStore
+from .bm25 import BM25Index
+
+INDEX_FNAME = "index.jsonl"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+BM25_FNAME = "bm25.pkl"
+BM25_STATE_FNAME = "bm25.json"
+# number of changed documents after which the full-text index is saved
+BM25_SAVE_EVERY = 10000
+
+
+class LogStructuredDocumentStore(BaseDocumentStore):
+    """File document store that appends documents to log segments
+
+    Unlike SimpleFileDocumentStore, which rewrites the whole corpus into one JSON
+    file on every change, this store only appends the added documents to the
+    current segment file, and appends their (segment, offset, length) to an
+    offset index. Deletions append tombstones to the index. Only the index is kept
+    in memory, and documents are read from their segment on demand.
+
+    Segments are compacted once the deleted / overwritten bytes represent more
+    than `compact_ratio` of the stored bytes.
+
+    Full-text search is served by an in-memory BM25 index, updated whenever
+    documents are added or deleted. It is saved with the size of the offset index
+    it covers, every `BM25_SAVE_EVERY` changes and at the end of the
+    `deferred_indices` blocks. On start-up, only the documents changed since are
+    read to bring it up to date.
+
+    Args:
+        path: directory to store the collections
+        collection_name: name of the collection, stored in `path/collection_name`
+        segment_max_bytes: size after which a new segment file is started
+        compact_ratio: fraction of dead bytes that triggers a compaction
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        collection_name: str = "default",
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        compact_ratio: float = 0.5,
+    ):
+        self._path = path
+        self._collection_name = collection_name
+        self._segment_max_bytes = segment_max_bytes
+        self._compact_ratio = compact_ratio
+
+        self._save_path = Path(path) / collection_name
+        self._save_path.mkdir(parents=True, exist_ok=True)
+        self._index_path = self._save_path / INDEX_FNAME
+
+        self._lock = threading.RLock()
+        self._deferred = 0
+        self._reset_state()
+        self._load_index()
+
+    def _reset_state(self):
+        # doc_id -> (segment number, offset, length)
+        self._index: dict[str, tuple[int, int, int]] = {}
+        self._segment = 0
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._bm25 = BM25Index()
+        self._doc_file_ids: dict[str, str] = {}
+        self._file_doc_ids: dict[str, set[str]] = defaultdict(set)
+        # number of documents changed since the full-text index was saved
+        self._bm25_unsaved = 0
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._save_path / f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}"
+
+    def _load_index(self):
+        if not self._index_path.is_file():
+            return
+
+        saved_offset = self._load_search_index()
+        # the documents changed since the full-text index was saved
+        changed: set[str] = set()
+        position = 0
+        with self._index_path.open("rb") as f:
+            for line in f:
+                try:
+                    doc_id, location = json.loads(line)
+                except ValueError:
+                    # partially written entry from an interrupted write
+                    break
+                if saved_offset is not None and position >= saved_offset:
+                    changed.add(doc_id)
+                position += len(line)
+                old = self._index.pop(doc_id, None)
+                if old is not None:
+                    self._live_bytes -= old[2]
+                    self._dead_bytes += old[2]
+                if location is not None:
+                    self._index[doc_id] = tuple(location)  # type: ignore
+                    self._live_bytes += location[2]
+                    self._segment = max(self._segment, location[0])
+
+        if saved_offset is not None:
+            deleted = [doc_id for doc_id in changed if doc_id not in self._index]
+            for doc_id in deleted:
+                self._untrack_file(doc_id)
+            self._bm25.delete(deleted)
+            self._index_documents(
+                [doc_id for doc_id in changed if doc_id in self._index]
+            )
+            self._bm25_unsaved = len(changed)
+            if self._bm25.doc_ids() == self._index.keys():
+                return
+
+        # no usable saved index, build it from the segments
+        self._bm25 = BM25Index()
+        self._doc_file_ids = {}
+        self._file_doc_ids = defaultdict(set)
+        self._index_documents(list(self._index))
+        self._bm25_unsaved = len(self._index)
+
+    def _load_search_index(self) -> Optional[int]:
+        """Load the saved full-text index, return the size of the offset index it
+        covers, or None if it can't be used"""
+        try:
+            with (self._save_path / BM25_STATE_FNAME).open(encoding="utf-8") as f:
+                state = json.load(f)
+            if state["offset"] > self._index_path.stat().st_size:
+                return None
+            self._bm25 = BM25Index.load(self._save_path / BM25_FNAME)
+        except Exception:
+            return None
+
+        for doc_id, file_id in state["file_ids"].items():
+            self._doc_file_ids[doc_id] = file_id
+            self._file_doc_ids[file_id].add(doc_id)
+        return state["offset"]
+
+    def _save_search_index(self, save_path: Optional[Path] = None):
+        """Save the full-text index, with the size of the offset index it covers
+
+        The state file is written last: if interrupted, the changes since the
+        previous state are indexed again on start-up, which is idempotent.
+        """
+        save_path = save_path or self._save_path
+        index_path = save_path / INDEX_FNAME
+        offset = index_path.stat().st_size if index_path.is_file() else 0
+        self._bm25.save(save_path / BM25_FNAME)
+        tmp_path = save_path / f"{BM25_STATE_FNAME}.tmp"
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"offset": offset, "file_ids": self._doc_file_ids}, f)
+        tmp_path.replace(save_path / BM25_STATE_FNAME)
+        self._bm25_unsaved = 0
+
+    def _changed_search_index(self, n_docs: int):
+        """Record changed documents, save the full-text index if there are many"""
+        self._bm25_unsaved += n_docs
+        if not self._deferred and self._bm25_unsaved >= BM25_SAVE_EVERY:
+            self._save_search_index()
+
+    def _index_documents(self, doc_ids: list[str], batch_size: int = 1000):
+        """Add the stored documents to the full-text search index"""
+        for start in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[start : start + batch_size]
+            docs = self._read([self._index[doc_id] for doc_id in batch])
+            for doc_id, doc in zip(batch, docs):
+                self._track_file(doc_id, doc)
+            self._bm25.add_many((doc_id, doc.text) for doc_id, doc in zip(batch, docs))
+
+    def _track_file(self, doc_id: str, doc: Document):
+        self._untrack_file(doc_id)
+        file_id = doc.metadata.get("file_id")
+        if file_id is not None:
+            self._doc_file_ids[doc_id] = file_id
+            self._file_doc_ids[file_id].add(doc_id)
+
+    def _untrack_file(self, doc_id: str):
+        file_id = self._doc_file_ids.pop(doc_id, None)
+        doc_ids = self._file_doc_ids.get(file_id)  # type: ignore[arg-type]
+        if doc_ids is not None:
+            doc_ids.discard(doc_id)
+            if not doc_ids:
+                del self._file_doc_ids[file_id]  # type: ignore[arg-type]
+
+    def _append_index(self, entries: list[tuple[str, Optional[tuple[int, int, int]]]]):
+        with self._index_path.open("a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    def _write_records(
+        self, records: list[tuple[str, bytes]]
+    ) -> list[tuple[str, tuple[int, int, int]]]:
+        """Append the encoded documents to the segments and return their location"""
+        locations = []
+        pending: list[bytes] = []
+
+        segment_path = self._segment_path(self._segment)
+        offset = segment_path.stat().st_size if segment_path.is_file() else 0
+
+        def flush():
+            if pending:
+                with self._segment_path(self._segment).open("ab") as f:
+                    f.write(b"".join(pending))
+                pending.clear()
+
+        for doc_id, data in records:
+            if offset and offset + len(data) > self._segment_max_bytes:
+                flush()
+                self._segment += 1
+                offset = 0
+            locations.append((doc_id, (self._segment, offset, len(data))))
+            pending.append(data)
+            offset += len(data)
+        flush()
+
+        return locations
+
+    def _read(self, locations: list[tuple[int, int, int]]) -> list[Document]:
+        """Read the documents at the given locations, opening each segment once"""
+        output: list[Optional[Document]] = [None] * len(locations)
+        by_segment: dict[int, list[int]] = {}
+        for idx, (segment, _, _) in enumerate(locations):
+            by_segment.setdefault(segment, []).append(idx)
+
+        for segment, indices in by_segment.items():
+            with self._segment_path(segment).open("rb") as f:
+                for idx in sorted(indices, key=lambda i: locations[i][1]):
+                    _, offset, length = locations[idx]
+                    f.seek(offset)
+                    output[idx] = Document.from_dict(json.loads(f.read(length)))
+
+        return output  # type: ignore
+
+    def add(
+        self,
+        docs: Union[Document, List[Document]],
+        ids: Optional[Union[List[str], str]] = None,
+        **kwargs,
+    ):
+        """Add document into document store
+
+        Args:
+            docs: list of documents to add
+            ids: specify the ids of documents to add or
+                use existing doc.doc_id
+            exist_ok: raise error when duplicate doc-id
+                found in the docstore (default to False)
+        """
+        exist_ok: bool = kwargs.pop("exist_ok", False)
+
+        if ids and not isinstance(ids, list):
+            ids = [ids]
+        if not isinstance(docs, list):
+            docs = [docs]
+        doc_ids = ids if ids else [doc.doc_id for doc in docs]
+
+        with self._lock:
+            if not exist_ok:
+                for doc_id in doc_ids:
+                    if doc_id in self._index:
+                        raise ValueError(f"Document with id {doc_id} already exist")
+
+            records = [
+                (doc_id, (json.dumps(doc.to_dict()) + "\n").encode("utf-8"))
+                for doc_id, doc in zip(doc_ids, docs)
+            ]
+            locations = self._write_records(records)
+            self._append_index(locations)  # type: ignore[arg-type]
+
+            for doc_id, location in locations:
+                old = self._index.get(doc_id)
+                if old is not None:
+                    self._live_bytes -= old[2]
+                    self._dead_bytes += old[2]
+                self._index[doc_id] = location
+                self._live_bytes += location[2]
+
+            for doc_id, doc in zip(doc_ids, docs):
+                self._track_file(doc_id, doc)
+            self._bm25.add_many(
+                (doc_id, doc.text) for doc_id, doc in zip(doc_ids, docs)
+            )
+            self._changed_search_index(len(doc_ids))
+
+            self._maybe_compact()
+
+    def get(self, ids: Union[List[str], str]) -> List[Document]:
+        """Get document by id"""
+        if not isinstance(ids, list):
+            ids = [ids]
+
+        with self._lock:
+            locations = [self._index[doc_id] for doc_id in ids]
+            return self._read(locations)
+
+    def get_all(self) -> List[Document]:
+        """Get all documents"""
+        with self._lock:
+            return self._read(list(self._index.values()))
+
+    def count(self) -> int:
+        """Count number of documents"""
+        return len(self._index)
+
+    def query(
+        self,
+        query: str,
+        top_k: int = 10,
+        doc_ids: Optional[list] = None,
+        file_ids: Optional[list] = None,
+    ) -> List[Document]:
+        """Perform full-text search (BM25) on document store
+
+        Args:
+            query: query text
+            top_k: number of top documents to return
+            doc_ids: if provided, only search within these documents
+            file_ids: if provided, only search within the documents of these files
+
+        Returns:
+            List[Document]: List of result documents, ordered by relevance
+        """
+        with self._lock:
+            if file_ids is not None:
+                file_doc_ids: set[str] = set()
+                for file_id in file_ids:
+                    file_doc_ids.update(self._file_doc_ids.get(file_id, ()))
+                doc_ids = (
+                    list(file_doc_ids)
+                    if doc_ids is None
+                    else [doc_id for doc_id in doc_ids if doc_id in file_doc_ids]
+                )
+
+            matched = self._bm25.search(query, top_k=top_k, doc_ids=doc_ids)
+            return self._read([self._index[doc_id] for doc_id, _ in matched])
+
+    def delete(self, ids: Union[List[str], str]):
+        """Delete document by id"""
+        if not isinstance(ids, list):
+            ids = [ids]
+
+        with self._lock:
+            for doc_id in ids:
+                if doc_id not in self._index:
+                    raise KeyError(doc_id)
+
+            self._append_index([(doc_id, None) for doc_id in ids])
+            for doc_id in ids:
+                location = self._index.pop(doc_id)
+                self._live_bytes -= location[2]
+                self._dead_bytes += location[2]
+                self._untrack_file(doc_id)
+            self._bm25.delete(ids)
+            self._changed_search_index(len(ids))
+
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        total = self._live_bytes + self._dead_bytes
+        if total and self._dead_bytes > self._compact_ratio * total:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the live documents into new segments and drop the dead bytes"""
+        with self._lock:
+            tmp_path = self._save_path.with_name(f"{self._save_path.name}.compact")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            tmp_path.mkdir(parents=True)
+
+            old_index = self._index
+            old_segment_path = self._segment_path
+            new_index: dict[str, tuple[int, int, int]] = {}
+            segment, offset = 0, 0
+            out = None
+            try:
+                # copy the raw records segment by segment, without decoding them
+                items = sorted(old_index.items(), key=lambda item: item[1])
+                current, f_in = None, None
+                for doc_id, (old_segment, old_offset, length) in items:
+                    if old_segment != current:
+                        if f_in:
+                            f_in.close()
+                        f_in = old_segment_path(old_segment).open("rb")
+                        current = old_segment
+                    f_in.seek(old_offset)
+                    data = f_in.read(length)
+
+                    if out is None or (
+                        offset and offset + length > self._segment_max_bytes
+                    ):
+                        if out is not None:
+                            out.close()
+                            segment += 1
+                        out = (
+                            tmp_path / f"{SEGMENT_PREFIX}{segment:06d}{SEGMENT_SUFFIX}"
+                        ).open("wb")
+                        offset = 0
+                    out.write(data)
+                    new_index[doc_id] = (segment, offset, length)
+                    offset += length
+                if f_in:
+                    f_in.close()
+            finally:
+                if out is not None:
+                    out.close()
+
+            with (tmp_path / INDEX_FNAME).open("w", encoding="utf-8") as f:
+                f.write(
+                    "".join(
+                        json.dumps([doc_id, location]) + "\n"
+                        for doc_id, location in new_index.items()
+                    )
+                )
+            # the documents are the same, only the offset index changed
+            self._save_search_index(tmp_path)
+
+            # swap the compacted collection in place
+            old_path = self._save_path.with_name(f"{self._save_path.name}.old")
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(self._save_path, old_path)
+            os.replace(tmp_path, self._save_path)
+            shutil.rmtree(old_path, ignore_errors=True)
+
+            self._index = new_index
+            self._segment = segment
+            self._dead_bytes = 0
+            self._live_bytes = sum(location[2] for location in new_index.values())
+
+    @contextmanager
+    def deferred_indices(self) -> Iterator[None]:
+        """Save the full-text index once at the end of the block. The blocks can
+        be nested, and used from several threads: the index is saved when the
+        last one exits."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self.optimize()
+
+    def optimize(self):
+        """Save the full-text index, if documents changed since it was saved"""
+        with self._lock:
+            if self._bm25_unsaved:
+                self._save_search_index()
+
+    def drop(self):
+        """Drop the document store"""
+        with self._lock:
+            shutil.rmtree(self._save_path, ignore_errors=True)
+            self._save_path.mkdir(parents=True, exist_ok=True)
+            self._reset_state()
+
+    def __persist_flow__(self):
+        from theflow.utils.modules import serialize
+
+        return {
+            "path": serialize(self._path),
+            "collection_name": self._collection_name,
+            "segment_max_bytes": self._segment_max_bytes,
+            "compact_ratio": self._compact_ratio,
+        }
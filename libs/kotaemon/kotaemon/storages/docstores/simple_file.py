@@ -1,24 +1,48 @@
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Iterator, List, Optional, Union
 
 from kotaemon.base import Document
 
+from .bm25 import BM25Index
 from .in_memory import InMemoryDocumentStore
 
 
 class SimpleFileDocumentStore(InMemoryDocumentStore):
-    """Improve InMemoryDocumentStore by auto saving whenever the corpus is changed"""
+    """Improve InMemoryDocumentStore by auto saving whenever the corpus is changed
+
+    The full-text index is saved with the corpus, or once at the end of the
+    `deferred_indices` blocks.
+    """
 
     def __init__(self, path: str | Path, collection_name: str = "default"):
         super().__init__()
         self._path = path
         self._collection_name = collection_name
+        self._deferred = 0
+        self._deferred_lock = threading.Lock()
 
         Path(path).mkdir(parents=True, exist_ok=True)
         self._save_path = Path(path) / f"{collection_name}.json"
+        self._bm25_path = Path(path) / f"{collection_name}.bm25"
         if self._save_path.is_file():
             self.load(self._save_path)
 
+    def _load_bm25_index(self) -> BM25Index:
+        """Load the persisted full-text search index, rebuild it if out of sync"""
+        if self._bm25_path.is_file():
+            try:
+                index = BM25Index.load(self._bm25_path)
+                if index.doc_ids() == self._store.keys():
+                    return index
+            except Exception:
+                pass
+
+        index = super()._load_bm25_index()
+        index.save(self._bm25_path)
+        return index
+
     def get(self, ids: Union[List[str], str]) -> List[Document]:
         """Get document by id"""
         if not isinstance(ids, list):
@@ -48,16 +72,43 @@ class SimpleFileDocumentStore(InMemoryDocumentStore):
         """
         super().add(docs=docs, ids=ids, **kwargs)
         self.save(self._save_path)
+        if not self._deferred:
+            self._bm25.save(self._bm25_path)
 
     def delete(self, ids: Union[List[str], str]):
         """Delete document by id"""
         super().delete(ids=ids)
         self.save(self._save_path)
+        if not self._deferred:
+            self._bm25.save(self._bm25_path)
+
+    @contextmanager
+    def deferred_indices(self) -> Iterator[None]:
+        """Save the full-text index once at the end of the block, instead of after
+        each `add` and `delete`. The blocks can be nested, and used from several
+        threads: the index is saved when the last one exits."""
+        with self._deferred_lock:
+            if not self._deferred:
+                # out of sync until the end of the block, rebuilt if interrupted
+                self._bm25_path.unlink(missing_ok=True)
+            self._deferred += 1
+        try:
+            yield
+        finally:
+            with self._deferred_lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self.optimize()
+
+    def optimize(self):
+        """Save the full-text index"""
+        self._bm25.save(self._bm25_path)
 
     def drop(self):
         """Drop the document store"""
         super().drop()
         self._save_path.unlink(missing_ok=True)
+        self._bm25_path.unlink(missing_ok=True)
 
     def __persist_flow__(self):
         from theflow.utils.modules import serialize
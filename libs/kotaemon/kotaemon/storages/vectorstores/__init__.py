@@ -1,17 +1,21 @@
 from .base import BaseVectorStore
 from .chroma import ChromaVectorStore
+from .elasticsearch import ElasticsearchVectorStore
 from .in_memory import InMemoryVectorStore
 from .lancedb import LanceDBVectorStore
 from .milvus import MilvusVectorStore
+from .numpy_flat import NumpyFlatVectorStore
 from .qdrant import QdrantVectorStore
 from .simple_file import SimpleFileVectorStore
 
 __all__ = [
     "BaseVectorStore",
     "ChromaVectorStore",
+    "ElasticsearchVectorStore",
     "InMemoryVectorStore",
     "SimpleFileVectorStore",
     "LanceDBVectorStore",
     "MilvusVectorStore",
     "QdrantVectorStore",
+    "NumpyFlatVectorStore",
 ]
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import uuid
+from typing import Any, Optional
+
+from kotaemon.base import DocumentWithEmbedding
+
+from ..docstores.elasticsearch import (
+    create_index,
+    metadata_field,
+    metadata_filters_query,
+)
+from .base import BaseVectorStore
+
+EMBEDDING_FIELD = "embedding"
+# max number of candidates of a kNN search allowed by Elasticsearch
+MAX_NUM_CANDIDATES = 10000
+
+
+class ElasticsearchVectorStore(BaseVectorStore):
+    """Vector store keeping the embeddings in a `dense_vector` field of the
+    documents of an Elasticsearch index
+
+    With the same collection name and url as an `ElasticsearchDocumentStore`, the
+    embeddings are stored in the documents of the doc store, which can then run
+    hybrid queries (BM25 and kNN) in one request. The documents should be added
+    to the doc store before their embeddings, as the doc store replaces them.
+
+    Args:
+        collection_name: name of the index
+        elasticsearch_url: url of the Elasticsearch server
+        similarity: similarity of the kNN search, "cosine", "dot_product",
+            "l2_norm" or "max_inner_product"
+        kwargs: passed to the Elasticsearch client
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "docstore",
+        elasticsearch_url: str = "http://localhost:9200",
+        similarity: str = "cosine",
+        **kwargs: Any,
+    ):
+        try:
+            from elasticsearch import Elasticsearch
+            from elasticsearch.helpers import bulk
+        except ImportError:
+            raise ImportError(
+                "To use ElasticsearchVectorStore please install "
+                "`pip install elasticsearch`"
+            )
+
+        self.elasticsearch_url = elasticsearch_url
+        self.index_name = collection_name
+        self.similarity = similarity
+
+        self.client = Elasticsearch(elasticsearch_url, **kwargs)
+        self.es_bulk = bulk
+        create_index(self.client, self.index_name)
+        self._properties: Optional[dict] = None
+
+    def _get_properties(self, refresh: bool = False) -> dict:
+        """The mapped fields of the index"""
+        if self._properties is None or refresh:
+            mapping = self.client.indices.get_mapping(index=self.index_name)
+            self._properties = mapping[self.index_name]["mappings"].get(
+                "properties", {}
+            )
+        return self._properties
+
+    def _ensure_embedding_field(self, dims: int):
+        if EMBEDDING_FIELD in self._get_properties():
+            return
+        self.client.indices.put_mapping(
+            index=self.index_name,
+            properties={
+                EMBEDDING_FIELD: {
+                    "type": "dense_vector",
+                    "dims": dims,
+                    "index": True,
+                    "similarity": self.similarity,
+                }
+            },
+        )
+        self._get_properties(refresh=True)
+
+    def _metadata_field(self, key: str) -> str:
+        return metadata_field(self._get_properties(), key)
+
+    def add(
+        self,
+        embeddings: list[list[float]] | list[DocumentWithEmbedding],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        if not embeddings:
+            return []
+
+        if isinstance(embeddings[0], list):
+            vectors = embeddings
+        else:
+            docs: list[DocumentWithEmbedding] = embeddings  # type: ignore
+            vectors = [doc.embedding for doc in docs]
+            if metadatas is None:
+                metadatas = [doc.metadata for doc in docs]
+            if ids is None:
+                ids = [doc.doc_id for doc in docs]
+
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+
+        self._ensure_embedding_field(len(vectors[0]))
+
+        requests = []
+        for idx, (id_, vector) in enumerate(zip(ids, vectors)):
+            fields: dict = {EMBEDDING_FIELD: vector}
+            if metadatas is not None and metadatas[idx]:
+                fields["metadata"] = metadatas[idx]
+            # only set the embedding of the document added by the doc store
+            requests.append(
+                {
+                    "_op_type": "update",
+                    "_index": self.index_name,
+                    "_id": id_,
+                    "doc": fields,
+                    "doc_as_upsert": True,
+                }
+            )
+        self.es_bulk(self.client, requests)
+        self.client.indices.refresh(index=self.index_name)
+
+        return list(ids)
+
+    def delete(self, ids: list[str], **kwargs):
+        """Remove the embeddings from the documents
+
+        Args:
+            ids: List of ids of the embeddings to be deleted
+            kwargs: meant for vectorstore-specific parameters
+        """
+        if not ids:
+            return
+        self.client.update_by_query(
+            index=self.index_name,
+            query={"terms": {"_id": ids}},
+            script={"source": f"ctx._source.remove('{EMBEDDING_FIELD}')"},
+            conflicts="proceed",
+        )
+        self.client.indices.refresh(index=self.index_name)
+
+    def query(
+        self,
+        embedding: list[float],
+        top_k: int = 1,
+        ids: Optional[list[str]] = None,
+        **kwargs,
+    ) -> tuple[list[list[float]], list[float], list[str]]:
+        """Return the top k most similar vector embeddings
+
+        Args:
+            embedding: List of embeddings
+            top_k: Number of most similar embeddings to return
+            ids: List of ids of the embeddings to be queried
+            kwargs: supports `doc_ids` (same as `ids`) and `filters` (llama-index
+                `MetadataFilters`) to restrict the search scope
+
+        Returns:
+            the matched embeddings, the similarity scores, and the ids
+        """
+        if top_k <= 0 or EMBEDDING_FIELD not in self._get_properties():
+            return [], [], []
+        top_k = min(top_k, MAX_NUM_CANDIDATES)
+
+        scopes: list[dict] = []
+        for scope in (ids, kwargs.get("doc_ids")):
+            if scope is not None:
+                scopes.append({"terms": {"_id": scope}})
+        filters = kwargs.get("filters")
+        if filters is not None and filters.filters:
+            filters_query = metadata_filters_query(filters, self._metadata_field)
+            if filters_query is not None:
+                scopes.append(filters_query)
+
+        knn: dict = {
+            "field": EMBEDDING_FIELD,
+            "query_vector": embedding,
+            "k": top_k,
+            "num_candidates": min(max(top_k * 10, 100), MAX_NUM_CANDIDATES),
+        }
+        if scopes:
+            knn["filter"] = scopes
+
+        res = self.client.search(
+            index=self.index_name,
+            knn=knn,
+            size=top_k,
+            source=[EMBEDDING_FIELD],
+        )
+        hits = res["hits"]["hits"]
+        scores = [hit["_score"] for hit in hits]
+        if self.similarity == "cosine":
+            # Elasticsearch scores (1 + cosine) / 2, to be positive
+            scores = [score * 2.0 - 1.0 for score in scores]
+        return (
+            [hit["_source"].get(EMBEDDING_FIELD, []) for hit in hits],
+            scores,
+            [hit["_id"] for hit in hits],
+        )
+
+    def count(self) -> int:
+        res = self.client.count(
+            index=self.index_name, query={"exists": {"field": EMBEDDING_FIELD}}
+        )
+        return int(res["count"])
+
+    def drop(self):
+        """Remove all the embeddings, the documents are dropped by the doc store"""
+        if not self.client.indices.exists(index=self.index_name):
+            return
+        self.client.update_by_query(
+            index=self.index_name,
+            query={"exists": {"field": EMBEDDING_FIELD}},
+            script={"source": f"ctx._source.remove('{EMBEDDING_FIELD}')"},
+            conflicts="proceed",
+        )
+
+    def __persist_flow__(self):
+        return {
+            "collection_name": self.index_name,
+            "elasticsearch_url": self.elasticsearch_url,
+            "similarity": self.similarity,
+        }
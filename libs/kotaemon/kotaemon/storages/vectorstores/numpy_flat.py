@@ -0,0 +1,484 @@
+"""Flat vector store backed by a memory-mapped NumPy matrix."""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+from kotaemon.base import DocumentWithEmbedding
+
+from .base import BaseVectorStore
+
+VECTORS_FNAME = "vectors.bin"
+ROWS_FNAME = "rows.jsonl"
+META_FNAME = "meta.json"
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+INT8_SCALE = 127.0
+# number of rows scored at once, bound the memory used to up-cast float16/int8
+QUERY_BLOCK_SIZE = 2**16
+
+
+class NumpyFlatVectorStore(BaseVectorStore):
+    """Exact vector store that keeps all embeddings in one memory-mapped matrix
+
+    Embeddings are L2-normalized and appended row by row to a single binary file,
+    so the similarity score is the cosine similarity, computed for all candidate
+    rows with a matrix product. Row ids and metadata are appended to a small
+    JSONL sidecar. Deleted rows are only marked as tombstones, and are reclaimed
+    by `compact` (called automatically once the fraction of deleted rows is over
+    `compact_ratio`).
+
+    Args:
+        path: directory to store the collections
+        collection_name: name of the collection, stored in `path/collection_name`
+        dtype: storage type of the embeddings, "float32", "float16" or "int8".
+            Ignored if the collection already exists.
+        compact_ratio: fraction of deleted rows that triggers a compaction
+        indexed_fields: metadata keys with an inverted index, used to speed up
+            filtering on these keys (e.g. by `file_id`)
+    """
+
+    def __init__(
+        self,
+        path: str | Path = "./vectorstore",
+        collection_name: str = "default",
+        dtype: str = "float32",
+        compact_ratio: float = 0.3,
+        indexed_fields: Optional[list[str]] = None,
+        **kwargs: Any,
+    ):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(
+                f"Unsupported dtype {dtype}, should be one of {SUPPORTED_DTYPES}"
+            )
+
+        self._path = path
+        self._collection_name = collection_name
+        self._compact_ratio = compact_ratio
+        self._indexed_fields = (
+            list(indexed_fields) if indexed_fields is not None else ["file_id"]
+        )
+        self._save_path = Path(path) / collection_name
+        self._save_path.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self._save_path / VECTORS_FNAME
+        self._rows_path = self._save_path / ROWS_FNAME
+        self._meta_path = self._save_path / META_FNAME
+
+        self._lock = threading.RLock()
+        self._dtype = dtype
+        self._dim: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self._reset_state()
+
+        if self._meta_path.is_file():
+            self._load()
+
+    # ---- state management ----
+
+    def _reset_state(self):
+        self._ids: list[Optional[str]] = []
+        self._metadatas: list[dict] = []
+        self._id_to_row: dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._field_index: dict[str, dict[Any, set[int]]] = {
+            key: {} for key in self._indexed_fields
+        }
+        self._n_deleted = 0
+        self._matrix = None
+
+    def _load(self):
+        with self._meta_path.open() as f:
+            meta = json.load(f)
+        self._dim = meta["dim"]
+        self._dtype = meta["dtype"]
+
+        alive: list[bool] = []
+        if self._rows_path.is_file():
+            with self._rows_path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # partially written record from an interrupted write
+                        break
+                    if "deleted" in record:
+                        row = self._id_to_row.pop(record["deleted"], None)
+                        if row is not None:
+                            alive[row] = False
+                            self._unindex_row(row)
+                            self._ids[row] = None
+                            self._metadatas[row] = {}
+                            self._n_deleted += 1
+                        continue
+
+                    row = len(self._ids)
+                    self._ids.append(record["id"])
+                    self._metadatas.append(record.get("metadata") or {})
+                    self._id_to_row[record["id"]] = row
+                    self._index_row(row)
+                    alive.append(True)
+
+        self._alive = np.array(alive, dtype=bool)
+
+        # drop vectors written without their sidecar record
+        expected_size = len(self._ids) * self._row_nbytes()
+        if (
+            self._vectors_path.is_file()
+            and self._vectors_path.stat().st_size > expected_size
+        ):
+            with self._vectors_path.open("r+b") as f:
+                f.truncate(expected_size)
+
+    def _write_meta(self):
+        with self._meta_path.open("w") as f:
+            json.dump({"dim": self._dim, "dtype": self._dtype}, f)
+
+    def _row_nbytes(self) -> int:
+        return (self._dim or 0) * np.dtype(self._dtype).itemsize
+
+    def _get_matrix(self) -> Optional[np.memmap]:
+        if self._matrix is None and self._ids and self._dim:
+            self._matrix = np.memmap(
+                self._vectors_path,
+                dtype=self._dtype,
+                mode="r",
+                shape=(len(self._ids), self._dim),
+            )
+        return self._matrix
+
+    def _index_row(self, row: int):
+        metadata = self._metadatas[row]
+        for key in self._indexed_fields:
+            value = metadata.get(key)
+            try:
+                self._field_index[key].setdefault(value, set()).add(row)
+            except TypeError:
+                # unhashable value, fallback to scanning when filtering
+                pass
+
+    def _unindex_row(self, row: int):
+        metadata = self._metadatas[row]
+        for key in self._indexed_fields:
+            value = metadata.get(key)
+            try:
+                rows = self._field_index[key].get(value)
+            except TypeError:
+                continue
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._field_index[key][value]
+
+    # ---- encoding ----
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        if self._dtype == "int8":
+            return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+        return vectors.astype(self._dtype)
+
+    def _decode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = vectors.astype(np.float32)
+        if self._dtype == "int8":
+            vectors /= INT8_SCALE
+        return vectors
+
+    # ---- public interfaces ----
+
+    def add(
+        self,
+        embeddings: list[list[float]] | list[DocumentWithEmbedding],
+        metadatas: Optional[list[dict]] = None,
+        ids: Optional[list[str]] = None,
+    ) -> list[str]:
+        if not embeddings:
+            return []
+
+        if isinstance(embeddings[0], list):
+            vectors = embeddings
+        else:
+            docs: list[DocumentWithEmbedding] = embeddings  # type: ignore
+            vectors = [doc.embedding for doc in docs]
+            if metadatas is None:
+                metadatas = [doc.metadata for doc in docs]
+            if ids is None:
+                ids = [doc.doc_id for doc in docs]
+
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+        if metadatas is None:
+            metadatas = [{} for _ in range(len(vectors))]
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError("Embeddings should be a list of same-length vectors")
+
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(matrix.shape[1])
+                self._write_meta()
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} does not match "
+                    f"the collection dimension {self._dim}"
+                )
+
+            # re-adding an existing id replaces its embedding
+            existing = [id_ for id_ in ids if id_ in self._id_to_row]
+            if existing:
+                self._delete(existing, compact=False)
+
+            with self._vectors_path.open("ab") as f:
+                f.write(self._encode(matrix).tobytes())
+
+            with self._rows_path.open("a", encoding="utf-8") as f:
+                for id_, metadata in zip(ids, metadatas):
+                    row = len(self._ids)
+                    self._ids.append(id_)
+                    self._metadatas.append(dict(metadata or {}))
+                    self._id_to_row[id_] = row
+                    self._index_row(row)
+                    f.write(
+                        json.dumps({"id": id_, "metadata": metadata}, default=str)
+                        + "\n"
+                    )
+
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._matrix = None
+
+        return list(ids)
+
+    def _delete(self, ids: list[str], compact: bool = True):
+        deleted = []
+        for id_ in ids:
+            row = self._id_to_row.pop(id_, None)
+            if row is None:
+                continue
+            self._alive[row] = False
+            self._unindex_row(row)
+            self._ids[row] = None
+            self._metadatas[row] = {}
+            deleted.append(id_)
+
+        if not deleted:
+            return
+
+        with self._rows_path.open("a", encoding="utf-8") as f:
+            for id_ in deleted:
+                f.write(json.dumps({"deleted": id_}) + "\n")
+        self._n_deleted += len(deleted)
+
+        if compact and self._n_deleted > self._compact_ratio * len(self._ids):
+            self.compact()
+
+    def delete(self, ids: list[str], **kwargs):
+        """Delete vector embeddings from vector stores
+
+        Args:
+            ids: List of ids of the embeddings to be deleted
+            kwargs: meant for vectorstore-specific parameters
+        """
+        with self._lock:
+            self._delete(ids)
+
+    def compact(self):
+        """Rewrite the collection files without the deleted rows"""
+        with self._lock:
+            if not self._n_deleted:
+                return
+
+            rows = np.flatnonzero(self._alive)
+            matrix = self._get_matrix()
+            tmp_vectors = self._vectors_path.with_suffix(".tmp")
+            tmp_rows = self._rows_path.with_suffix(".tmp")
+
+            with tmp_vectors.open("wb") as f:
+                for start in range(0, len(rows), QUERY_BLOCK_SIZE):
+                    block = rows[start : start + QUERY_BLOCK_SIZE]
+                    f.write(np.ascontiguousarray(matrix[block]).tobytes())
+
+            records = [(self._ids[row], self._metadatas[row]) for row in rows]
+            with tmp_rows.open("w", encoding="utf-8") as f:
+                for id_, metadata in records:
+                    f.write(
+                        json.dumps({"id": id_, "metadata": metadata}, default=str)
+                        + "\n"
+                    )
+
+            # release the memory map before replacing the underlying file
+            del matrix
+            self._matrix = None
+            os.replace(tmp_vectors, self._vectors_path)
+            os.replace(tmp_rows, self._rows_path)
+
+            self._reset_state()
+            for id_, metadata in records:
+                row = len(self._ids)
+                self._ids.append(id_)
+                self._metadatas.append(metadata)
+                self._id_to_row[id_] = row  # type: ignore[index]
+                self._index_row(row)
+            self._alive = np.ones(len(records), dtype=bool)
+
+    def _condition_mask(self, key: str, operator: str, value: Any) -> np.ndarray:
+        n_rows = len(self._ids)
+        if operator in ("==", "!=", "in", "nin"):
+            values = value if operator in ("in", "nin") else [value]
+            if key in self._field_index:
+                rows: set[int] = set()
+                for val in values:
+                    rows.update(self._field_index[key].get(val, ()))
+                mask = np.zeros(n_rows, dtype=bool)
+                mask[list(rows)] = True
+            else:
+                values = set(values)
+                mask = np.fromiter(
+                    (m.get(key) in values for m in self._metadatas),
+                    dtype=bool,
+                    count=n_rows,
+                )
+            return ~mask if operator in ("!=", "nin") else mask
+
+        compare = {
+            ">": lambda x: x > value,
+            "<": lambda x: x < value,
+            ">=": lambda x: x >= value,
+            "<=": lambda x: x <= value,
+        }.get(operator)
+        if compare is None:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+
+        return np.fromiter(
+            (key in m and compare(m[key]) for m in self._metadatas),
+            dtype=bool,
+            count=n_rows,
+        )
+
+    def _filters_mask(self, filters) -> np.ndarray:
+        """Build the row mask from llama-index `MetadataFilters`"""
+        masks = []
+        for each in filters.filters:
+            if hasattr(each, "filters"):
+                masks.append(self._filters_mask(each))
+            else:
+                operator = getattr(each.operator, "value", each.operator)
+                masks.append(self._condition_mask(each.key, operator, each.value))
+
+        if not masks:
+            return np.ones(len(self._ids), dtype=bool)
+
+        condition = getattr(filters, "condition", "and")
+        condition = getattr(condition, "value", condition) or "and"
+        if condition == "or":
+            return np.logical_or.reduce(masks)
+        return np.logical_and.reduce(masks)
+
+    def _similarities(
+        self, matrix: np.ndarray, rows: np.ndarray, query: np.ndarray
+    ) -> np.ndarray:
+        scores = np.empty(len(rows), dtype=np.float32)
+        full_scan = len(rows) == matrix.shape[0]
+        for start in range(0, len(rows), QUERY_BLOCK_SIZE):
+            end = start + QUERY_BLOCK_SIZE
+            block = matrix[start:end] if full_scan else matrix[rows[start:end]]
+            scores[start:end] = block.astype(np.float32, copy=False) @ query
+        if self._dtype == "int8":
+            scores /= INT8_SCALE
+        return scores
+
+    def query(
+        self,
+        embedding: list[float],
+        top_k: int = 1,
+        ids: Optional[list[str]] = None,
+        **kwargs,
+    ) -> tuple[list[list[float]], list[float], list[str]]:
+        """Return the top k most similar vector embeddings
+
+        Args:
+            embedding: List of embeddings
+            top_k: Number of most similar embeddings to return
+            ids: List of ids of the embeddings to be queried
+            kwargs: supports `doc_ids` (same as `ids`) and `filters` (llama-index
+                `MetadataFilters`) to restrict the search scope
+
+        Returns:
+            the matched embeddings, the similarity scores, and the ids
+        """
+        doc_ids = kwargs.get("doc_ids")
+        filters = kwargs.get("filters")
+
+        with self._lock:
+            matrix = self._get_matrix()
+            if matrix is None or top_k <= 0:
+                return [], [], []
+
+            mask = self._alive.copy()
+            for scope in (ids, doc_ids):
+                if scope is not None:
+                    scope_mask = np.zeros(len(self._ids), dtype=bool)
+                    scope_rows = [
+                        self._id_to_row[id_] for id_ in scope if id_ in self._id_to_row
+                    ]
+                    scope_mask[scope_rows] = True
+                    mask &= scope_mask
+            if filters is not None and filters.filters:
+                mask &= self._filters_mask(filters)
+
+            rows = np.flatnonzero(mask)
+            if not rows.size:
+                return [], [], []
+
+            query = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+            scores = self._similarities(matrix, rows, query)
+
+            k = min(top_k, rows.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            out_rows = rows[top]
+
+            out_embeddings = self._decode(matrix[out_rows]).tolist()
+            out_ids = [self._ids[row] for row in out_rows]
+
+        return out_embeddings, scores[top].tolist(), out_ids  # type: ignore
+
+    def get(self, id_: str) -> list[float]:
+        """Get the (normalized) embedding of an id"""
+        with self._lock:
+            row = self._id_to_row[id_]
+            matrix = self._get_matrix()
+            assert matrix is not None
+            return self._decode(matrix[row]).tolist()
+
+    def count(self) -> int:
+        return len(self._id_to_row)
+
+    def drop(self):
+        """Delete entire collection from vector stores"""
+        with self._lock:
+            self._matrix = None
+            shutil.rmtree(self._save_path, ignore_errors=True)
+            self._save_path.mkdir(parents=True, exist_ok=True)
+            self._dim = None
+            self._reset_state()
+
+    def __persist_flow__(self):
+        return {
+            "path": str(self._path),
+            "collection_name": self._collection_name,
+            "dtype": self._dtype,
+            "compact_ratio": self._compact_ratio,
+            "indexed_fields": self._indexed_fields,
+        }
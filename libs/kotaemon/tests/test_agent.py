@@ -1,3 +1,4 @@
+import time
 from unittest.mock import patch
 
 import pytest
@@ -159,6 +160,66 @@ def test_rewoo_agent(openai_completion, llm, mock_google_search):
     assert response.text == FINAL_RESPONSE_TEXT
 
 
+class SleepTool(BaseTool):
+    name: str = "sleep"
+    description: str = "Wait, then echo the input"
+    delay: float = 0.0
+
+    def _run_tool(self, query: str) -> str:
+        time.sleep(self.delay)
+        return f"{self.name}({query})"
+
+
+def test_rewoo_agent_tool_scheduling(llm):
+    plugins = [
+        SleepTool(name="slow", delay=0.5),
+        SleepTool(name="fast"),
+        SleepTool(name="hang", delay=2),
+    ]
+    agent = RewooAgent(
+        planner_llm=llm,
+        solver_llm=llm,
+        plugins=plugins,
+        tool_concurrency={"fast": 1},
+        tool_timeouts={"hang": 0.2},
+    )
+    planner_evidences, dependencies = agent._parse_planner_evidences(
+        "#E1: slow[a]\n#E2: fast[b]\n#E3: fast[#E2]\n#E4: hang[c]\n#E5: fast[#E4]\n"
+    )
+    assert dependencies["#E3"] == ["#E2"]
+
+    results = list(agent._iter_worker_evidence(planner_evidences, dependencies))
+    order = [result["e"] for result in results]
+    evidences = {result["e"]: result["evidence"] for result in results}
+
+    # the dependents of fast tools do not wait for the slow one
+    assert order.index("#E3") < order.index("#E1")
+    assert order.index("#E5") < order.index("#E1")
+    assert evidences["#E3"] == "fast(fast(b))"
+    assert evidences["#E5"] == "fast(No evidence found.)"
+
+
+def test_rewoo_agent_timed_out_call_keeps_its_slot(llm):
+    agent = RewooAgent(
+        planner_llm=llm,
+        solver_llm=llm,
+        plugins=[SleepTool(name="hang", delay=0.5)],
+        tool_concurrency={"hang": 1},
+        tool_timeouts={"hang": 0.1},
+    )
+    planner_evidences, dependencies = agent._parse_planner_evidences(
+        "#E1: hang[a]\n#E2: hang[b]\n"
+    )
+
+    start = time.monotonic()
+    results = list(agent._iter_worker_evidence(planner_evidences, dependencies))
+    elapsed = time.monotonic() - start
+
+    assert [result["evidence"] for result in results] == ["No evidence found."] * 2
+    # the second call waits for the thread of the first one to end
+    assert elapsed >= 0.5
+
+
 @patch(
     "openai.resources.chat.completions.Completions.create",
     side_effect=_openai_chat_completion_responses_react,
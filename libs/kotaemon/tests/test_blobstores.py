@@ -0,0 +1,34 @@
+import base64
+
+import pytest
+
+from kotaemon.storages import LocalFileBlobStore
+from kotaemon.storages.blobstores import is_blob_uri
+
+
+def test_local_file_blob_store(tmp_path):
+    store = LocalFileBlobStore(tmp_path)
+    data_uri = "data:image/png;base64," + base64.b64encode(b"image").decode("utf-8")
+
+    uri = store.put_data_uri(data_uri)
+    assert is_blob_uri(uri), "Data URI should be stored as a blob"
+    assert uri.endswith(".png"), "Blob URI should keep the file extension"
+    assert store.exists(uri)
+    assert store.get(uri) == b"image"
+    assert store.to_data_uri(uri) == data_uri, "Blob should resolve to the data URI"
+
+    # same content is stored once
+    assert store.put(b"image") == uri
+    assert len(list(tmp_path.rglob("*.png"))) == 1
+
+    # other values are left unchanged
+    url = "https://example.com/a.png"
+    assert store.put_data_uri(url) == url
+    assert store.to_data_uri(url) == url
+
+    assert store.url(uri) == f"file={store.file_path(uri)}"
+    with pytest.raises(ValueError):
+        store.file_path("kh-blob://../secret")
+
+    store.delete(uri)
+    assert not store.exists(uri)
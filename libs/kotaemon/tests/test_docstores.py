@@ -1,13 +1,18 @@
 import os
-from unittest.mock import patch
+import sys
+from unittest.mock import MagicMock, patch
 
 import pytest
 from elastic_transport import ApiResponseMeta
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
 
 from kotaemon.base import Document
 from kotaemon.storages import (
     ElasticsearchDocumentStore,
+    ElasticsearchVectorStore,
     InMemoryDocumentStore,
+    LanceDBDocumentStore,
+    LogStructuredDocumentStore,
     SimpleFileDocumentStore,
 )
 
@@ -322,6 +327,281 @@ def test_simplefile_document_store_base_interfaces(tmp_path):
     os.remove(tmp_path / "default.json")
 
 
+def test_inmemory_document_store_full_text_search():
+    store = InMemoryDocumentStore()
+    docs = [
+        Document(text="The quick brown fox jumps over the lazy dog", id_="fox"),
+        Document(text="A lazy afternoon with a lazy cat", id_="cat"),
+        Document(text="Quarterly revenue report for the finance team", id_="report"),
+    ]
+    store.add(docs)
+
+    matched = store.query("lazy cat")
+    assert [doc.doc_id for doc in matched] == ["cat", "fox"]
+
+    matched = store.query("lazy", doc_ids=["fox", "report"])
+    assert [doc.doc_id for doc in matched] == ["fox"], "Should respect doc_ids"
+
+    assert store.query("unknown words") == [], "Should return no document"
+
+    store.delete("cat")
+    assert [doc.doc_id for doc in store.query("lazy cat")] == ["fox"]
+
+    # re-adding a document updates its indexed text
+    store.add(Document(text="finance of the fox", id_="fox"), exist_ok=True)
+    assert [doc.doc_id for doc in store.query("lazy")] == []
+
+
+def test_simplefile_document_store_full_text_search(tmp_path):
+    store = SimpleFileDocumentStore(path=tmp_path)
+    store.add(
+        [
+            Document(text="The quick brown fox", id_="fox"),
+            Document(text="Quarterly revenue report", id_="report"),
+        ]
+    )
+    assert (tmp_path / "default.bm25").exists(), "Index file should exist"
+
+    store2 = SimpleFileDocumentStore(path=tmp_path)
+    assert [doc.doc_id for doc in store2.query("revenue")] == ["report"]
+
+    # rebuild the index if it is missing
+    (tmp_path / "default.bm25").unlink()
+    store3 = SimpleFileDocumentStore(path=tmp_path)
+    assert [doc.doc_id for doc in store3.query("fox")] == ["fox"]
+
+    # saved once at the end of the block
+    with store3.deferred_indices():
+        store3.add(Document(text="Annual revenue forecast", id_="forecast"))
+        assert not (tmp_path / "default.bm25").exists(), "Index is out of sync"
+        store3.delete("fox")
+    store4 = SimpleFileDocumentStore(path=tmp_path)
+    assert store4._bm25.doc_ids() == {"report", "forecast"}
+
+    store3.drop()
+    assert not (tmp_path / "default.bm25").exists(), "Index file should be removed"
+
+
+def test_document_store_file_scoped_search(tmp_path):
+    docs = [
+        Document(text="lazy fox", id_="fox", metadata={"file_id": "animals"}),
+        Document(text="lazy cat", id_="cat", metadata={"file_id": "animals"}),
+        Document(text="lazy finance team", id_="report", metadata={"file_id": "work"}),
+    ]
+    store = SimpleFileDocumentStore(path=tmp_path)
+    store.add(docs)
+
+    matched = store.query("lazy", file_ids=["work"])
+    assert [doc.doc_id for doc in matched] == ["report"], "Should respect file_ids"
+    matched = store.query("lazy", doc_ids=["fox", "report"], file_ids=["animals"])
+    assert [doc.doc_id for doc in matched] == ["fox"], "Should apply both scopes"
+    assert store.query("lazy", file_ids=[]) == []
+
+    # the file scope is rebuilt on load, and updated on delete
+    store2 = SimpleFileDocumentStore(path=tmp_path)
+    store2.delete("cat")
+    matched = store2.query("lazy", file_ids=["animals"])
+    assert [doc.doc_id for doc in matched] == ["fox"]
+
+
+def mock_lancedb_store():
+    lancedb = MagicMock()
+    connection = lancedb.connect.return_value
+    connection.table_names.return_value = ["docstore"]
+    table = connection.open_table.return_value
+    table.schema.names = ["id", "text", "attributes", "file_id"]
+    table.search.return_value.limit.return_value.to_list.return_value = []
+
+    with patch.dict(sys.modules, {"lancedb": lancedb}):
+        store = LanceDBDocumentStore()
+    return store, connection, table
+
+
+def test_lancedb_document_store_deferred_indices():
+    store, _, table = mock_lancedb_store()
+
+    docs = [Document(text=f"doc {i}", id_=str(i)) for i in range(4)]
+    store.add(docs[:2])
+    assert table.create_fts_index.call_count == 1, "Should rebuild after add"
+
+    with store.deferred_indices():
+        with store.deferred_indices():
+            store.add(docs[2:])
+            store.delete(["0"])
+        store.delete(["1"])
+        assert table.create_fts_index.call_count == 1, "Should defer the rebuilds"
+    assert table.create_fts_index.call_count == 2, "Should rebuild once at the end"
+    table.optimize.assert_called_once()
+
+    # nothing changed since the last rebuild
+    store.optimize()
+    store.query("doc")
+    assert table.create_fts_index.call_count == 2
+
+    # an outdated index is rebuilt before a query
+    store.add(docs[:1], refresh_indices=False)
+    assert table.create_fts_index.call_count == 2
+    store.query("doc")
+    assert table.create_fts_index.call_count == 3
+
+
+def test_lancedb_document_store_get():
+    store, connection, table = mock_lancedb_store()
+
+    def lookup(query_filter):
+        ids = query_filter[len("id in (") : -1].replace("'", "").split(", ")
+        rows = [{"id": _id, "text": _id, "attributes": "{}"} for _id in ids]
+        chain = MagicMock()
+        chain.select.return_value.limit.return_value.to_list.return_value = rows
+        return chain
+
+    table.search.return_value.where.side_effect = lookup
+
+    ids = [str(i) for i in range(2500)]
+    docs = store.get(ids[::-1] + ["7"])
+    assert [doc.doc_id for doc in docs] == ids[::-1] + ["7"], "Should keep order"
+    assert table.search.return_value.where.call_count == 3, "Should batch the ids"
+
+    store.get("1")
+    store.delete(["1"])
+    assert connection.open_table.call_count == 1, "Should reuse the table handle"
+    table.create_scalar_index.assert_called_once_with("id", index_type="BTREE")
+
+
+def test_log_structured_document_store_base_interfaces(tmp_path):
+    """Test all interfaces of a a document store"""
+
+    store = LogStructuredDocumentStore(path=tmp_path)
+    docs = [
+        Document(text=f"Sample text {idx}", meta={"meta_key": f"meta_value_{idx}"})
+        for idx in range(10)
+    ]
+
+    # Test add and get all
+    assert len(store.get_all()) == 0, "Document store should be empty"
+    store.add(docs)
+    assert len(store.get_all()) == 10, "Document store should have 10 documents"
+
+    # Test add with provided ids
+    store.add(docs=docs, ids=[f"doc_{idx}" for idx in range(10)])
+    assert store.count() == 20, "Document store should have 20 documents"
+
+    # Test add without exist_ok
+    with pytest.raises(ValueError):
+        store.add(docs=docs, ids=[f"doc_{idx}" for idx in range(10)])
+
+    # Update ok with add exist_ok
+    store.add(docs=docs, ids=[f"doc_{idx}" for idx in range(10)], exist_ok=True)
+    assert store.count() == 20, "Document store should have 20 documents"
+
+    # Test get with list of ids
+    matched = store.get([docs[1].doc_id, docs[0].doc_id])
+    assert [doc.text for doc in matched] == [docs[1].text, docs[0].text]
+
+    # Test delete
+    store.delete(docs[0].doc_id)
+    store.delete([docs[1].doc_id, docs[2].doc_id])
+    assert store.count() == 17, "Document store should have 17 documents"
+
+    # Test load only reads the index, and documents are still readable
+    store2 = LogStructuredDocumentStore(path=tmp_path)
+    assert store2.count() == 17, "Loaded document store should have 17 documents"
+    assert store2.get("doc_3")[0].text == "Sample text 3"
+
+    # Test compaction keeps the live documents
+    store2.compact()
+    assert store2._dead_bytes == 0, "Compaction should drop dead records"
+    store3 = LogStructuredDocumentStore(path=tmp_path)
+    assert len(store3.get_all()) == 17, "Compacted store should have 17 documents"
+    assert store3.get("doc_9")[0].text == "Sample text 9"
+
+    # Test segment rotation
+    store4 = LogStructuredDocumentStore(
+        path=tmp_path, collection_name="small", segment_max_bytes=512
+    )
+    store4.add(docs)
+    assert len(list((tmp_path / "small").glob("segment-*"))) > 1
+    assert [doc.text for doc in store4.get_all()] == [doc.text for doc in docs]
+
+    store3.drop()
+    assert LogStructuredDocumentStore(path=tmp_path).count() == 0
+
+
+def test_log_structured_document_store_full_text_search(tmp_path):
+    store = LogStructuredDocumentStore(path=tmp_path)
+    store.add(
+        [
+            Document(text="lazy fox", id_="fox", metadata={"file_id": "animals"}),
+            Document(text="lazy cat", id_="cat", metadata={"file_id": "animals"}),
+            Document(
+                text="lazy finance team", id_="report", metadata={"file_id": "work"}
+            ),
+        ]
+    )
+    assert [doc.doc_id for doc in store.query("finance")] == ["report"]
+    matched = store.query("lazy", file_ids=["work"])
+    assert [doc.doc_id for doc in matched] == ["report"], "Should respect file_ids"
+    matched = store.query("lazy", doc_ids=["fox", "report"], file_ids=["animals"])
+    assert [doc.doc_id for doc in matched] == ["fox"], "Should apply both scopes"
+
+    # the index is rebuilt on load, and updated on delete and overwrite
+    store2 = LogStructuredDocumentStore(path=tmp_path)
+    assert [doc.doc_id for doc in store2.query("finance")] == ["report"]
+    store2.delete("cat")
+    store2.add(Document(text="finance of the fox", id_="fox"), exist_ok=True)
+    assert [doc.doc_id for doc in store2.query("lazy")] == ["report"]
+    assert store2.query("lazy", file_ids=["animals"]) == []
+
+    store2.compact()
+    assert [doc.text for doc in store2.query("fox")] == ["finance of the fox"]
+
+
+def test_log_structured_document_store_saved_full_text_index(tmp_path, monkeypatch):
+    store = LogStructuredDocumentStore(path=tmp_path)
+    with store.deferred_indices():
+        store.add(
+            [
+                Document(text="lazy fox", id_="fox", metadata={"file_id": "animals"}),
+                Document(text="lazy cat", id_="cat", metadata={"file_id": "animals"}),
+            ]
+        )
+    assert (
+        store._save_path / "bm25.pkl"
+    ).exists(), "Index saved at the end of the block"
+    store.delete("cat")
+    store.add(Document(text="finance team", id_="report", metadata={"file_id": "work"}))
+
+    # only the documents changed since the index was saved are read on load
+    indexed: list[str] = []
+    index_documents = LogStructuredDocumentStore._index_documents
+
+    def _index_documents(self, doc_ids, *args, **kwargs):
+        indexed.extend(doc_ids)
+        return index_documents(self, doc_ids, *args, **kwargs)
+
+    monkeypatch.setattr(
+        LogStructuredDocumentStore, "_index_documents", _index_documents
+    )
+    store2 = LogStructuredDocumentStore(path=tmp_path)
+    assert indexed == ["report"]
+    assert [doc.doc_id for doc in store2.query("lazy")] == ["fox"]
+    assert store2.query("lazy", file_ids=["work"]) == []
+    assert [doc.doc_id for doc in store2.query("team", file_ids=["work"])] == ["report"]
+
+    # the compaction saves the index of the new offsets
+    store2.compact()
+    indexed.clear()
+    store3 = LogStructuredDocumentStore(path=tmp_path)
+    assert indexed == []
+    assert [doc.doc_id for doc in store3.query("lazy fox")] == ["fox"]
+
+    # an unusable saved index is rebuilt
+    (store._save_path / "bm25.pkl").write_bytes(b"broken")
+    store4 = LogStructuredDocumentStore(path=tmp_path)
+    assert sorted(indexed) == ["fox", "report"]
+    assert [doc.doc_id for doc in store4.query("finance")] == ["report"]
+
+
 @patch(
     "elastic_transport.Transport.perform_request",
     side_effect=_elastic_search_responses,
@@ -354,3 +634,68 @@ def test_elastic_document_store(elastic_api):
     assert store.count() == 2, "Document store delete() failed"
 
     elastic_api.assert_called()
+
+
+@patch(
+    "elastic_transport.Transport.perform_request",
+    side_effect=[
+        # check exist, create index
+        (meta_fail, None),
+        (meta_success, {"acknowledged": True, "index": "test"}),
+        # check exist
+        (meta_success, None),
+    ],
+)
+def test_elastic_hybrid_query(elastic_api):
+    store = ElasticsearchDocumentStore(collection_name="test")
+    vector_store = ElasticsearchVectorStore(collection_name="test")
+    assert store.supports_hybrid_query(vector_store)
+    assert not InMemoryDocumentStore().supports_hybrid_query(vector_store)
+
+    store._file_id_field = "metadata.file_id"
+    hits = [
+        {
+            "_id": "a",
+            "_score": 3.0,
+            "_source": {"content": "text a", "metadata": {"file_id": "f"}},
+            "fields": {"similarity": [0.8]},
+        },
+        {
+            "_id": "b",
+            "_score": 1.0,
+            "_source": {"content": "text b", "metadata": {"file_id": "f"}},
+            "fields": {"similarity": [-1.0]},
+        },
+    ]
+    with patch.object(
+        store.client, "search", return_value={"hits": {"hits": hits}}
+    ) as search:
+        docs = store.hybrid_query(
+            "text", [0.1, 0.2], top_k=2, file_ids=["f"], fusion="weighted"
+        )
+
+    body = search.call_args.kwargs["body"]
+    assert body["knn"]["filter"] == [{"terms": {"metadata.file_id": ["f"]}}]
+    assert body["knn"]["boost"] == body["query"]["bool"]["boost"] == 0.5
+    assert [doc.doc_id for doc in docs] == ["a", "b"]
+    assert [doc.score for doc in docs] == [0.8, -1.0]
+    assert docs[0].retrieval_metadata["fusion_score"] == 3.0
+
+    # the metadata filters are applied to both searches
+    filters = MetadataFilters(
+        filters=[MetadataFilter(key="page_label", value="1", operator="==")]
+    )
+    mapping = {"test": {"mappings": {"properties": {}}}}
+    with patch.object(
+        store.client, "search", return_value={"hits": {"hits": []}}
+    ) as search, patch.object(
+        store.client.indices, "get_mapping", return_value=mapping
+    ):
+        store.hybrid_query("text", [0.1, 0.2], file_ids=["f"], filters=filters)
+
+    body = search.call_args.kwargs["body"]
+    page_filter = {
+        "bool": {"must": [{"term": {"metadata.page_label": "1"}}], "must_not": []}
+    }
+    assert body["knn"]["filter"][1] == page_filter
+    assert body["query"]["bool"]["filter"][1] == page_filter
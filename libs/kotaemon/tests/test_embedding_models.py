@@ -1,4 +1,6 @@
 import json
+import threading
+import time
 from pathlib import Path
 from unittest.mock import Mock, patch
 
@@ -7,12 +9,14 @@ from openai.types.create_embedding_response import CreateEmbeddingResponse
 from kotaemon.base import Document, DocumentWithEmbedding
 from kotaemon.embeddings import (
     AzureOpenAIEmbeddings,
+    CachedEmbeddings,
     FastEmbedEmbeddings,
     LCCohereEmbeddings,
     LCHuggingFaceEmbeddings,
     OpenAIEmbeddings,
     VoyageAIEmbeddings,
 )
+from kotaemon.embeddings.dispatcher import BatchDispatcher, plan_batches
 
 from .conftest import (
     skip_when_cohere_not_installed,
@@ -111,6 +115,144 @@ def test_openai_embeddings_batch_raw(openai_embedding_call):
     openai_embedding_call.assert_called()
 
 
+@patch(
+    "openai.resources.embeddings.Embeddings.create",
+    side_effect=lambda *args, **kwargs: openai_embedding,
+)
+def test_cached_embeddings(openai_embedding_call, tmp_path):
+    def get_model(**kwargs):
+        return CachedEmbeddings(
+            embedding=OpenAIEmbeddings(
+                api_key="some-key", model="text-embedding-ada-002", **kwargs
+            ),
+            cache_path=str(tmp_path / "cache.db"),
+        )
+
+    model = get_model()
+    output = model("Hello world")
+    assert_embedding_result(output)
+    assert openai_embedding_call.call_count == 1
+    assert (model.hits, model.misses) == (0, 1)
+
+    # the cache is persisted and shared by models with the same configuration
+    model = get_model()
+    cached_output = model(["Hello world", "Hello world"])
+    assert openai_embedding_call.call_count == 1
+    assert (model.hits, model.misses) == (2, 0)
+    assert cached_output[0].embedding == output[0].embedding
+    assert cached_output[0].text == "Hello world"
+
+    # a different configuration does not reuse the cached embeddings
+    model = get_model(dimensions=256)
+    model("Hello world")
+    assert openai_embedding_call.call_count == 2
+    assert model.stats()["entries"] == 2
+
+
+@patch(
+    "openai.resources.embeddings.Embeddings.create",
+    side_effect=lambda *args, **kwargs: openai_embedding,
+)
+def test_openai_embeddings_batched_requests(openai_embedding_call):
+    model = OpenAIEmbeddings(
+        api_key="some-key",
+        model="text-embedding-ada-002",
+        batch_size=1,
+        concurrency=2,
+    )
+    output = model(["Hello world", "Goodbye world", "Hello again"])
+    assert_embedding_result(output)
+    assert [doc.text for doc in output] == [
+        "Hello world",
+        "Goodbye world",
+        "Hello again",
+    ]
+    assert openai_embedding_call.call_count == 3
+
+
+def test_openai_embeddings_share_the_rate_limit_across_threads():
+    lock = threading.Lock()
+    state = {"running": 0, "max_running": 0, "times": []}
+
+    def create(*args, **kwargs):
+        with lock:
+            state["times"].append(time.monotonic())
+            state["running"] += 1
+            state["max_running"] = max(state["max_running"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return openai_embedding
+
+    def embed():
+        model = OpenAIEmbeddings(
+            api_key="some-key",
+            model="text-embedding-ada-002",
+            batch_size=1,
+            concurrency=2,
+            requests_per_minute=600,
+        )
+        assert_embedding_result(model(["Hello world"] * 3))
+
+    with patch("openai.resources.embeddings.Embeddings.create", side_effect=create):
+        threads = [threading.Thread(target=embed) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # 600 requests per minute for both threads together: one per 0.1 second
+    times = sorted(state["times"])
+    assert len(times) == 6
+    assert all(b - a >= 0.09 for a, b in zip(times, times[1:]))
+    assert state["max_running"] <= 2
+
+
+def test_evicted_client_closed_once_unused():
+    import gc
+
+    from openai import OpenAI
+
+    from kotaemon.base.http_clients import ClientRegistry
+
+    registry = ClientRegistry(max_size=1)
+    client = registry.openai_client(OpenAI, api_key="first-key")
+    http_client = client._client
+    registry.openai_client(OpenAI, api_key="second-key")
+    assert not http_client.is_closed, "Still used by the caller"
+
+    del client
+    gc.collect()
+    assert http_client.is_closed
+
+
+def test_plan_batches():
+    assert plan_batches([1] * 5, max_batch_size=2) == [(0, 2), (2, 4), (4, 5)]
+    assert plan_batches([3, 3, 8, 1, 1], max_batch_size=10, max_batch_tokens=6) == [
+        (0, 2),
+        (2, 3),
+        (3, 5),
+    ]
+    assert plan_batches([], max_batch_size=2) == []
+
+
+def test_batch_dispatcher_retries_failed_batch_and_keeps_order():
+    failures = {"count": 0}
+
+    def embed(batch):
+        if batch[0] == 4 and not failures["count"]:
+            failures["count"] += 1
+            raise ConnectionError("temporary failure")
+        return [item * 10 for item in batch]
+
+    dispatcher = BatchDispatcher(max_batch_size=2, max_concurrency=3, max_retries=2)
+    with patch("tenacity.nap.time.sleep"):
+        output = dispatcher.run(embed, list(range(7)))
+
+    assert output == [item * 10 for item in range(7)]
+    assert failures["count"] == 1
+
+
 @skip_when_sentence_bert_not_installed
 @patch(
     "sentence_transformers.SentenceTransformer",
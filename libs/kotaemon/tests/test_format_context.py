@@ -0,0 +1,40 @@
+from kotaemon.base import RetrievedDocument
+from kotaemon.indices.qa.format_context import (
+    EVIDENCE_MODE_TEXT,
+    PrepareEvidencePipeline,
+    get_encoding,
+)
+
+
+def make_docs():
+    return [
+        RetrievedDocument(text="alpha " * 50, score=0.2, metadata={"file_name": "a"}),
+        RetrievedDocument(text="alpha " * 50, score=0.2, metadata={"file_name": "a"}),
+        RetrievedDocument(text="beta " * 500, score=0.5, metadata={"file_name": "b"}),
+        RetrievedDocument(text="gamma " * 10, score=0.9, metadata={"file_name": "c"}),
+    ]
+
+
+def test_prepare_evidence_budget():
+    encoding = get_encoding()
+
+    mode, evidence, images = PrepareEvidencePipeline()(make_docs()).content
+    assert mode == EVIDENCE_MODE_TEXT
+    assert evidence.count("Content from a") == 1
+    assert "gamma" in evidence and not images
+
+    # the long document is truncated, the next ones are left out
+    mode, evidence, _ = PrepareEvidencePipeline(max_context_length=200)(
+        make_docs()
+    ).content
+    assert len(encoding.encode_ordinary(evidence)) <= 200
+    assert "beta" in evidence and "gamma" not in evidence
+
+    # packing skips the long document, and keeps the short ones
+    mode, evidence, _ = PrepareEvidencePipeline(max_context_length=200, pack=True)(
+        make_docs()
+    ).content
+    assert "beta" not in evidence and "gamma" in evidence
+
+    _, evidence, _ = PrepareEvidencePipeline(sort_by_score=True)(make_docs()).content
+    assert evidence.index("gamma") < evidence.index("beta") < evidence.index("alpha")
@@ -3,9 +3,10 @@ from pathlib import Path
 from typing import cast
 from unittest.mock import patch
 
+from llama_index.core.vector_stores import MetadataFilter, MetadataFilters
 from openai.types.create_embedding_response import CreateEmbeddingResponse
 
-from kotaemon.base import Document
+from kotaemon.base import Document, RetrievedDocument
 from kotaemon.embeddings import AzureOpenAIEmbeddings
 from kotaemon.indices import VectorIndexing, VectorRetrieval
 from kotaemon.storages import ChromaVectorStore, InMemoryDocumentStore
@@ -65,3 +66,59 @@ def test_retrieving(tmp_path):
 
     assert len(output) == 1, "Expect 1 results"
     assert output == output1, "Expect identical results"
+
+
+class HybridDocumentStore(InMemoryDocumentStore):
+    """Doc store serving the vector store role too"""
+
+    def supports_hybrid_query(self, vector_store):
+        return True
+
+    def hybrid_query(self, query, embedding, top_k=10, **kwargs):
+        self.hybrid_kwargs = kwargs
+        docs = [RetrievedDocument(text=query, score=0.9), RetrievedDocument(text="x")]
+        return docs[:top_k]
+
+
+@patch(
+    "openai.resources.embeddings.Embeddings.create",
+    side_effect=lambda *args, **kwargs: openai_embedding,
+)
+def test_retrieving_native_hybrid(tmp_path):
+    db = ChromaVectorStore(path=str(tmp_path))
+    doc_store = HybridDocumentStore()
+    embedding = AzureOpenAIEmbeddings(
+        azure_deployment="text-embedding-ada-002",
+        azure_endpoint="https://test.openai.azure.com/",
+        api_key="some-key",
+        api_version="version",
+    )
+    retrieval_pipeline = VectorRetrieval(
+        vector_store=db, doc_store=doc_store, embedding=embedding, top_k=1
+    )
+
+    with patch.object(ChromaVectorStore, "query") as vs_query:
+        output = retrieval_pipeline(text="Hello world", file_ids=["a"])
+    vs_query.assert_not_called()
+    assert [doc.text for doc in output] == ["Hello world"]
+    assert doc_store.hybrid_kwargs == {
+        "file_ids": ["a"],
+        "fusion": "rrf",
+        "text_weight": 0.5,
+        "rrf_k": retrieval_pipeline.rrf_k,
+        "filters": None,
+    }
+
+    # the filters are applied by the hybrid query
+    filters = MetadataFilters(filters=[MetadataFilter(key="file_id", value="a")])
+    retrieval_pipeline(text="Hello world", file_ids=["a"], filters=filters)
+    assert doc_store.hybrid_kwargs["filters"] is filters
+
+    # the other vector store arguments need the vector store query
+    doc_store.hybrid_kwargs = None
+    with patch.object(
+        ChromaVectorStore, "query", return_value=([], [], [])
+    ) as vs_query:
+        retrieval_pipeline(text="Hello world", file_ids=["a"], where={"a": 1})
+    assert vs_query.call_args.kwargs["where"] == {"a": 1}
+    assert doc_store.hybrid_kwargs is None
@@ -1,7 +1,11 @@
 from pathlib import Path
 
+from kotaemon.base import Document
 from kotaemon.indices.ingests import DocumentIngestor
+from kotaemon.indices.ingests.parallel import ProcessPoolLoader
+from kotaemon.indices.ingests.staged import Stage, StagedPipeline, StageOutput
 from kotaemon.indices.splitters import TokenSplitter
+from kotaemon.loaders import PDFThumbnailReader
 
 
 def test_ingestor_include_src():
@@ -13,3 +17,53 @@ def test_ingestor_include_src():
     nodes = ingestor(dirpath / "resources" / "table.pdf")
     assert type(nodes) is list
     assert nodes[0].relationships
+
+
+def test_process_pool_loader():
+    file_path = Path(__file__).parent / "resources" / "multimodal.pdf"
+    reader = PDFThumbnailReader()
+    expected = reader.load_data(file_path, extra_info={"file_id": "a"})
+
+    with ProcessPoolLoader(max_workers=2, pdf_pages_per_task=1) as pool:
+        docs = pool.load_data(reader, file_path, {"file_id": "a"})
+
+    assert [doc.text for doc in docs] == [doc.text for doc in expected]
+    assert [doc.metadata for doc in docs] == [doc.metadata for doc in expected]
+
+
+def test_staged_pipeline():
+    written = []
+
+    def load(item):
+        yield Document(f"loading {item}", channel="debug")
+        if item == "bad":
+            raise ValueError("cannot load")
+        for idx in range(3):
+            yield StageOutput(f"{item}-{idx}")
+
+    def embed(chunk):
+        yield StageOutput((chunk, len(chunk)))
+
+    def write(chunk):
+        written.append(chunk)
+        yield StageOutput(chunk[0])
+
+    pipeline = StagedPipeline(
+        [
+            Stage("load", load, workers=2, queue_size=1),
+            Stage("embed", embed, workers=2, queue_size=1),
+            Stage("write", write, queue_size=1),
+        ]
+    )
+    events = list(pipeline.stream([(0, "a"), (1, "bad"), (2, "b")]))
+
+    progress = [event.value.text for event in events if event.kind == "progress"]
+    assert sorted(progress) == ["loading a", "loading b", "loading bad"]
+
+    errors = {event.key: event.value for event in events if event.kind == "error"}
+    assert list(errors) == [1]
+    assert isinstance(errors[1], ValueError)
+
+    done = {event.key: sorted(event.value) for event in events if event.kind == "done"}
+    assert done == {0: ["a-0", "a-1", "a-2"], 2: ["b-0", "b-1", "b-2"]}
+    assert len(written) == 6
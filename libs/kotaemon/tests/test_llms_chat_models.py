@@ -1,10 +1,11 @@
+import asyncio
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
 from kotaemon.base.schema import AIMessage, HumanMessage, LLMInterface, SystemMessage
-from kotaemon.llms import AzureChatOpenAI, LlamaCppChat
+from kotaemon.llms import AzureChatOpenAI, CachedChatLLM, ChatOpenAI, LlamaCppChat
 
 try:
     pass
@@ -73,6 +74,57 @@ def test_azureopenai_model(openai_completion):
     openai_completion.assert_called()
 
 
+def test_openai_clients_are_shared():
+    def get_model(**kwargs):
+        return ChatOpenAI(api_key="dummy", model="gpt-4o", **kwargs)
+
+    client = get_model().prepare_client()
+    assert get_model(temperature=0).prepare_client() is client
+    assert get_model(base_url="http://localhost:8000/v1").prepare_client() is not client
+
+    async def get_async_clients():
+        return [
+            get_model(**kwargs).prepare_client(async_version=True)
+            for kwargs in ({}, {"temperature": 0})
+        ]
+
+    async_client, other_async_client = asyncio.run(get_async_clients())
+    assert async_client is other_async_client, "Shared within an event loop"
+    assert asyncio.run(get_async_clients())[0] is not async_client
+
+
+@patch(
+    "openai.resources.chat.completions.Completions.create",
+    side_effect=lambda *args, **kwargs: _openai_chat_completion_response,
+)
+def test_cached_chat_llm(openai_completion, tmp_path):
+    def get_model(**kwargs):
+        return CachedChatLLM(
+            llm=ChatOpenAI(api_key="dummy", model="gpt-4o", **kwargs),
+            cache_path=str(tmp_path / "cache.db"),
+        )
+
+    model = get_model()
+    output = model("hello world")
+    assert output.text == "Hello! How can I assist you today?"
+    assert openai_completion.call_count == 1
+
+    # the cache is persisted and shared by models with the same configuration
+    model = get_model()
+    cached_output = model("hello world")
+    assert cached_output.text == output.text
+    assert cached_output.total_tokens == output.total_tokens
+    assert openai_completion.call_count == 1
+    assert (model.hits, model.misses) == (1, 0)
+
+    # other messages, parameters or configurations are sent to the model
+    model([SystemMessage(content="You are a philosopher"), HumanMessage("hello world")])
+    model("hello world", max_tokens=10)
+    get_model(temperature=0.5)("hello world")
+    assert openai_completion.call_count == 4
+    assert model.stats()["entries"] == 4
+
+
 @skip_llama_cpp_not_installed
 def test_llamacpp_chat():
     from llama_cpp import Llama
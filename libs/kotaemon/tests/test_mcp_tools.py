@@ -4,12 +4,14 @@ Covers config parsing, JSON Schema -> Pydantic model building,
 tool formatting, and MCPTool construction (without real MCP servers).
 """
 
+from contextlib import asynccontextmanager
 from types import SimpleNamespace
 from unittest.mock import patch
 
 import pytest
 
 from kotaemon.agents.tools.mcp import (
+    MCPSessionPool,
     MCPTool,
     _json_schema_type_to_python,
     _make_tool,
@@ -298,3 +300,63 @@ class TestMCPToolFormatResult:
             )
         )
         assert "[Binary data: image/png]" in result
+
+
+# ---------------------------------------------------------------------------
+# MCPSessionPool (fake MCP server sessions)
+# ---------------------------------------------------------------------------
+
+
+class _FakeSession:
+    def __init__(self, opened):
+        self.opened = opened
+        self.crashed = False
+
+    async def list_tools(self):
+        return SimpleNamespace(
+            tools=[SimpleNamespace(name="echo", description="Echo the text")]
+        )
+
+    async def call_tool(self, name, arguments):
+        if self.crashed:
+            raise ConnectionError("server is gone")
+        return SimpleNamespace(
+            isError=False,
+            content=[SimpleNamespace(text=f"{self.opened}:{arguments['text']}")],
+        )
+
+
+class TestMCPSessionPool:
+    @pytest.fixture
+    def sessions(self, monkeypatch):
+        sessions = []
+
+        @asynccontextmanager
+        async def open_session(parsed):
+            session = _FakeSession(len(sessions) + 1)
+            sessions.append(session)
+            yield session
+            session.crashed = True
+
+        monkeypatch.setattr("kotaemon.agents.tools.mcp._open_session", open_session)
+        return sessions
+
+    def test_session_reused_and_restarted(self, sessions):
+        pool = MCPSessionPool(idle_timeout=0)
+        try:
+            tools = create_tools_from_config({"command": "uvx"}, session_pool=pool)
+            assert [t.mcp_tool_name for t in tools] == ["echo"]
+            assert tools[0].run('{"text": "a"}') == "1:a"
+            assert tools[0].run('{"text": "b"}') == "1:b"
+            pool.list_tools(parse_mcp_config({"command": "uvx"}))
+            assert len(sessions) == 1
+
+            # the server dies: the next call restarts it
+            sessions[0].crashed = True
+            pool._loop.call_soon_threadsafe(next(iter(pool._servers.values())).stop.set)
+            assert tools[0].run('{"text": "c"}') == "2:c"
+
+            pool.invalidate({"command": "uvx"})
+            assert pool._servers == {}
+        finally:
+            pool.close()
@@ -1,14 +1,22 @@
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
 from openai.types.chat.chat_completion import ChatCompletion
 
 from kotaemon.base import Document
-from kotaemon.indices.rankings import LLMReranking
+from kotaemon.indices.rankings import (
+    LLMReranking,
+    LLMTrulensScoring,
+    reciprocal_rank_fusion,
+    weighted_score_fusion,
+)
 from kotaemon.llms import AzureChatOpenAI
+from kotaemon.rerankings import ONNXCrossEncoderReranking
+from kotaemon.rerankings.onnx_cross_encoder import plan_batches
 
-_openai_chat_completion_responses = [
-    ChatCompletion.parse_obj(
+
+def chat_completion(text: str) -> ChatCompletion:
+    return ChatCompletion.parse_obj(
         {
             "id": "chatcmpl-7qyuw6Q1CFCpcKsMdFkmUPUa7JP2x",
             "object": "chat.completion",
@@ -31,6 +39,10 @@ _openai_chat_completion_responses = [
             "usage": {"completion_tokens": 9, "prompt_tokens": 10, "total_tokens": 19},
         }
     )
+
+
+_openai_chat_completion_responses = [
+    chat_completion(text)
     for text in [
         "YES",
         "NO",
@@ -61,3 +73,87 @@ def test_reranking(openai_completion, llm):
     rerank_docs = reranker(documents, query=query)
 
     assert len(rerank_docs) == 2
+
+
+@patch(
+    "openai.resources.chat.completions.Completions.create",
+    side_effect=[
+        # the first batch misses the score of its second document
+        chat_completion('The scores are: {"1": 8, "CONTEXT 3": 9}'),
+        chat_completion("2"),
+        chat_completion("6"),
+    ],
+)
+def test_llm_trulens_scoring_batched(openai_completion, llm):
+    documents = [Document(text=f"test {idx}") for idx in range(3)]
+
+    scorer = LLMTrulensScoring(llm=llm, batch_size=2, concurrent=False)
+    scored_docs = scorer(documents, query="test query")
+
+    assert openai_completion.call_count == 3
+    assert [doc.text for doc in scored_docs] == ["test 0", "test 1", "test 2"]
+    assert [doc.metadata["llm_trulens_score"] for doc in scored_docs] == [
+        0.8,
+        0.6,
+        0.2,
+    ]
+
+
+def test_plan_batches():
+    batches = plan_batches([5, 100, 3, 50, 7], max_tokens=150)
+    assert batches == [[2, 0, 4], [3], [1]], "Expect batches of similar lengths"
+    assert plan_batches([300], max_tokens=100) == [[0]]
+
+
+def test_onnx_cross_encoder_reranking():
+    class Encoding:
+        def __init__(self, query, text):
+            self.ids = [len(word) for word in f"{query} {text}".split()]
+            self.attention_mask = [1] * len(self.ids)
+            self.type_ids = [0] * len(self.ids)
+
+    tokenizer = Mock()
+    tokenizer.encode_batch.side_effect = lambda pairs: [Encoding(*p) for p in pairs]
+
+    def run(_, inputs):
+        # the score is the sum of the token ids
+        return [(inputs["input_ids"] * inputs["attention_mask"]).sum(1)[:, None]]
+
+    session = Mock()
+    session.get_inputs.return_value = [Mock(), Mock()]
+    session.run.side_effect = run
+
+    reranker = ONNXCrossEncoderReranking(batch_max_tokens=8)
+    documents = [Document(text=text) for text in ["a", "b ccc", "dd"]]
+    with patch.object(
+        ONNXCrossEncoderReranking, "load", return_value=(session, tokenizer)
+    ):
+        reranked = reranker(documents, query="q")
+
+    assert [doc.text for doc in reranked] == ["b ccc", "dd", "a"]
+    assert session.run.call_count == 2, "Expect batches of at most 8 padded tokens"
+    assert 0.5 < reranked[-1].metadata["reranking_score"] < 1
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d", "a"]], k=60)
+    ids = [id_ for id_, _ in fused]
+
+    assert sorted(ids) == ["a", "b", "c", "d"], "Expect de-duplicated ids"
+    assert ids[:2] == ["a", "c"], "Expect ids found in both lists to rank first"
+
+    # a list with zero weight should not affect the ranking
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"]], weights=[1.0, 0.0])
+    assert [id_ for id_, _ in fused] == ["a", "b"]
+
+
+def test_weighted_score_fusion():
+    fused = weighted_score_fusion(
+        [[("a", 0.9), ("b", 0.5), ("c", 0.1)], [("c", 12.0), ("b", 4.0)]],
+        weights=[0.4, 0.6],
+    )
+    scores = dict(fused)
+
+    assert fused[0][0] == "c", "Expect top full-text hit to be ranked first"
+    assert scores["a"] == pytest.approx(0.4)
+    assert scores["b"] == pytest.approx(0.2)
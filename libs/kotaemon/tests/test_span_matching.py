@@ -0,0 +1,153 @@
+"""Tests of the citation span matching, against the SequenceMatcher reference
+
+Run this file directly for a micro-benchmark of the two implementations:
+
+    python tests/test_span_matching.py
+"""
+import random
+import time
+from difflib import SequenceMatcher
+
+import pytest
+
+from kotaemon.indices.qa.span_matching import SpanMatcher
+from kotaemon.indices.qa.utils import find_start_end_phrase, find_text
+
+
+def reference_find_text(search_span, context, min_length=5):
+    search_span, context = search_span.lower(), context.lower()
+
+    sentence_list = search_span.split("\n")
+    context = context.replace("\n", " ")
+
+    matches_span = []
+    if len(search_span) > min_length:
+        for sentence in sentence_list:
+            match_results = SequenceMatcher(
+                None, sentence, context, autojunk=False
+            ).get_matching_blocks()
+
+            matched_blocks = []
+            for _, start, length in match_results:
+                if length > max(len(sentence) * 0.25, min_length):
+                    matched_blocks.append((start, start + length))
+
+            if matched_blocks:
+                start_index = min(start for start, _ in matched_blocks)
+                end_index = max(end for _, end in matched_blocks)
+                length = end_index - start_index
+
+                if length > max(len(sentence) * 0.35, min_length):
+                    matches_span.append((start_index, end_index))
+
+    if matches_span:
+        final_span = min(start for start, _ in matches_span), max(
+            end for _, end in matches_span
+        )
+        matches_span = [final_span]
+
+    return matches_span
+
+
+def reference_find_start_end_phrase(
+    start_phrase, end_phrase, context, min_length=5, max_excerpt_length=300
+):
+    start_phrase, end_phrase = start_phrase.lower(), end_phrase.lower()
+    context = context.lower().replace("\n", " ")
+
+    matches = []
+    matched_length = 0
+    for sentence in [start_phrase, end_phrase]:
+        match = SequenceMatcher(
+            None, sentence, context, autojunk=False
+        ).find_longest_match()
+        if match.size > max(len(sentence) * 0.35, min_length):
+            matches.append((match.b, match.b + match.size))
+            matched_length += match.size
+
+    if len(matches) == 2 and matches[1][0] < matches[0][0]:
+        matches = [matches[0]]
+
+    if matches:
+        start_idx = min(start for start, _ in matches)
+        end_idx = max(end for _, end in matches)
+        if end_idx - start_idx > max_excerpt_length:
+            end_idx = start_idx + max_excerpt_length
+        return (start_idx, end_idx), matched_length
+
+    return None, matched_length
+
+
+WORDS = (
+    "the revenue of the company grew by percent in fiscal year while operating "
+    "costs decreased due to automation and the board approved a new dividend "
+    "policy for shareholders in the following quarter"
+).split()
+
+
+def make_document(rng: random.Random, n_words: int) -> str:
+    lines = []
+    for _ in range(n_words // 12):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+    return "\n".join(lines)
+
+
+def make_quote(rng: random.Random, document: str) -> str:
+    """A quote of the document, possibly paraphrased by the LLM"""
+    start = rng.randrange(0, max(len(document) - 200, 1))
+    quote = list(document[start : start + rng.randint(20, 200)])
+    for _ in range(rng.randint(0, 4)):
+        quote[rng.randrange(len(quote))] = rng.choice("abcxyz ")
+    if rng.random() < 0.3:
+        quote.insert(rng.randrange(len(quote)), "\n")
+    return "".join(quote).upper() if rng.random() < 0.2 else "".join(quote)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_span_matcher_matches_sequence_matcher(seed):
+    rng = random.Random(seed)
+    document = make_document(rng, 400)
+    matcher = SpanMatcher(document)
+
+    for _ in range(20):
+        quote = make_quote(rng, document)
+        assert matcher.find_text(quote) == reference_find_text(quote, document)
+
+        start_phrase, end_phrase = quote[:40], quote[-40:]
+        assert matcher.find_start_end_phrase(
+            start_phrase, end_phrase
+        ) == reference_find_start_end_phrase(start_phrase, end_phrase, document)
+
+    # unrelated text, and text too short to be searched
+    assert find_text("zzzz qqqq wwww", document) == []
+    assert find_text("the", document) == []
+    assert find_start_end_phrase("qqqqqqq", "wwwwwww", document) == (None, 0)
+
+
+def benchmark(n_docs: int = 10, n_words: int = 800, n_quotes: int = 10):
+    rng = random.Random(0)
+    documents = [make_document(rng, n_words) for _ in range(n_docs)]
+    quotes = [make_quote(rng, rng.choice(documents)) for _ in range(n_quotes)]
+
+    start = time.perf_counter()
+    for quote in quotes:
+        for document in documents:
+            reference_find_text(quote, document)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matchers = [SpanMatcher(document) for document in documents]
+    for quote in quotes:
+        for matcher in matchers:
+            matcher.find_text(quote)
+    matcher_time = time.perf_counter() - start
+
+    print(
+        f"{n_quotes} quotes x {n_docs} documents of {n_words} words: "
+        f"SequenceMatcher {reference_time:.3f}s, SpanMatcher {matcher_time:.3f}s "
+        f"({reference_time / matcher_time:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    benchmark()
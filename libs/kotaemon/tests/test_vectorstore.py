@@ -1,6 +1,7 @@
 import json
 import os
 
+import numpy as np
 import pytest
 
 from kotaemon.base import DocumentWithEmbedding
@@ -8,6 +9,7 @@ from kotaemon.storages import (
     ChromaVectorStore,
     InMemoryVectorStore,
     MilvusVectorStore,
+    NumpyFlatVectorStore,
     QdrantVectorStore,
     SimpleFileVectorStore,
 )
@@ -159,6 +161,89 @@ class TestSimpleFileVectorStore:
         os.remove(tmp_path / collection_name)
 
 
+class TestNumpyFlatVectorStore:
+    def test_add_query(self, tmp_path):
+        db = NumpyFlatVectorStore(path=tmp_path)
+
+        embeddings = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6], [0.7, 0.8, 0.9]]
+        metadatas = [{"file_id": "f1"}, {"file_id": "f1"}, {"file_id": "f2"}]
+        ids = ["a", "b", "c"]
+
+        output = db.add(embeddings=embeddings, metadatas=metadatas, ids=ids)
+        assert output == ids, "Expected output to be the same as ids"
+        assert db.count() == 3, "Expected 3 added entries"
+
+        _, sim, out_ids = db.query(embedding=[0.1, 0.2, 0.3], top_k=1)
+        assert abs(sim[0] - 1.0) < 1e-6
+        assert out_ids == ["a"]
+
+        _, _, out_ids = db.query(embedding=[0.1, 0.2, 0.3], top_k=3, doc_ids=["c"])
+        assert out_ids == ["c"], "Expected query restricted to doc_ids"
+
+    def test_metadata_filters(self, tmp_path):
+        from llama_index.core.vector_stores import (
+            FilterCondition,
+            FilterOperator,
+            MetadataFilter,
+            MetadataFilters,
+        )
+
+        db = NumpyFlatVectorStore(path=tmp_path)
+        db.add(
+            embeddings=[[0.1, 0.2, 0.3], [0.4, 0.5, 0.6], [0.7, 0.8, 0.9]],
+            metadatas=[{"file_id": "f1"}, {"file_id": "f2"}, {"file_id": "f3"}],
+            ids=["a", "b", "c"],
+        )
+        filters = MetadataFilters(
+            filters=[
+                MetadataFilter(
+                    key="file_id", value=["f2", "f3"], operator=FilterOperator.IN
+                )
+            ],
+            condition=FilterCondition.OR,
+        )
+        _, _, out_ids = db.query(embedding=[0.1, 0.2, 0.3], top_k=3, filters=filters)
+        assert sorted(out_ids) == ["b", "c"], "Expected query filtered by file_id"
+
+    def test_delete_compact_load(self, tmp_path):
+        embeddings = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6], [0.7, 0.8, 0.9]]
+        ids = ["1", "2", "3"]
+        db = NumpyFlatVectorStore(path=tmp_path, compact_ratio=0.5)
+        db.add(embeddings=embeddings, ids=ids)
+
+        db.delete(["3"])
+        assert db.count() == 2, "Expected 2 remaining entries"
+        _, _, out_ids = db.query(embedding=[0.7, 0.8, 0.9], top_k=3)
+        assert "3" not in out_ids, "Deleted entry should not be returned"
+
+        db2 = NumpyFlatVectorStore(path=tmp_path)
+        assert db2.count() == 2, "load function does not load data completely"
+        assert db2.get("2") == pytest.approx(
+            (np.array([0.4, 0.5, 0.6]) / np.linalg.norm([0.4, 0.5, 0.6])).tolist()
+        )
+
+        # exceed the compact ratio
+        db2.delete(["1"])
+        assert len(db2._ids) == 1, "Expected deleted rows to be compacted"
+        db3 = NumpyFlatVectorStore(path=tmp_path)
+        _, _, out_ids = db3.query(embedding=[0.1, 0.2, 0.3], top_k=3)
+        assert out_ids == ["2"]
+
+        db3.drop()
+        assert NumpyFlatVectorStore(path=tmp_path).count() == 0
+
+    @pytest.mark.parametrize("dtype", ["float16", "int8"])
+    def test_quantized_dtype(self, tmp_path, dtype):
+        db = NumpyFlatVectorStore(path=tmp_path, dtype=dtype)
+        db.add(
+            embeddings=[[0.1, 0.2, 0.3], [0.4, 0.5, 0.6], [-0.7, 0.8, -0.9]],
+            ids=["a", "b", "c"],
+        )
+        _, sim, out_ids = db.query(embedding=[-0.7, 0.8, -0.9], top_k=1)
+        assert out_ids == ["c"]
+        assert abs(sim[0] - 1.0) < 1e-2
+
+
 class TestMilvusVectorStore:
     def test_add(self, tmp_path):
         """Test that the DB add correctly"""
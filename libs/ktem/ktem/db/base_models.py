@@ -44,6 +44,29 @@ class BaseConversation(SQLModel):
     )
 
 
+class BaseConversationTurn(SQLModel):
+    """Store the evidence shown with each message of a conversation
+
+    The evidence is kept out of the conversation record, so that listing and
+    opening a conversation does not load the evidence of all its messages.
+
+    Attributes:
+        id: canonical id to identify the record
+        conversation_id: the conversation id
+        turn: the index of the message in the conversation
+        retrieval_message: the retrieved evidence (in html format)
+        plot_data: the plot of the message (in dict/json format)
+    """
+
+    __table_args__ = {"extend_existing": True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: str = Field(index=True)
+    turn: int = Field(default=0)
+    retrieval_message: str = Field(default="")
+    plot_data: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+
+
 class BaseUser(SQLModel):
     """Store the user information
 
@@ -10,6 +10,12 @@ _base_conv = (
     else base_models.BaseConversation
 )
 
+_base_conv_turn = (
+    import_dotted_string(settings.KH_TABLE_CONV_TURN, safe=False)
+    if hasattr(settings, "KH_TABLE_CONV_TURN")
+    else base_models.BaseConversationTurn
+)
+
 _base_user = (
     import_dotted_string(settings.KH_TABLE_USER, safe=False)
     if hasattr(settings, "KH_TABLE_USER")
@@ -33,6 +39,10 @@ class Conversation(_base_conv, table=True):  # type: ignore
     """Conversation record"""
 
 
+class ConversationTurn(_base_conv_turn, table=True):  # type: ignore
+    """Evidence of the conversation messages"""
+
+
 class User(_base_user, table=True):  # type: ignore
     """User table"""
 
@@ -42,7 +42,9 @@ class EmbeddingManager:
             items = sess.execute(stmt)
 
             for (item,) in items:
-                self._models[item.name] = deserialize(item.spec, safe=False)
+                self._models[item.name] = self._with_cache(
+                    deserialize(item.spec, safe=False)
+                )
                 self._info[item.name] = {
                     "name": item.name,
                     "spec": item.spec,
@@ -52,6 +54,20 @@ class EmbeddingManager:
                     self._default = item.name
                     self._models["default"] = self._models[item.name]
 
+    def _with_cache(self, model: BaseEmbeddings) -> BaseEmbeddings:
+        """Wrap the model with the persistent embedding cache, if configured"""
+        cache = getattr(flowsettings, "KH_EMBEDDING_CACHE", None)
+        if not cache or not cache.get("path"):
+            return model
+
+        from kotaemon.embeddings import CachedEmbeddings
+
+        return CachedEmbeddings(
+            embedding=model,
+            cache_path=cache["path"],
+            max_size_bytes=cache.get("max_size_bytes"),
+        )
+
     def load_vendors(self):
         from kotaemon.embeddings import (
             AzureOpenAIEmbeddings,
@@ -124,16 +124,18 @@ class BaseFileIndexIndexing(BaseComponent):
             the new file paths, relative to the file storage
         """
         import shutil
-        from hashlib import sha256
+
+        from .utils import file_sha256
 
         if not isinstance(file_paths, list):
             file_paths = [file_paths]
 
         paths = []
         for file_path in file_paths:
-            with open(file_path, "rb") as f:
-                paths.append(sha256(f.read()).hexdigest())
-            shutil.copy(file_path, self.FSPath / paths[-1])
+            paths.append(file_sha256(file_path))
+            # the stored files are named by their content
+            if not (self.FSPath / paths[-1]).exists():
+                shutil.copy(file_path, self.FSPath / paths[-1])
 
         return paths
 
@@ -70,6 +70,8 @@ class GraphRAGIndexingPipeline(IndexDocumentPipeline):
         """Simply disable the splitter (chunking) for this pipeline"""
         pipeline = super().route(file_path)
         pipeline.splitter = None
+        # the documents of each file are needed, not shared chunks
+        pipeline.dedup_content = False
 
         return pipeline
 
@@ -10,7 +10,12 @@ import yaml
 from kotaemon.base import RetrievedDocument
 from kotaemon.indices.rankings import BaseReranking, LLMReranking, LLMTrulensScoring
 
-from ..pipelines import BaseFileIndexRetriever, IndexDocumentPipeline, IndexPipeline
+from ..pipelines import (
+    BaseFileIndexRetriever,
+    IndexDocumentPipeline,
+    IndexPipeline,
+    llm_scoring_settings,
+)
 
 
 class KnetIndexingPipeline(IndexDocumentPipeline):
@@ -36,6 +41,8 @@ class KnetIndexingPipeline(IndexDocumentPipeline):
         """Simply disable the splitter (chunking) for this pipeline"""
         pipeline = super().route(file_path)
         pipeline.splitter = None
+        # the chunks are indexed by the knowledge network, not shared
+        pipeline.dedup_content = False
         # assign IndexPipeline collection name to parse to loader
         pipeline.collection_name = self.collection_name
 
@@ -153,7 +160,7 @@ class KnetRetrievalPipeline(BaseFileIndexRetriever):
         from ktem.llms.manager import llms
 
         retriever = cls(
-            rerankers=[LLMTrulensScoring()],
+            rerankers=[LLMTrulensScoring(**llm_scoring_settings())],
         )
 
         # hacky way to input doc_ids to retriever.run() call (through theflow)
@@ -162,8 +169,8 @@ class KnetRetrievalPipeline(BaseFileIndexRetriever):
 
         for reranker in retriever.rerankers:
             if isinstance(reranker, LLMReranking):
-                reranker.llm = llms.get(
-                    user_settings["reranking_llm"], llms.get_default()
+                reranker.llm = llms.cached(
+                    llms.get(user_settings["reranking_llm"], llms.get_default())
                 )
 
         return retriever
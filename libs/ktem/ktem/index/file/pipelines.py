@@ -5,8 +5,10 @@ import logging
 import shutil
 import threading
 import time
+import uuid
 import warnings
 from collections import defaultdict
+from concurrent.futures import Future
 from copy import deepcopy
 from functools import lru_cache
 from hashlib import sha256
@@ -44,10 +46,13 @@ from kotaemon.indices.ingests.files import (
     unstructured,
     web_reader,
 )
+from kotaemon.indices.ingests.parallel import ProcessPoolLoader
+from kotaemon.indices.ingests.staged import Stage, StagedPipeline, StageOutput
 from kotaemon.indices.rankings import BaseReranking, LLMReranking, LLMTrulensScoring
 from kotaemon.indices.splitters import BaseSplitter, TokenSplitter
 
 from .base import BaseFileIndexIndexing, BaseFileIndexRetriever
+from .utils import file_sha256
 
 logger = logging.getLogger(__name__)
 
@@ -74,8 +79,154 @@ def dev_settings():
     return file_extractors, chunk_size, chunk_overlap
 
 
+def stage_workers_settings() -> dict:
+    """Retrieve the number of workers of each indexing stage from flowsettings.py"""
+    return getattr(settings, "FILE_INDEX_PIPELINE_STAGE_WORKERS", {})
+
+
+def llm_scoring_settings() -> dict:
+    """Retrieve the batching settings of the LLM relevance scoring"""
+    return getattr(settings, "FILE_INDEX_PIPELINE_LLM_SCORING", {})
+
+
+def parse_processes_settings() -> tuple[int, int]:
+    """Retrieve the number of parsing processes and PDF pages per parsing task"""
+    return (
+        getattr(settings, "FILE_INDEX_PIPELINE_PARSE_PROCESSES", 0),
+        getattr(settings, "FILE_INDEX_PIPELINE_PDF_PAGES_PER_TASK", 0),
+    )
+
+
 _default_token_func = tiktoken.encoding_for_model("gpt-3.5-turbo").encode
 
+# file metadata changing with each upload of the same content
+VOLATILE_METADATA_KEYS = {
+    "file_path",
+    "file_size",
+    "creation_date",
+    "last_modified_date",
+    "last_accessed_date",
+}
+
+
+def chunk_content_hash(doc: Document) -> str:
+    """Hash of the text and the (non volatile) metadata of a chunk"""
+    metadata = {
+        key: value
+        for key, value in doc.metadata.items()
+        if key not in VOLATILE_METADATA_KEYS
+    }
+    content = json.dumps(
+        {"text": doc.text, "metadata": metadata}, sort_keys=True, default=str
+    )
+    return sha256(content.encode()).hexdigest()
+
+
+def assign_chunk_ids(docs: list[Document]):
+    """Derive the id of each chunk from its file id and content hash
+
+    So re-indexing a file gives the same ids to its unchanged chunks. The chunks
+    with the same content in a file are told apart by their occurrence number.
+    """
+    occurrences: dict[str, int] = defaultdict(int)
+    for doc in docs:
+        file_id = doc.metadata.get("file_id")
+        if not file_id:
+            continue
+        content_hash = chunk_content_hash(doc)
+        key = f"{file_id}:{content_hash}:{occurrences[content_hash]}"
+        occurrences[content_hash] += 1
+        doc.id_ = str(uuid.uuid5(uuid.NAMESPACE_OID, key))
+
+
+class FileChunkIdCache:
+    """In-process cache of the ids of the chunks of each file, per index table
+
+    Used to scope the retrieval by chunk ids for the stores that cannot filter by
+    `file_id`, without querying the index table on every question. Entries are
+    invalidated when the chunks of the file are added or deleted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunk_ids: dict[tuple[str, str], frozenset[str]] = {}
+        # bumped on invalidation, so a load racing with it doesn't cache stale ids
+        self._versions: dict[tuple[str, str], int] = defaultdict(int)
+
+    def get(self, Index, file_ids: list[str]) -> list[str]:
+        """Return the ids of the chunks of the files"""
+        table = Index.__tablename__
+        with self._lock:
+            cached = {
+                file_id: self._chunk_ids.get((table, file_id)) for file_id in file_ids
+            }
+            versions = {
+                file_id: self._versions[(table, file_id)]
+                for file_id, chunk_ids in cached.items()
+                if chunk_ids is None
+            }
+
+        if versions:
+            loaded: dict[str, set[str]] = {file_id: set() for file_id in versions}
+            with Session(engine) as session:
+                stmt = select(Index.source_id, Index.target_id).where(
+                    Index.relation_type == "document",
+                    Index.source_id.in_(list(versions)),
+                )
+                for source_id, target_id in session.execute(stmt):
+                    loaded[source_id].add(target_id)
+
+            with self._lock:
+                for file_id, chunk_ids in loaded.items():
+                    cached[file_id] = frozenset(chunk_ids)
+                    if self._versions[(table, file_id)] == versions[file_id]:
+                        self._chunk_ids[(table, file_id)] = cached[file_id]
+
+        return [chunk_id for chunk_ids in cached.values() for chunk_id in chunk_ids]
+
+    def invalidate(self, Index, file_id: str):
+        """Forget the chunk ids of the file, after its chunks changed"""
+        key = (Index.__tablename__, file_id)
+        with self._lock:
+            self._chunk_ids.pop(key, None)
+            self._versions[key] += 1
+
+
+file_chunk_ids = FileChunkIdCache()
+
+
+def shared_target_ids(
+    session: Session, Index, source_id: str, target_ids: list[str]
+) -> set[str]:
+    """Return the ids among `target_ids` also indexed for another file
+
+    Files of the same content share their chunks (see `IndexPipeline.dedup_content`),
+    which are only deleted from the stores with the last file using them.
+    """
+    shared: set[str] = set()
+    for start in range(0, len(target_ids), 500):
+        stmt = select(Index.target_id).where(
+            Index.target_id.in_(target_ids[start : start + 500]),
+            Index.source_id != source_id,
+        )
+        shared.update(target_id for (target_id,) in session.execute(stmt))
+    return shared
+
+
+def content_file_ids(Source, file_ids: list[str]) -> list[str]:
+    """Return the file ids tagging the chunks of the files
+
+    A file sharing the chunks of a file with the same content has its id in the
+    `content_of` note, as the `file_id` metadata of the chunks is the other one.
+    """
+    with Session(engine) as session:
+        stmt = select(Source.id, Source.note).where(Source.id.in_(file_ids))
+        content_of = {
+            file_id: (note or {}).get("content_of")
+            for file_id, note in session.execute(stmt)
+        }
+    return list(dict.fromkeys(content_of.get(id_) or id_ for id_ in file_ids))
+
 
 class DocumentRetrievalPipeline(BaseFileIndexRetriever):
     """Retrieve relevant document
@@ -89,6 +240,11 @@ class DocumentRetrievalPipeline(BaseFileIndexRetriever):
             for surrounding tables (e.g. within the page)
         top_k: number of documents to retrieve
         mmr: whether to use mmr to re-rank the documents
+        hybrid_fusion: how to merge vector and full-text results in hybrid mode
+            ("rrf" or "weighted")
+        hybrid_text_weight: weight of the full-text results in hybrid fusion
+        rerank_top_k_mult: if set, only pass the top `top_k * rerank_top_k_mult`
+            documents to the rerankers
     """
 
     embedding: BaseEmbeddings
@@ -99,6 +255,17 @@ class DocumentRetrievalPipeline(BaseFileIndexRetriever):
     mmr: bool = False
     top_k: int = 5
     retrieval_mode: str = "hybrid"
+    hybrid_fusion: str = "rrf"
+    hybrid_text_weight: float = 0.5
+    rerank_top_k_mult: Optional[int] = None
+    scope_by_file_id: bool = Param(
+        True,
+        help=(
+            "Scope the stores with their native filter on the `file_id` metadata. "
+            "Otherwise, scope them by the ids of all the chunks of the selected "
+            "files, for stores that cannot filter by metadata"
+        ),
+    )
 
     @Node.auto(depends_on=["embedding", "VS", "DS"])
     def vector_retrieval(self) -> VectorRetrieval:
@@ -107,6 +274,9 @@ class DocumentRetrievalPipeline(BaseFileIndexRetriever):
             vector_store=self.VS,
             doc_store=self.DS,
             retrieval_mode=self.retrieval_mode,  # type: ignore
+            hybrid_fusion=self.hybrid_fusion,  # type: ignore
+            hybrid_text_weight=self.hybrid_text_weight,  # type: ignore
+            rerank_top_k_mult=self.rerank_top_k_mult,  # type: ignore
             rerankers=self.rerankers,
         )
 
@@ -142,22 +312,19 @@ class DocumentRetrievalPipeline(BaseFileIndexRetriever):
             return []
 
         retrieval_kwargs: dict = {}
-        with Session(engine) as session:
-            stmt = select(self.Index).where(
-                self.Index.relation_type == "document",
-                self.Index.source_id.in_(doc_ids),
-            )
-            results = session.execute(stmt)
-            chunk_ids = [r[0].target_id for r in results.all()]
+        chunk_file_ids = content_file_ids(self.Source, doc_ids)
+        if self.scope_by_file_id:
+            retrieval_kwargs["file_ids"] = chunk_file_ids
+        else:
+            retrieval_kwargs["scope"] = file_chunk_ids.get(self.Index, doc_ids)
 
         # do first round top_k extension
         retrieval_kwargs["do_extend"] = True
-        retrieval_kwargs["scope"] = chunk_ids
         retrieval_kwargs["filters"] = MetadataFilters(
             filters=[
                 MetadataFilter(
                     key="file_id",
-                    value=doc_ids,
+                    value=chunk_file_ids,
                     operator=FilterOperator.IN,
                 )
             ],
@@ -251,6 +418,28 @@ class DocumentRetrievalPipeline(BaseFileIndexRetriever):
                 "choices": ["vector", "text", "hybrid"],
                 "component": "dropdown",
             },
+            "hybrid_fusion": {
+                "name": "Hybrid fusion method",
+                "value": "rrf",
+                "choices": [
+                    ("Reciprocal rank fusion", "rrf"),
+                    ("Weighted score", "weighted"),
+                ],
+                "component": "dropdown",
+            },
+            "hybrid_text_weight": {
+                "name": "Full-text search weight in hybrid fusion (0.0 - 1.0)",
+                "value": 0.5,
+                "component": "number",
+            },
+            "rerank_top_k_mult": {
+                "name": (
+                    "Rerank only the top (number of chunks x this) results "
+                    "(0 to rerank all)"
+                ),
+                "value": 0,
+                "component": "number",
+            },
             "prioritize_table": {
                 "name": "Prioritize table",
                 "value": False,
@@ -297,7 +486,14 @@ class DocumentRetrievalPipeline(BaseFileIndexRetriever):
                 )
             ],
             retrieval_mode=user_settings["retrieval_mode"],
-            llm_scorer=(LLMTrulensScoring() if use_llm_reranking else None),
+            hybrid_fusion=user_settings.get("hybrid_fusion", "rrf"),
+            hybrid_text_weight=user_settings.get("hybrid_text_weight", 0.5),
+            rerank_top_k_mult=int(user_settings.get("rerank_top_k_mult") or 0) or None,
+            llm_scorer=(
+                LLMTrulensScoring(**llm_scoring_settings())
+                if use_llm_reranking
+                else None
+            ),
             rerankers=[
                 reranking_models_manager[
                     index_settings.get(
@@ -311,13 +507,13 @@ class DocumentRetrievalPipeline(BaseFileIndexRetriever):
 
         for reranker in retriever.rerankers:
             if isinstance(reranker, LLMReranking):
-                reranker.llm = llms.get(
-                    user_settings["reranking_llm"], llms.get_default()
+                reranker.llm = llms.cached(
+                    llms.get(user_settings["reranking_llm"], llms.get_default())
                 )
 
         if retriever.llm_scorer:
-            retriever.llm_scorer.llm = llms.get(
-                user_settings["reranking_llm"], llms.get_default()
+            retriever.llm_scorer.llm = llms.cached(
+                llms.get(user_settings["reranking_llm"], llms.get_default())
             )
 
         kwargs = {".doc_ids": selected}
@@ -340,6 +536,7 @@ class IndexPipeline(BaseComponent):
     user_id = Param(help="The user id")
     collection_name: str = "default"
     private: bool = False
+    dedup_content: bool = False
     run_embedding_in_thread: bool = False
     embedding: BaseEmbeddings
 
@@ -349,8 +546,23 @@ class IndexPipeline(BaseComponent):
             vector_store=self.VS, doc_store=self.DS, embedding=self.embedding
         )
 
-    def handle_docs(self, docs, file_id, file_name) -> Generator[Document, None, int]:
-        s_time = time.time()
+    def resolve_vector_indexing(self):
+        """Resolve `vector_indexing` once, before using the pipeline from several
+        threads
+
+        theflow tracks the evaluation of the auto nodes in a per-object set that
+        isn't thread-safe, so the concurrent stages of `stream_pipelined` must not
+        evaluate the node. They use the one resolved here instead.
+        """
+        self._resolved_vector_indexing = self.vector_indexing
+
+    def get_vector_indexing(self) -> VectorIndexing:
+        """The resolved `vector_indexing` if any, else evaluate the node"""
+        resolved = getattr(self, "_resolved_vector_indexing", None)
+        return resolved if resolved is not None else self.vector_indexing
+
+    def prepare_chunks(self, docs: list[Document]) -> list[Document]:
+        """Split the text documents and return all the documents to index"""
         text_docs = []
         non_text_docs = []
         thumbnail_docs = []
@@ -365,6 +577,7 @@ class IndexPipeline(BaseComponent):
                 non_text_docs.append(doc)
 
         print(f"Got {len(thumbnail_docs)} page thumbnails")
+        assign_chunk_ids(thumbnail_docs)
         page_label_to_thumbnail = {
             doc.metadata["page_label"]: doc.doc_id for doc in thumbnail_docs
         }
@@ -380,14 +593,94 @@ class IndexPipeline(BaseComponent):
             if page_label and page_label in page_label_to_thumbnail:
                 chunk.metadata["thumbnail_doc_id"] = page_label_to_thumbnail[page_label]
 
-        to_index_chunks = all_chunks + non_text_docs + thumbnail_docs
+        assign_chunk_ids(all_chunks + non_text_docs)
+        return all_chunks + non_text_docs + thumbnail_docs
+
+    def diff_chunks(
+        self, file_id: str, chunks: list[Document], reindex: bool = False
+    ) -> tuple[list[Document], list[Document]]:
+        """Compare the chunks with the ones already indexed for the file
+
+        The unchanged chunks have the same ids (see `assign_chunk_ids`), so they
+        keep their records in the doc store and vector store. The records of the
+        chunks that are gone are deleted in one batch.
+
+        An interrupted indexing of the file can leave records of the chunks to
+        write, not recorded in the index table. The doc store overwrites them,
+        and with `reindex` they are deleted from the vector store.
+
+        Returns:
+            the chunks to add to the doc store, and the ones to add to the vector
+            store
+        """
+        chunk_ids = {chunk.doc_id for chunk in chunks}
+        with Session(engine) as session:
+            doc_ids = session.execute(
+                select(self.Index.target_id).where(
+                    self.Index.source_id == file_id,
+                    self.Index.relation_type == "document",
+                )
+            ).all()
+        if {doc_id for (doc_id,) in doc_ids} != chunk_ids:
+            # the files sharing the chunks must not see the new ones
+            self.copy_shared_chunks(file_id)
+
+        kept: dict[str, set[str]] = {"document": set(), "vector": set()}
+        stale: dict[str, list[str]] = {"document": [], "vector": []}
+        with Session(engine) as session:
+            index = session.execute(
+                select(self.Index).where(self.Index.source_id == file_id)
+            ).all()
+            for (each,) in index:
+                if each.relation_type in kept and each.target_id in chunk_ids:
+                    kept[each.relation_type].add(each.target_id)
+                    continue
+                if each.relation_type in stale:
+                    stale[each.relation_type].append(each.target_id)
+                session.delete(each)
+
+            for relation_type, target_ids in stale.items():
+                shared = shared_target_ids(session, self.Index, file_id, target_ids)
+                stale[relation_type] = [
+                    target_id for target_id in target_ids if target_id not in shared
+                ]
+            session.commit()
+
+        if index:
+            file_chunk_ids.invalidate(self.Index, file_id)
+        if stale["vector"] and self.VS:
+            self.VS.delete(stale["vector"])
+        if stale["document"]:
+            self.DS.delete(stale["document"])
+
+        vs_chunks = [chunk for chunk in chunks if chunk.doc_id not in kept["vector"]]
+        if reindex and vs_chunks and self.VS:
+            self.VS.delete([chunk.doc_id for chunk in vs_chunks])
+
+        return (
+            [chunk for chunk in chunks if chunk.doc_id not in kept["document"]],
+            vs_chunks,
+        )
+
+    def handle_docs(
+        self, docs, file_id, file_name, reindex: bool = False
+    ) -> Generator[Document, None, int]:
+        s_time = time.time()
+        to_index_chunks = self.prepare_chunks(docs)
+        ds_chunks, vs_chunks = self.diff_chunks(file_id, to_index_chunks, reindex)
+        n_unchanged = len(to_index_chunks) - len(ds_chunks)
+        if n_unchanged:
+            yield Document(
+                f" => [{file_name}] Kept {n_unchanged} unchanged chunks",
+                channel="debug",
+            )
 
         # add to doc store
         chunks = []
         n_chunks = 0
         chunk_size = self.chunk_batch_size * 4
-        for start_idx in range(0, len(to_index_chunks), chunk_size):
-            chunks = to_index_chunks[start_idx : start_idx + chunk_size]
+        for start_idx in range(0, len(ds_chunks), chunk_size):
+            chunks = ds_chunks[start_idx : start_idx + chunk_size]
             self.handle_chunks_docstore(chunks, file_id)
             n_chunks += len(chunks)
             yield Document(
@@ -399,8 +692,8 @@ class IndexPipeline(BaseComponent):
             chunks = []
             n_chunks = 0
             chunk_size = self.chunk_batch_size
-            for start_idx in range(0, len(to_index_chunks), chunk_size):
-                chunks = to_index_chunks[start_idx : start_idx + chunk_size]
+            for start_idx in range(0, len(vs_chunks), chunk_size):
+                chunks = vs_chunks[start_idx : start_idx + chunk_size]
                 self.handle_chunks_vectorstore(chunks, file_id)
                 n_chunks += len(chunks)
                 if self.VS:
@@ -424,7 +717,8 @@ class IndexPipeline(BaseComponent):
     def handle_chunks_docstore(self, chunks, file_id):
         """Run chunks"""
         # run embedding, add to both vector store and doc store
-        self.vector_indexing.add_to_docstore(chunks)
+        # (the chunk ids are derived from their content, see `diff_chunks`)
+        self.get_vector_indexing().add_to_docstore(chunks, exist_ok=True)
 
         # record in the index
         with Session(engine) as session:
@@ -439,12 +733,20 @@ class IndexPipeline(BaseComponent):
                 )
             session.add_all(nodes)
             session.commit()
+        file_chunk_ids.invalidate(self.Index, file_id)
+
+    def embed_chunks(self, chunks) -> Optional[list]:
+        """Compute the embeddings of the chunks, if there is a vector store"""
+        if not self.VS:
+            return None
+        return self.get_vector_indexing().embedding(chunks)
 
-    def handle_chunks_vectorstore(self, chunks, file_id):
+    def handle_chunks_vectorstore(self, chunks, file_id, embeddings=None):
         """Run chunks"""
-        # run embedding, add to both vector store and doc store
-        self.vector_indexing.add_to_vectorstore(chunks)
-        self.vector_indexing.write_chunk_to_file(chunks)
+        # run embedding (unless already computed), add to the vector store
+        vector_indexing = self.get_vector_indexing()
+        vector_indexing.add_to_vectorstore(chunks, embeddings=embeddings)
+        vector_indexing.write_chunk_to_file(chunks)
 
         if self.VS:
             # record in the index
@@ -510,32 +812,208 @@ class IndexPipeline(BaseComponent):
 
         return file_id
 
-    def store_file(self, file_path: Path) -> str:
+    def store_file(self, file_path: Path, file_id: Optional[str] = None) -> str:
         """Store file into the database and storage, return the file id
 
         Args:
             file_path: the path to the file
+            file_id: if given, update the record of this file instead of creating
+                a new one
 
         Returns:
             the file id
         """
-        with file_path.open("rb") as fi:
-            file_hash = sha256(fi.read()).hexdigest()
+        file_hash = file_sha256(file_path)
+        # the stored files are named by their content, so an existing one is the
+        # same file, e.g. uploaded under another name
+        if not (self.FSPath / file_hash).exists():
+            shutil.copy(file_path, self.FSPath / file_hash)
 
-        shutil.copy(file_path, self.FSPath / file_hash)
-        source = self.Source(
-            name=file_path.name,
-            path=file_hash,
-            size=file_path.stat().st_size,
-            user=self.user_id,  # type: ignore
-        )
         with Session(engine) as session:
+            source = None
+            if file_id is not None:
+                source = session.get(self.Source, file_id)
+
+            if source is None:
+                source = self.Source(
+                    name=file_path.name,
+                    path=file_hash,
+                    size=file_path.stat().st_size,
+                    user=self.user_id,  # type: ignore
+                )
+            else:
+                source.path = file_hash
+                source.size = file_path.stat().st_size
+                # the file gets its own chunks, unless it is linked again
+                source.note = {
+                    key: value
+                    for key, value in (source.note or {}).items()
+                    if key != "content_of"
+                }
             session.add(source)
             session.commit()
             file_id = source.id
 
         return file_id
 
+    def link_same_content(self, file_id: str) -> Optional[str]:
+        """Share the chunks of an indexed file with the same content, if any
+
+        Only with `dedup_content`: the file is indexed with the chunk and vector
+        records of the other file (of any user of the index), instead of parsing
+        and embedding it again. The chunks keep the `file_id` of the other file,
+        recorded in the `content_of` note of this file for the retrieval.
+
+        Returns:
+            the file id of the shared chunks, None if no file has the same content
+        """
+        if not self.dedup_content:
+            return None
+
+        with Session(engine) as session:
+            source = session.get(self.Source, file_id)
+            if source is None:
+                return None
+            others = session.execute(
+                select(self.Source).where(
+                    self.Source.path == source.path, self.Source.id != file_id
+                )
+            ).all()
+            for (other,) in others:
+                # skip the files still being indexed, `finish` notes the loader,
+                # and the ones sharing the chunks of this file
+                note = other.note or {}
+                if not note.get("loader") or note.get("content_of") == file_id:
+                    continue
+                targets = session.execute(
+                    select(self.Index.target_id, self.Index.relation_type).where(
+                        self.Index.source_id == other.id,
+                        self.Index.relation_type.in_(["document", "vector"]),
+                    )
+                ).all()
+                if targets:
+                    break
+            else:
+                return None
+            content_of = (other.note or {}).get("content_of") or other.id
+
+        # release the chunks of a previous indexing of the file
+        self.diff_chunks(file_id, [])
+        with Session(engine) as session:
+            source = session.get(self.Source, file_id)
+            source.note = {**(source.note or {}), "content_of": content_of}
+            session.add(source)
+            session.add_all(
+                [
+                    self.Index(
+                        source_id=file_id,
+                        target_id=target_id,
+                        relation_type=relation_type,
+                    )
+                    for target_id, relation_type in targets
+                ]
+            )
+            session.commit()
+        file_chunk_ids.invalidate(self.Index, file_id)
+
+        return content_of
+
+    def copy_shared_chunks(self, file_id: str):
+        """Give the files sharing the chunks of the file their own copy of them
+
+        The shared chunks are tagged with the `file_id` of the file, so they must
+        be copied before its chunks change. The first of these files gets a copy
+        of the chunks, embedded again, and the other ones share that copy.
+        """
+        with Session(engine) as session:
+            linked = [
+                source
+                for (source,) in session.execute(
+                    select(self.Source).where(
+                        self.Source.note["content_of"].as_string() == file_id
+                    )
+                )
+            ]
+            if not linked:
+                return
+            owner_id, owner_name = linked[0].id, linked[0].name
+            targets = session.execute(
+                select(self.Index.target_id, self.Index.relation_type).where(
+                    self.Index.source_id == owner_id
+                )
+            ).all()
+
+        docs = self.DS.get(
+            [target_id for target_id, kind in targets if kind == "document"]
+        )
+        vector_ids = {target_id for target_id, kind in targets if kind == "vector"}
+        copies = {
+            doc.doc_id: Document(
+                text=doc.text,
+                metadata={**doc.metadata, "file_id": owner_id, "file_name": owner_name},
+            )
+            for doc in docs
+        }
+        # as in `prepare_chunks`, the chunks refer to the ids of the thumbnails
+        thumbnails = {
+            doc_id: copy
+            for doc_id, copy in copies.items()
+            if copy.metadata.get("type") == "thumbnail"
+        }
+        assign_chunk_ids(list(thumbnails.values()))
+        chunks = [copy for doc_id, copy in copies.items() if doc_id not in thumbnails]
+        for chunk in chunks:
+            thumbnail = thumbnails.get(chunk.metadata.get("thumbnail_doc_id"))
+            if thumbnail is not None:
+                chunk.metadata["thumbnail_doc_id"] = thumbnail.doc_id
+        assign_chunk_ids(chunks)
+
+        with Session(engine) as session:
+            session.execute(
+                delete(self.Index).where(
+                    self.Index.source_id.in_([source.id for source in linked]),
+                    self.Index.relation_type.in_(["document", "vector"]),
+                )
+            )
+            session.commit()
+
+        self.handle_chunks_docstore(list(copies.values()), owner_id)
+        vs_chunks = [copy for doc_id, copy in copies.items() if doc_id in vector_ids]
+        for start_idx in range(0, len(vs_chunks), self.chunk_batch_size):
+            self.handle_chunks_vectorstore(
+                vs_chunks[start_idx : start_idx + self.chunk_batch_size], owner_id
+            )
+
+        with Session(engine) as session:
+            new_targets = session.execute(
+                select(self.Index.target_id, self.Index.relation_type).where(
+                    self.Index.source_id == owner_id
+                )
+            ).all()
+            for source in linked:
+                source = session.get(self.Source, source.id)
+                note = dict(source.note or {})
+                if source.id == owner_id:
+                    note.pop("content_of", None)
+                else:
+                    note["content_of"] = owner_id
+                    session.add_all(
+                        [
+                            self.Index(
+                                source_id=source.id,
+                                target_id=target_id,
+                                relation_type=relation_type,
+                            )
+                            for target_id, relation_type in new_targets
+                        ]
+                    )
+                source.note = note
+                session.add(source)
+            session.commit()
+
+        for source in linked:
+            file_chunk_ids.invalidate(self.Index, source.id)
+
     def finish(self, file_id: str, file_path: str | Path) -> str:
         """Finish the indexing"""
         with Session(engine) as session:
@@ -587,7 +1065,12 @@ class IndexPipeline(BaseComponent):
                 elif each[0].relation_type == "document":
                     ds_ids.append(each[0].target_id)
                 session.delete(each[0])
+            # keep the chunks shared with the files of the same content
+            shared = shared_target_ids(session, self.Index, file_id, vs_ids + ds_ids)
+            vs_ids = [id_ for id_ in vs_ids if id_ not in shared]
+            ds_ids = [id_ for id_ in ds_ids if id_ not in shared]
             session.commit()
+        file_chunk_ids.invalidate(self.Index, file_id)
 
         if vs_ids and self.VS:
             self.VS.delete(vs_ids)
@@ -599,9 +1082,14 @@ class IndexPipeline(BaseComponent):
     ) -> tuple[str, list[Document]]:
         raise NotImplementedError
 
-    def stream(
-        self, file_path: str | Path, reindex: bool, **kwargs
-    ) -> Generator[Document, None, tuple[str, list[Document]]]:
+    def register_file(
+        self, file_path: str | Path, reindex: bool
+    ) -> Generator[Document, None, str]:
+        """Record the file (or URL) in the database, and return its file id
+
+        If the file is already indexed and `reindex` is True, it keeps its file id
+        and its chunks are compared with the new ones in `diff_chunks`.
+        """
         # check if the file is already indexed
         if isinstance(file_path, Path):
             file_path = file_path.resolve()
@@ -616,12 +1104,11 @@ class IndexPipeline(BaseComponent):
                         "reindex=True to force reindexing."
                     )
                 else:
-                    # remove the existing records
+                    # the unchanged chunks are kept, the others replaced later
                     yield Document(
-                        f" => Removing old {file_path.name}", channel="debug"
+                        f" => Updating old {file_path.name}", channel="debug"
                     )
-                    self.delete_file(file_id)
-                    file_id = self.store_file(file_path)
+                    self.store_file(file_path, file_id=file_id)
             else:
                 # add record to db
                 file_id = self.store_file(file_path)
@@ -632,21 +1119,88 @@ class IndexPipeline(BaseComponent):
                 # add record to db
                 file_id = self.store_url(file_path)
 
-        # extract the file
+        return file_id
+
+    def file_metadata(self, file_path: str | Path) -> dict:
+        """The metadata added to the documents of the file (or URL)"""
         if isinstance(file_path, Path):
-            extra_info = default_file_metadata_func(str(file_path))
-            file_name = file_path.name
+            extra_info = default_file_metadata_func(str(file_path.resolve()))
         else:
             extra_info = {"file_name": file_path}
+        extra_info["collection_name"] = self.collection_name
+        return extra_info
+
+    def prefetch_file(
+        self, file_path: str | Path, parse_pool: ProcessPoolLoader
+    ) -> Optional[list[Future]]:
+        """Start parsing the file in the worker processes, before indexing it
+
+        The file id is not known yet, `load_file` sets it on the documents. Return
+        None if the file cannot be parsed in the worker processes (URLs, loaders
+        that cannot be pickled), `load_file` then loads it as usual.
+        """
+        if not isinstance(file_path, Path) or not parse_pool.is_picklable(self.loader):
+            return None
+        return parse_pool.submit(
+            self.loader, file_path.resolve(), self.file_metadata(file_path)
+        )
+
+    def load_file(
+        self,
+        file_path: str | Path,
+        file_id: str,
+        parse_pool: Optional[ProcessPoolLoader] = None,
+        prefetched: Optional[list[Future]] = None,
+    ) -> Generator[Document, None, list[Document]]:
+        """Extract the documents from the file (or URL)
+
+        Args:
+            parse_pool: if given, parse the file in its worker processes
+            prefetched: the parsing tasks from `prefetch_file`, if any
+        """
+        if isinstance(file_path, Path):
+            file_path = file_path.resolve()
+            file_name = file_path.name
+        else:
             file_name = file_path
 
+        extra_info = self.file_metadata(file_path)
         extra_info["file_id"] = file_id
-        extra_info["collection_name"] = self.collection_name
 
         yield Document(f" => Converting {file_name} to text", channel="debug")
-        docs = self.loader.load_data(file_path, extra_info=extra_info)
+        if parse_pool is not None and prefetched is not None:
+            docs = parse_pool.collect(prefetched)
+            for doc in docs:
+                doc.metadata["file_id"] = file_id
+        elif parse_pool is not None:
+            docs = parse_pool.load_data(self.loader, file_path, extra_info)
+        else:
+            docs = self.loader.load_data(file_path, extra_info=extra_info)
         yield Document(f" => Converted {file_name} to text", channel="debug")
-        yield from self.handle_docs(docs, file_id, file_name)
+        return docs
+
+    def stream(
+        self, file_path: str | Path, reindex: bool, **kwargs
+    ) -> Generator[Document, None, tuple[str, list[Document]]]:
+        file_id = yield from self.register_file(file_path, reindex)
+        file_name = file_path.name if isinstance(file_path, Path) else file_path
+        docs: list[Document] = []
+        prefetched = kwargs.get("prefetched")
+        if self.link_same_content(file_id):
+            for future in prefetched or []:
+                future.cancel()
+            yield Document(
+                f" => Reused the chunks of the same content for {file_name}",
+                channel="debug",
+            )
+        else:
+            docs = yield from self.load_file(
+                file_path,
+                file_id,
+                parse_pool=kwargs.get("parse_pool"),
+                prefetched=prefetched,
+            )
+            yield from self.handle_docs(docs, file_id, file_name, reindex)
 
         self.finish(file_id, file_path)
 
@@ -669,6 +1223,49 @@ class IndexDocumentPipeline(BaseFileIndexIndexing):
     reader_mode: str = Param("default", help="The reader mode")
     embedding: BaseEmbeddings
     run_embedding_in_thread: bool = False
+    pipelined: bool = Param(
+        getattr(settings, "FILE_INDEX_PIPELINE_PIPELINED", False),
+        help=(
+            "Overlap the loading, embedding and storing of the files, instead of "
+            "indexing them one after the other"
+        ),
+    )
+    load_workers: int = Param(
+        stage_workers_settings().get("load", 1),
+        help="Number of files loaded and split concurrently",
+    )
+    embed_workers: int = Param(
+        stage_workers_settings().get("embed", 1),
+        help="Number of chunk batches embedded concurrently",
+    )
+    write_workers: int = Param(
+        stage_workers_settings().get("write", 1),
+        help="Number of chunk batches written to the stores concurrently",
+    )
+    stage_queue_size: int = Param(
+        4, help="Maximum number of pending inputs of each stage (back-pressure)"
+    )
+    parse_processes: int = Param(
+        parse_processes_settings()[0],
+        help=(
+            "Number of worker processes parsing the files, 0 to parse them in the "
+            "indexing threads"
+        ),
+    )
+    pdf_pages_per_task: int = Param(
+        parse_processes_settings()[1],
+        help=(
+            "Split PDFs into parsing tasks of this many pages when parsing in worker "
+            "processes, 0 to parse each PDF in one task"
+        ),
+    )
+    dedup_content: bool = Param(
+        getattr(settings, "FILE_INDEX_PIPELINE_DEDUP_CONTENT", False),
+        help=(
+            "Reuse the chunks of an indexed file with the same content (under "
+            "another name or of another user), instead of parsing and embedding it"
+        ),
+    )
 
     @Param.auto(depends_on="reader_mode")
     def readers(self):
@@ -768,6 +1365,7 @@ class IndexDocumentPipeline(BaseFileIndexIndexing):
             FSPath=self.FSPath,
             user_id=self.user_id,
             private=self.private,
+            dedup_content=self.dedup_content,
             embedding=self.embedding,
         )
 
@@ -787,51 +1385,322 @@ class IndexDocumentPipeline(BaseFileIndexIndexing):
         if not isinstance(file_paths, list):
             file_paths = [file_paths]
 
+        parse_pool = self.make_parse_pool()
+        # the docstore search index is updated once, after all the files
+        with self.DS.deferred_indices():
+            try:
+                # quick index mode embeds in the background after each file is stored
+                if self.pipelined and not self.run_embedding_in_thread:
+                    return (
+                        yield from self.stream_pipelined(
+                            file_paths, reindex, parse_pool=parse_pool, **kwargs
+                        )
+                    )
+                return (
+                    yield from self.stream_sequential(
+                        file_paths, reindex, parse_pool=parse_pool, **kwargs
+                    )
+                )
+            finally:
+                if parse_pool is not None:
+                    parse_pool.shutdown(wait=False)
+
+    def make_parse_pool(self) -> Optional[ProcessPoolLoader]:
+        """Create the pool of parsing processes, if enabled"""
+        if self.parse_processes <= 0:
+            return None
+        return ProcessPoolLoader(
+            max_workers=self.parse_processes,
+            pdf_pages_per_task=self.pdf_pages_per_task,
+        )
+
+    def stream_sequential(
+        self,
+        file_paths: list[str | Path],
+        reindex: bool = False,
+        parse_pool: Optional[ProcessPoolLoader] = None,
+        **kwargs,
+    ) -> Generator[
+        Document, None, tuple[list[str | None], list[str | None], list[Document]]
+    ]:
+        """Index the files one after the other
+
+        With a `parse_pool`, the next files are parsed in its worker processes
+        while the current file is indexed.
+        """
         file_ids: list[str | None] = []
         errors: list[str | None] = []
         all_docs = []
 
+        file_paths = [
+            file_path if self.is_url(file_path) else Path(file_path)
+            for file_path in file_paths
+        ]
+        # the pipeline and the parsing tasks of the files submitted ahead
+        prefetched: dict[int, tuple[IndexPipeline, Optional[list[Future]]]] = {}
+        n_prefetched = 0
+        window = parse_pool.max_workers if parse_pool is not None else 0
+
         n_files = len(file_paths)
         for idx, file_path in enumerate(file_paths):
-            if self.is_url(file_path):
-                file_name = file_path
-            else:
-                file_path = Path(file_path)
-                file_name = file_path.name
+            file_name = file_path if self.is_url(file_path) else file_path.name
+
+            while parse_pool is not None and n_prefetched < min(
+                idx + 1 + window, n_files
+            ):
+                try:
+                    pipeline = self.route(file_paths[n_prefetched])
+                    prefetched[n_prefetched] = (
+                        pipeline,
+                        pipeline.prefetch_file(file_paths[n_prefetched], parse_pool),
+                    )
+                except Exception:
+                    # the error is reported when indexing the file
+                    pass
+                n_prefetched += 1
 
             yield Document(
                 content=f"Indexing [{idx + 1}/{n_files}]: {file_name}",
                 channel="debug",
             )
 
+            pipeline, futures = prefetched.pop(idx, (None, None))
             try:
-                pipeline = self.route(file_path)
+                pipeline = pipeline or self.route(file_path)
                 file_id, docs = yield from pipeline.stream(
-                    file_path, reindex=reindex, **kwargs
+                    file_path,
+                    reindex=reindex,
+                    parse_pool=parse_pool,
+                    prefetched=futures,
+                    **kwargs,
                 )
                 all_docs.extend(docs)
                 file_ids.append(file_id)
                 errors.append(None)
-                yield Document(
-                    content={
-                        "file_path": file_path,
-                        "file_name": file_name,
-                        "status": "success",
-                    },
-                    channel="index",
-                )
+                yield self.index_status_doc(file_path, file_name)
             except Exception as e:
+                for future in futures or []:
+                    future.cancel()
                 logger.exception(e)
                 file_ids.append(None)
                 errors.append(str(e))
+                yield self.index_status_doc(file_path, file_name, error=e)
+
+        return file_ids, errors, all_docs
+
+    def index_status_doc(
+        self, file_path: str | Path, file_name: str, error: Optional[Exception] = None
+    ) -> Document:
+        """The Document reporting the indexing status of a file"""
+        if error is None:
+            return Document(
+                content={
+                    "file_path": file_path,
+                    "file_name": file_name,
+                    "status": "success",
+                },
+                channel="index",
+            )
+        return Document(
+            content={
+                "file_path": file_path,
+                "file_name": file_name,
+                "status": "failed",
+                "message": str(error),
+            },
+            channel="index",
+        )
+
+    def stream_pipelined(
+        self,
+        file_paths: list[str | Path],
+        reindex: bool = False,
+        parse_pool: Optional[ProcessPoolLoader] = None,
+        **kwargs,
+    ) -> Generator[
+        Document, None, tuple[list[str | None], list[str | None], list[Document]]
+    ]:
+        """Index the files with overlapping stages
+
+        The files go through 3 stages connected by bounded queues, each with its
+        own workers:
+            - load: record the file, convert it to documents and split it into
+              batches of chunks
+            - embed: compute the embeddings of the chunk batches
+            - write: store the chunk batches in the doc store and vector store
+
+        So the next files are loaded while the previous ones are embedded and
+        stored. The vector batches of a file are written after its document
+        batches, as some doc stores overwrite the records shared with the vector
+        store (e.g. Elasticsearch). The progress Documents are the same as the
+        sequential indexing. With a `parse_pool`, there are enough load workers to
+        keep all its processes busy.
+        """
+        n_files = len(file_paths)
+        file_ids: list[str | None] = [None] * n_files
+        errors: list[str | None] = [None] * n_files
+        docs_by_file: dict[int, list[Document]] = {}
+
+        # route in the main thread, the readers are resolved lazily
+        tasks: list[dict] = []
+        for idx, file_path in enumerate(file_paths):
+            if self.is_url(file_path):
+                task = {"file_path": file_path, "file_name": file_path}
+            else:
+                file_path = Path(file_path)
+                task = {"file_path": file_path, "file_name": file_path.name}
+            tasks.append(task)
+
+            try:
+                task["pipeline"] = self.route(file_path)
+                # the stages share the pipeline of the file across threads
+                task["pipeline"].resolve_vector_indexing()
+            except Exception as e:
+                logger.exception(e)
+                errors[idx] = str(e)
+                yield self.index_status_doc(file_path, task["file_name"], error=e)
+
+        def load(idx: int):
+            task = tasks[idx]
+            file_path, file_name = task["file_path"], task["file_name"]
+            yield Document(
+                content=f"Indexing [{idx + 1}/{n_files}]: {file_name}",
+                channel="debug",
+            )
+
+            pipeline = task["pipeline"]
+            file_id = task["file_id"] = yield from pipeline.register_file(
+                file_path, reindex
+            )
+            if pipeline.link_same_content(file_id):
+                task["docs"] = []
+                yield Document(
+                    f" => Reused the chunks of the same content for {file_name}",
+                    channel="debug",
+                )
+                return
+
+            docs = task["docs"] = yield from pipeline.load_file(
+                file_path, file_id, parse_pool=parse_pool
+            )
+            chunks = pipeline.prepare_chunks(docs)
+            ds_chunks, vs_chunks = pipeline.diff_chunks(file_id, chunks, reindex)
+            if len(ds_chunks) < len(chunks):
+                yield Document(
+                    f" => [{file_name}] Kept {len(chunks) - len(ds_chunks)} "
+                    "unchanged chunks",
+                    channel="debug",
+                )
+
+            batch_size = pipeline.chunk_batch_size * 4
+            task["document_batches"] = -(-len(ds_chunks) // batch_size)
+            task["waiting_vector_batches"] = []
+            for start_idx in range(0, len(ds_chunks), batch_size):
+                end_idx = min(start_idx + batch_size, len(ds_chunks))
+                yield StageOutput(
+                    ("document", idx, ds_chunks[start_idx:end_idx], end_idx, None)
+                )
+
+            batch_size = pipeline.chunk_batch_size
+            for start_idx in range(0, len(vs_chunks), batch_size):
+                end_idx = min(start_idx + batch_size, len(vs_chunks))
+                yield StageOutput(
+                    ("vector", idx, vs_chunks[start_idx:end_idx], end_idx, None)
+                )
+
+        def embed(batch: tuple):
+            kind, idx, chunks, n_chunks, _ = batch
+            if kind == "vector":
+                embeddings = tasks[idx]["pipeline"].embed_chunks(chunks)
+                batch = (kind, idx, chunks, n_chunks, embeddings)
+            yield StageOutput(batch)
+
+        write_order_lock = threading.Lock()
+
+        def write_vectors(batch: tuple):
+            _, idx, chunks, n_chunks, embeddings = batch
+            task = tasks[idx]
+            pipeline, file_name = task["pipeline"], task["file_name"]
+            pipeline.handle_chunks_vectorstore(
+                chunks, task["file_id"], embeddings=embeddings
+            )
+            if pipeline.VS:
                 yield Document(
-                    content={
-                        "file_path": file_path,
-                        "file_name": file_name,
-                        "status": "failed",
-                        "message": str(e),
-                    },
-                    channel="index",
+                    f" => [{file_name}] Created embedding for {n_chunks} chunks",
+                    channel="debug",
+                )
+
+        def write(batch: tuple):
+            kind, idx, chunks, n_chunks, _ = batch
+            task = tasks[idx]
+            if kind == "vector":
+                with write_order_lock:
+                    if task["document_batches"]:
+                        # written with the last document batch of the file
+                        task["waiting_vector_batches"].append(batch)
+                        return
+                yield from write_vectors(batch)
+                return
+
+            task["pipeline"].handle_chunks_docstore(chunks, task["file_id"])
+            yield Document(
+                f" => [{task['file_name']}] Processed {n_chunks} chunks",
+                channel="debug",
+            )
+            with write_order_lock:
+                task["document_batches"] -= 1
+                waiting = []
+                if not task["document_batches"]:
+                    waiting = task["waiting_vector_batches"]
+                    task["waiting_vector_batches"] = []
+            for vector_batch in waiting:
+                yield from write_vectors(vector_batch)
+
+        queue_size = self.stage_queue_size
+        load_workers = self.load_workers
+        if parse_pool is not None:
+            load_workers = max(load_workers, parse_pool.max_workers)
+        staged = StagedPipeline(
+            [
+                Stage("load", load, workers=load_workers, queue_size=queue_size),
+                Stage(
+                    "embed", embed, workers=self.embed_workers, queue_size=queue_size
+                ),
+                Stage(
+                    "write", write, workers=self.write_workers, queue_size=queue_size
+                ),
+            ]
+        )
+
+        items = [(idx, idx) for idx, task in enumerate(tasks) if "pipeline" in task]
+        for event in staged.stream(items):
+            if event.kind == "progress":
+                yield event.value
+                continue
+
+            if event.key is None:
+                raise event.value
+
+            task = tasks[event.key]
+            if event.kind == "done":
+                try:
+                    task["pipeline"].finish(task["file_id"], task["file_path"])
+                except Exception as e:
+                    event.kind, event.value = "error", e
+                else:
+                    file_ids[event.key] = task["file_id"]
+                    docs_by_file[event.key] = task["docs"]
+                    yield Document(
+                        f" => Finished indexing {task['file_name']}", channel="debug"
+                    )
+                    yield self.index_status_doc(task["file_path"], task["file_name"])
+
+            if event.kind == "error":
+                logger.error(event.value, exc_info=event.value)
+                errors[event.key] = str(event.value)
+                yield self.index_status_doc(
+                    task["file_path"], task["file_name"], error=event.value
                 )
 
+        all_docs = [doc for idx in sorted(docs_by_file) for doc in docs_by_file[idx]]
         return file_ids, errors, all_docs
@@ -21,6 +21,7 @@ from theflow.settings import settings as flowsettings
 
 from ...utils.commands import WEB_SEARCH_COMMAND
 from ...utils.rate_limit import check_rate_limit
+from .pipelines import file_chunk_ids, shared_target_ids
 from .utils import download_arxiv_pdf, is_arxiv_url
 
 KH_DEMO_MODE = getattr(flowsettings, "KH_DEMO_MODE", False)
@@ -468,7 +469,14 @@ class FileIndexPage(BasePage):
                 elif each[0].relation_type == "document":
                     ds_ids.append(each[0].target_id)
                 session.delete(each[0])
+            # keep the chunks shared with the files of the same content
+            shared = shared_target_ids(
+                session, self._index._resources["Index"], file_id, vs_ids + ds_ids
+            )
+            vs_ids = [id_ for id_ in vs_ids if id_ not in shared]
+            ds_ids = [id_ for id_ in ds_ids if id_ not in shared]
             session.commit()
+        file_chunk_ids.invalidate(self._index._resources["Index"], file_id)
 
         if vs_ids:
             self._index._vs.delete(vs_ids)
@@ -567,8 +575,9 @@ class FileIndexPage(BasePage):
         return gr.DownloadButton(label=DOWNLOAD_MESSAGE, value=f"{zip_file_path}.zip")
 
     def delete_all_files(self, file_list):
-        for file_id in file_list.id.values:
-            self.delete_event(file_id)
+        with self._index._docstore.deferred_indices():
+            for file_id in file_list.id.values:
+                self.delete_event(file_id)
 
     def set_file_id_selector(self, selected_file_id):
         return [selected_file_id, "select", gr.Tabs(selected="chat-tab")]
@@ -1,4 +1,5 @@
 import os
+from hashlib import sha256
 
 import requests
 
@@ -17,6 +18,16 @@ def clean_name(name):
     return name
 
 
+def file_sha256(file_path, block_size: int = 1 << 20) -> str:
+    """Return the sha256 hex digest of the file, read block by block so large
+    files are not loaded in memory"""
+    digest = sha256()
+    with open(file_path, "rb") as fi:
+        for block in iter(lambda: fi.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def is_arxiv_url(url):
     return any(url.startswith(pattern) for pattern in ARXIV_URL_PATTERNS)
 
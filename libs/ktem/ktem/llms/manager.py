@@ -154,6 +154,45 @@ class LLMManager:
         """
         return self._models[self.get_default_name()]
 
+    def cached(self, llm: ChatLLM, semantic: bool = False) -> ChatLLM:
+        """Wrap the model with the persistent response cache, if configured
+
+        Only meant for the calls whose response is a function of the request,
+        e.g. the suggestions, citations and relevance scores, not the answers.
+
+        Args:
+            llm: the model to wrap
+            semantic: also reuse the responses of similar queries, with the
+                default embedding model, if a similarity threshold is configured
+        """
+        cache = getattr(flowsettings, "KH_LLM_CACHE", None)
+        if not cache or not cache.get("path"):
+            return llm
+
+        from kotaemon.llms import CachedChatLLM
+
+        if isinstance(llm, CachedChatLLM):
+            return llm
+
+        embedding = None
+        threshold = cache.get("similarity_threshold")
+        if semantic and threshold:
+            from ktem.embeddings.manager import embedding_models_manager
+
+            try:
+                embedding = embedding_models_manager.get_default()
+            except ValueError:
+                pass
+
+        return CachedChatLLM(
+            llm=llm,
+            cache_path=cache["path"],
+            ttl=cache.get("ttl"),
+            max_entries=cache.get("max_entries"),
+            embedding=embedding,
+            similarity_threshold=threshold or 1.0,
+        )
+
     def info(self) -> dict:
         """List all models"""
         return self._info
@@ -1,6 +1,7 @@
 """Manager for MCP server configurations.
 
-Provides CRUD operations on the MCPTable.
+Provides CRUD operations on the MCPTable, and owns the persistent sessions
+to the configured servers.
 All tool building/discovery logic lives in kotaemon.agents.tools.mcp.
 """
 
@@ -8,6 +9,9 @@ import logging
 
 from sqlalchemy import select
 from sqlalchemy.orm import Session
+from theflow.settings import settings as flowsettings
+
+from kotaemon.agents.tools.mcp import MCPSessionPool, create_tools_from_config
 
 from .db import MCPTable, engine
 
@@ -19,6 +23,9 @@ class MCPManager:
 
     def __init__(self):
         self._configs: dict[str, dict] = {}
+        self.sessions = MCPSessionPool(
+            idle_timeout=getattr(flowsettings, "KH_MCP_IDLE_TIMEOUT", 600)
+        )
         self.load()
 
     def load(self):
@@ -63,9 +70,11 @@ class MCPManager:
             item = session.query(MCPTable).filter_by(name=name).first()
             if not item:
                 raise ValueError(f"MCP server '{name}' not found")
+            old_config = dict(item.config or {})
             item.config = config  # type: ignore[assignment]
             session.commit()
 
+        self.sessions.invalidate(old_config)
         self.load()
 
     def delete(self, name: str):
@@ -73,8 +82,10 @@ class MCPManager:
         with Session(engine) as session:
             item = session.query(MCPTable).filter_by(name=name).first()
             if item:
+                old_config = dict(item.config or {})
                 session.delete(item)
                 session.commit()
+                self.sessions.invalidate(old_config)
 
         self.load()
 
@@ -88,5 +99,16 @@ class MCPManager:
                 choices.append(f"[MCP] {name}")
         return choices
 
+    def create_tools(self, name: str) -> list:
+        """Build the enabled tools of an MCP server, calling it through its
+        persistent session."""
+        entry = self._info.get(name)
+        if not entry:
+            return []
+        config = entry.get("config", {})
+        return create_tools_from_config(
+            config, config.get("enabled_tools"), session_pool=self.sessions
+        )
+
 
 mcp_manager = MCPManager()
@@ -1,6 +1,7 @@
 import asyncio
 import json
 import re
+import time
 from copy import deepcopy
 from typing import Optional
 
@@ -35,12 +36,17 @@ from .chat_suggestion import ChatSuggestion
 from .common import STATE
 from .control import ConversationControl
 from .demo_hint import HintPage
+from .history import LEGACY_HISTORY_KEYS, load_turns, save_turns
 from .paper_list import PaperListPage
 from .report import ReportIssue
 
 KH_DEMO_MODE = getattr(flowsettings, "KH_DEMO_MODE", False)
 KH_SSO_ENABLED = getattr(flowsettings, "KH_SSO_ENABLED", False)
 KH_WEB_SEARCH_BACKEND = getattr(flowsettings, "KH_WEB_SEARCH_BACKEND", None)
+# the streamed answer is sent to the browser at most every this many seconds, or
+# when this many characters are pending (interval 0 to send every chunk)
+KH_CHAT_STREAM_INTERVAL = getattr(flowsettings, "KH_CHAT_STREAM_INTERVAL", 0.1)
+KH_CHAT_STREAM_MAX_CHARS = getattr(flowsettings, "KH_CHAT_STREAM_MAX_CHARS", 500)
 WebSearch = None
 if KH_WEB_SEARCH_BACKEND:
     try:
@@ -57,6 +63,33 @@ DEFAULT_QUESTION = (
     else "What is the summary of this paper?"
 )
 
+
+def components_to_send(
+    channel: str, changed: set[str], pending_chars: int, elapsed: float
+) -> set[str]:
+    """The changed components to send to the browser after a streamed response
+
+    Args:
+        channel: the channel of the last response
+        changed: the components changed since they were last sent
+        pending_chars: the number of answer characters not sent yet
+        elapsed: the seconds since the answer was last sent
+    """
+    if not KH_CHAT_STREAM_INTERVAL or channel == "plot":
+        return set(changed)
+    if "info" in changed and channel != "info":
+        # the evidence phase is over
+        return set(changed)
+    if "chat" in changed and (
+        channel != "chat"
+        or pending_chars >= KH_CHAT_STREAM_MAX_CHARS
+        or elapsed >= KH_CHAT_STREAM_INTERVAL
+    ):
+        # the answer pauses for another channel, or its budget is spent
+        return {"chat"}
+    return set()
+
+
 chat_input_focus_js = """
 function() {
     let chatInput = document.querySelector("#chat-input textarea");
@@ -758,6 +791,7 @@ class ChatPage(BasePage):
             self.chat_panel.chatbot.select(
                 self.message_selected,
                 inputs=[
+                    self.chat_control.conversation_id,
                     self.state_retrieval_history,
                     self.state_plot_history,
                 ],
@@ -953,8 +987,8 @@ class ChatPage(BasePage):
             if not KH_DEMO_MODE:
                 id_, update = self.chat_control.new_conv(user_id)
                 with Session(engine) as session:
-                    statement = select(Conversation).where(Conversation.id == id_)
-                    name = session.exec(statement).one().name
+                    statement = select(Conversation.name).where(Conversation.id == id_)
+                    name = session.exec(statement).one()
                     new_conv_id = id_
                     conv_update = update
                     new_conv_name = name
@@ -1119,12 +1153,27 @@ class ChatPage(BasePage):
             old_selecteds = data_source.get("selected", {})
             is_owner = result.user == user_id
 
-            # Write down to db
+            # Write down to db, the evidence of the current message goes to its
+            # own record (and all of it for conversations not migrated yet)
+            if any(key in data_source for key in LEGACY_HISTORY_KEYS):
+                turns = range(len(retrival_history))
+            else:
+                turns = range(len(retrival_history) - 1, len(retrival_history))
+            save_turns(
+                session,
+                convo_id,
+                {
+                    turn: (
+                        retrival_history[turn],
+                        plot_history[turn] if turn < len(plot_history) else None,
+                    )
+                    for turn in turns
+                    if retrival_history[turn] is not None
+                },
+            )
             result.data_source = {
                 "selected": selecteds_ if is_owner else old_selecteds,
                 "messages": messages,
-                "retrieval_messages": retrival_history,
-                "plot_history": plot_history,
                 "state": state,
                 "likes": deepcopy(data_source.get("likes", [])),
             }
@@ -1153,7 +1202,9 @@ class ChatPage(BasePage):
             session.add(result)
             session.commit()
 
-    def message_selected(self, retrieval_history, plot_history, msg: gr.SelectData):
+    def message_selected(
+        self, convo_id, retrieval_history, plot_history, msg: gr.SelectData
+    ):
         index = msg.index[0]
         try:
             retrieval_content, plot_content = (
@@ -1163,6 +1214,12 @@ class ChatPage(BasePage):
         except IndexError:
             retrieval_content, plot_content = gr.update(), None
 
+        if retrieval_content is None:
+            # evidence not loaded with the conversation
+            retrieval_content, plot_content = load_turns(convo_id, [index]).get(
+                index, ("", None)
+            )
+
         return retrieval_content, plot_content
 
     def create_pipeline(
@@ -1317,6 +1374,29 @@ class ChatPage(BasePage):
             chat_state,
         )
 
+        # only send the components that changed since the last output: the answer
+        # on a time/size budget, the evidence once its phase (retrieval,
+        # citation...) is over rather than with every chunk
+        changed: set[str] = set()
+        last_sent, pending_chars = time.monotonic(), 0
+
+        def output(components: set[str]):
+            nonlocal last_sent, pending_chars
+            changed.difference_update(components)
+            if "chat" in components:
+                last_sent, pending_chars = time.monotonic(), 0
+            return (
+                (
+                    chat_history + [(chat_input, text or msg_placeholder)]
+                    if "chat" in components
+                    else gr.update()
+                ),
+                refs if "info" in components else gr.update(),
+                plot_gr if "plot" in components else gr.update(),
+                plot,
+                chat_state,
+            )
+
         try:
             for response in pipeline.stream(chat_input, conversation_id, chat_history):
 
@@ -1331,29 +1411,37 @@ class ChatPage(BasePage):
                         text = ""
                     else:
                         text += response.content
+                        pending_chars += len(response.content)
+                    changed.add("chat")
 
                 if response.channel == "info":
                     if response.content is None:
                         refs = ""
                     else:
                         refs += response.content
+                    changed.add("info")
 
                 if response.channel == "plot":
                     plot = response.content
                     plot_gr = self._json_to_plot(plot)
+                    changed.add("plot")
 
                 chat_state[pipeline.get_info()["id"]] = reasoning_state["pipeline"]
 
-                yield (
-                    chat_history + [(chat_input, text or msg_placeholder)],
-                    refs,
-                    plot_gr,
-                    plot,
-                    chat_state,
+                components = components_to_send(
+                    response.channel,
+                    changed,
+                    pending_chars,
+                    time.monotonic() - last_sent,
                 )
+                if components:
+                    yield output(components)
         except ValueError as e:
             print(e)
 
+        if changed:
+            yield output(set(changed))
+
         if not text:
             empty_msg = getattr(
                 flowsettings, "KH_CHAT_EMPTY_MSG_PLACEHOLDER", "(Sorry, I don't know)"
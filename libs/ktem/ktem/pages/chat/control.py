@@ -5,13 +5,14 @@ from copy import deepcopy
 import gradio as gr
 from ktem.app import BasePage
 from ktem.db.models import Conversation, User, engine
-from sqlmodel import Session, or_, select
+from sqlmodel import Session, select
 
 import flowsettings
 
 from ...utils.conversation import sync_retrieval_n_message
 from .chat_suggestion import ChatSuggestion
 from .common import STATE
+from .history import LEGACY_HISTORY_KEYS, delete_turns, list_conversations, load_turns
 
 logger = logging.getLogger(__name__)
 
@@ -198,56 +199,36 @@ class ConversationControl(BasePage):
                 visible=False,
             )
 
-    def load_chat_history(self, user_id):
-        """Reload chat history"""
+    def load_chat_history(self, user_id, offset=0, limit=None):
+        """Reload chat history
+
+        Args:
+            user_id: the user id
+            offset: number of conversations to skip, for pagination
+            limit: maximum number of conversations to list, None for all
+        """
 
         # In case user are admin. They can also watch the
         # public conversations
         can_see_public: bool = False
         with Session(engine) as session:
-            statement = select(User).where(User.id == user_id)
-            result = session.exec(statement).one_or_none()
+            statement = select(User.username).where(User.id == user_id)
+            username = session.exec(statement).one_or_none()
 
-            if result is not None:
+            if username is not None:
                 if flowsettings.KH_USER_CAN_SEE_PUBLIC:
-                    can_see_public = (
-                        result.username == flowsettings.KH_USER_CAN_SEE_PUBLIC
-                    )
+                    can_see_public = username == flowsettings.KH_USER_CAN_SEE_PUBLIC
                 else:
                     can_see_public = True
 
         print(f"User-id: {user_id}, can see public conversations: {can_see_public}")
 
-        options = []
-        with Session(engine) as session:
-            # Define condition based on admin-role:
-            # - can_see: can see their conversations & public files
-            # - can_not_see: only see their conversations
-            if can_see_public:
-                statement = (
-                    select(Conversation)
-                    .where(
-                        or_(
-                            Conversation.user == user_id,
-                            Conversation.is_public,
-                        )
-                    )
-                    .order_by(
-                        Conversation.is_public.desc(), Conversation.date_created.desc()
-                    )  # type: ignore
-                )
-            else:
-                statement = (
-                    select(Conversation)
-                    .where(Conversation.user == user_id)
-                    .order_by(Conversation.date_created.desc())  # type: ignore
-                )
-
-            results = session.exec(statement).all()
-            for result in results:
-                options.append((result.name, result.id))
-
-        return options
+        # Define condition based on admin-role:
+        # - can_see: can see their conversations & public files
+        # - can_not_see: only see their conversations
+        return list_conversations(
+            user_id, include_public=can_see_public, offset=offset, limit=limit
+        )
 
     def reload_conv(self, user_id):
         conv_list = self.load_chat_history(user_id)
@@ -287,6 +268,7 @@ class ConversationControl(BasePage):
             result = session.exec(statement).one()
 
             session.delete(result)
+            delete_turns(session, conversation_id)
             session.commit()
 
         history = self.load_chat_history(user_id)
@@ -320,10 +302,21 @@ class ConversationControl(BasePage):
                     "chat_suggestions", default_chat_suggestions
                 )
 
-                retrieval_history: list[str] = result.data_source.get(
-                    "retrieval_messages", []
-                )
-                plot_history: list[dict] = result.data_source.get("plot_history", [])
+                retrieval_history: list[str | None]
+                plot_history: list[dict | None]
+                if any(key in result.data_source for key in LEGACY_HISTORY_KEYS):
+                    # the evidence is still stored with the messages
+                    retrieval_history = result.data_source.get("retrieval_messages", [])
+                    plot_history = result.data_source.get("plot_history", [])
+                elif chats:
+                    # only load the evidence of the last message, the others
+                    # (None) are loaded when their message is selected
+                    last = len(chats) - 1
+                    retrieval, plot = load_turns(id_, [last]).get(last, ("", None))
+                    retrieval_history = [None] * last + [retrieval]
+                    plot_history = [None] * last + [plot]
+                else:
+                    retrieval_history, plot_history = [], []
 
                 # On initialization
                 # Ensure len of retrieval and messages are equal
@@ -0,0 +1,117 @@
+"""Read and write the conversation list and the evidence of the messages
+
+The evidence (retrieval html and plot) of each message is stored in its own
+`ConversationTurn` record instead of the `data_source` of the conversation, so
+that opening a conversation only loads the evidence that is displayed. Older
+conversations still hold it in `data_source`, under `LEGACY_HISTORY_KEYS`, until
+they are saved again.
+"""
+from typing import Iterable, Optional
+
+from ktem.db.models import Conversation, ConversationTurn, engine
+from sqlalchemy import delete
+from sqlmodel import Session, or_, select
+
+LEGACY_HISTORY_KEYS = ("retrieval_messages", "plot_history")
+
+
+def list_conversations(
+    user_id: str,
+    include_public: bool = False,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> list[tuple[str, str]]:
+    """List the (name, id) of the conversations of the user, newest first
+
+    Only the name and id columns are read, not the content of the conversations.
+
+    Args:
+        user_id: the user id
+        include_public: also list the public conversations, before the others
+        offset: number of conversations to skip, for pagination
+        limit: maximum number of conversations to list, None for all
+    """
+    statement = select(Conversation.name, Conversation.id)
+    if include_public:
+        statement = statement.where(
+            or_(Conversation.user == user_id, Conversation.is_public)
+        ).order_by(
+            Conversation.is_public.desc(), Conversation.date_created.desc()
+        )  # type: ignore
+    else:
+        statement = statement.where(Conversation.user == user_id).order_by(
+            Conversation.date_created.desc()  # type: ignore
+        )
+
+    if offset:
+        statement = statement.offset(offset)
+    if limit is not None:
+        statement = statement.limit(limit)
+
+    with Session(engine) as session:
+        return [(name, id_) for name, id_ in session.exec(statement).all()]
+
+
+def load_turns(
+    conversation_id: str, turns: Optional[Iterable[int]] = None
+) -> dict[int, tuple[str, Optional[dict]]]:
+    """Load the evidence of the messages of a conversation
+
+    Args:
+        conversation_id: the conversation id
+        turns: the message indices to load, None for all
+
+    Returns:
+        the (retrieval message, plot data) of each loaded message index
+    """
+    statement = select(
+        ConversationTurn.turn,
+        ConversationTurn.retrieval_message,
+        ConversationTurn.plot_data,
+    ).where(ConversationTurn.conversation_id == conversation_id)
+    if turns is not None:
+        statement = statement.where(
+            ConversationTurn.turn.in_(list(turns))  # type: ignore
+        )
+
+    with Session(engine) as session:
+        return {
+            turn: (retrieval, plot)
+            for turn, retrieval, plot in session.exec(statement).all()
+        }
+
+
+def save_turns(
+    session: Session,
+    conversation_id: str,
+    turns: dict[int, tuple[str, Optional[dict]]],
+):
+    """Insert or update the evidence of the messages, in the given session
+
+    Args:
+        session: the session to write with, committed by the caller
+        conversation_id: the conversation id
+        turns: the (retrieval message, plot data) of each message index
+    """
+    statement = select(ConversationTurn).where(
+        ConversationTurn.conversation_id == conversation_id,
+        ConversationTurn.turn.in_(list(turns)),  # type: ignore
+    )
+    existing = {row.turn: row for row in session.exec(statement).all()}
+
+    for turn, (retrieval, plot) in turns.items():
+        row = existing.get(turn) or ConversationTurn(
+            conversation_id=conversation_id, turn=turn
+        )
+        row.retrieval_message = retrieval or ""
+        row.plot_data = plot
+        session.add(row)
+
+
+def delete_turns(session: Session, conversation_id: str):
+    """Delete the evidence of all the messages, in the given session"""
+    session.execute(
+        delete(ConversationTurn).where(
+            ConversationTurn.conversation_id == conversation_id  # type: ignore
+        )
+    )
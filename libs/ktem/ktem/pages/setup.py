@@ -9,6 +9,8 @@ from ktem.llms.manager import llms
 from ktem.rerankings.manager import reranking_models_manager as rerankers
 from theflow.settings import settings as flowsettings
 
+from kotaemon.embeddings import CachedEmbeddings
+
 KH_OLLAMA_URL = getattr(flowsettings, "KH_OLLAMA_URL", "http://localhost:11434/v1/")
 DEFAULT_OLLAMA_URL = KH_OLLAMA_URL.replace("v1", "api")
 if DEFAULT_OLLAMA_URL.endswith("/"):
@@ -363,6 +365,9 @@ class SetupPage(BasePage):
 
             emb = embeddings.get(radio_model_value)
             assert emb, f"Embedding model {radio_model_value} not found."
+            if isinstance(emb, CachedEmbeddings):
+                # test the connection, not the cache
+                emb = emb.embedding
 
             log_content += "- Sending a message `Hi`<br>"
             yield log_content
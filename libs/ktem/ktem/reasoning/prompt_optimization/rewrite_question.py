@@ -23,7 +23,9 @@ class RewriteQuestionPipeline(BaseComponent):
         lang: the language of the answer. Currently support English and Japanese
     """
 
-    llm: ChatLLM = Node(default_callback=lambda _: llms.get_default())
+    llm: ChatLLM = Node(
+        default_callback=lambda _: llms.cached(llms.get_default(), semantic=True)
+    )
     rewrite_template: str = DEFAULT_REWRITE_PROMPT
 
     lang: str = "English"
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 class SuggestConvNamePipeline(BaseComponent):
     """Suggest a good conversation name based on the chat history."""
 
-    llm: ChatLLM = Node(default_callback=lambda _: llms.get_default())
+    llm: ChatLLM = Node(default_callback=lambda _: llms.cached(llms.get_default()))
     SUGGEST_NAME_PROMPT_TEMPLATE = (
         "You are an expert at suggesting good and memorable conversation name. "
         "Based on the chat history above, "
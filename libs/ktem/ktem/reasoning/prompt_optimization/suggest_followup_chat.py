@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 class SuggestFollowupQuesPipeline(BaseComponent):
     """Suggest a list of follow-up questions based on the chat history."""
 
-    llm: ChatLLM = Node(default_callback=lambda _: llms.get_default())
+    llm: ChatLLM = Node(default_callback=lambda _: llms.cached(llms.get_default()))
     SUGGEST_QUESTIONS_PROMPT_TEMPLATE = (
         "Based on the chat history above. "
         "your task is to generate 3 to 5 relevant follow-up questions. "
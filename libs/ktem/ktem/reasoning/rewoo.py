@@ -18,7 +18,6 @@ from kotaemon.agents import (
     RewooAgent,
     WikipediaTool,
 )
-from kotaemon.agents.tools.mcp import create_tools_from_config
 from kotaemon.base import BaseComponent, Document, HumanMessage, Node, SystemMessage
 from kotaemon.llms import ChatLLM, PromptTemplate
 
@@ -409,12 +408,7 @@ class RewooAgentPipeline(BaseReasoning):
         for tool_name in settings[f"{prefix}.tools"]:
             if tool_name.startswith("[MCP] "):
                 server_name = tool_name[len("[MCP] ") :]
-                entry = mcp_manager.get(server_name)
-                if entry:
-                    config = entry["config"]
-                    enabled_tools = config.pop("enabled_tools", None)
-                    mcp_tools = create_tools_from_config(config, enabled_tools)
-                    tools.extend(mcp_tools)
+                tools.extend(mcp_manager.create_tools(server_name))
             else:
                 tool = TOOL_REGISTRY[tool_name]
                 if tool_name == "SearchDoc":
@@ -366,7 +366,7 @@ class FullQAPipeline(BaseReasoning):
             answer_pipeline = pipeline.answering_pipeline = AnswerWithContextPipeline()
 
         answer_pipeline.llm = llm
-        answer_pipeline.citation_pipeline.llm = llm
+        answer_pipeline.citation_pipeline.llm = llms.cached(llm)
         answer_pipeline.n_last_interactions = settings[f"{prefix}.n_last_interactions"]
         answer_pipeline.enable_citation = (
             settings[f"{prefix}.highlight_citation"] != "off"
@@ -388,7 +388,7 @@ class FullQAPipeline(BaseReasoning):
         pipeline.trigger_context = settings[f"{prefix}.trigger_context"]
         pipeline.use_rewrite = states.get("app", {}).get("regen", False)
         if pipeline.rewrite_pipeline:
-            pipeline.rewrite_pipeline.llm = llm
+            pipeline.rewrite_pipeline.llm = llms.cached(llm, semantic=True)
             pipeline.rewrite_pipeline.lang = SUPPORTED_LANGUAGE_MAP.get(
                 settings["reasoning.lang"], "English"
             )
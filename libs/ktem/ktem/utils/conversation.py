@@ -3,8 +3,8 @@ import re
 
 def sync_retrieval_n_message(
     messages: list[list[str]],
-    retrievals: list[str],
-) -> list[str]:
+    retrievals: list[str | None],
+) -> list[str | None]:
     """Ensure len of  messages history and retrieval history are equal
     Empty string/Truncate will be used in case any difference exist
     """
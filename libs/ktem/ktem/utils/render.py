@@ -4,6 +4,7 @@ import markdown
 from fast_langdetect import detect
 
 from kotaemon.base import RetrievedDocument
+from kotaemon.storages.blobstores import get_default_blob_store, is_blob_uri
 
 BASE_PATH = os.environ.get("GR_FILE_ROOT_PATH", "")
 
@@ -130,7 +131,9 @@ class Render:
 
     @staticmethod
     def image(url: str, text: str = "") -> str:
-        """Render an image"""
+        """Render an image, blob URIs are served from the blob store files"""
+        if is_blob_uri(url) and (blob_store := get_default_blob_store()):
+            url = f"{BASE_PATH}/{blob_store.url(url)}"
         img = f'<img src="{url}"><br>'
         if text:
             caption = f"<p>{text}</p>"
@@ -0,0 +1,132 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from ktem.db.models import Conversation, ConversationTurn
+from ktem.pages.chat import control, history
+from ktem.pages.chat.control import ConversationControl
+from sqlmodel import Session, SQLModel, create_engine, select
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sql.db'}")
+    SQLModel.metadata.create_all(
+        engine, tables=[Conversation.__table__, ConversationTurn.__table__]
+    )
+    monkeypatch.setattr(history, "engine", engine)
+    monkeypatch.setattr(control, "engine", engine)
+    return engine
+
+
+def add_conversation(engine, name, user="user", **kwargs) -> str:
+    with Session(engine) as session:
+        conv = Conversation(name=name, user=user, **kwargs)
+        session.add(conv)
+        session.commit()
+        return conv.id
+
+
+def test_list_conversations_pagination(engine):
+    start = datetime.datetime(2024, 1, 1)
+    ids = [
+        add_conversation(
+            engine, f"conv {idx}", date_created=start + datetime.timedelta(days=idx)
+        )
+        for idx in range(5)
+    ]
+    public_id = add_conversation(engine, "public", user="other", is_public=True)
+    add_conversation(engine, "private", user="other")
+
+    # newest first, by pages
+    assert history.list_conversations("user", limit=2) == [
+        ("conv 4", ids[4]),
+        ("conv 3", ids[3]),
+    ]
+    assert history.list_conversations("user", offset=2, limit=2) == [
+        ("conv 2", ids[2]),
+        ("conv 1", ids[1]),
+    ]
+    assert history.list_conversations("user", offset=4) == [("conv 0", ids[0])]
+
+    # the public conversations come first
+    listed = history.list_conversations("user", include_public=True)
+    assert listed[0] == ("public", public_id)
+    assert len(listed) == 6
+
+
+def test_save_turns_upsert_and_load_turns(engine):
+    conv_id = add_conversation(engine, "conv")
+    with Session(engine) as session:
+        history.save_turns(session, conv_id, {0: ("first", None), 1: ("second", {})})
+        session.commit()
+    with Session(engine) as session:
+        history.save_turns(
+            session, conv_id, {1: ("updated", {"data": [1]}), 2: (None, None)}
+        )
+        session.commit()
+
+    with Session(engine) as session:
+        rows = session.exec(
+            select(ConversationTurn).where(ConversationTurn.conversation_id == conv_id)
+        ).all()
+    assert len(rows) == 3, "Existing turns should be updated, not duplicated"
+
+    assert history.load_turns(conv_id) == {
+        0: ("first", None),
+        1: ("updated", {"data": [1]}),
+        2: ("", None),
+    }
+    assert history.load_turns(conv_id, [1]) == {1: ("updated", {"data": [1]})}
+    assert history.load_turns("unknown") == {}
+
+    with Session(engine) as session:
+        history.delete_turns(session, conv_id)
+        session.commit()
+    assert history.load_turns(conv_id) == {}
+
+
+def select_conv(conv_id, user_id="user"):
+    page = SimpleNamespace(
+        _app=SimpleNamespace(index_manager=SimpleNamespace(indices=[]))
+    )
+    return ConversationControl.select_conv(page, conv_id, user_id)
+
+
+def test_select_conv_legacy_data_source(engine):
+    messages = [["hi", "hello"], ["how are you", "fine"]]
+    conv_id = add_conversation(
+        engine,
+        "legacy",
+        data_source={
+            "messages": messages,
+            "retrieval_messages": ["evidence 0", "evidence 1"],
+            "plot_history": [None, {"data": [1]}],
+        },
+    )
+    # the turns table isn't read for the conversations not migrated yet
+    with Session(engine) as session:
+        history.save_turns(session, conv_id, {1: ("ignored", None)})
+        session.commit()
+
+    result = select_conv(conv_id)
+    assert result[0] == conv_id
+    assert result[3] == messages
+    assert result[5] == "evidence 1", "Should show the last evidence"
+    assert result[6] == {"data": [1]}
+    assert result[7] == ["evidence 0", "evidence 1"]
+    assert result[8] == [None, {"data": [1]}]
+
+
+def test_select_conv_loads_the_last_turn(engine):
+    messages = [["hi", "hello"], ["how are you", "fine"]]
+    conv_id = add_conversation(engine, "conv", data_source={"messages": messages})
+    with Session(engine) as session:
+        history.save_turns(
+            session, conv_id, {0: ("evidence 0", None), 1: ("evidence 1", None)}
+        )
+        session.commit()
+
+    result = select_conv(conv_id)
+    assert result[5] == "evidence 1"
+    assert result[7] == [None, "evidence 1"], "Only the last turn is loaded"
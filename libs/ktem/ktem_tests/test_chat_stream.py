@@ -0,0 +1,34 @@
+from ktem.pages import chat
+from ktem.pages.chat import components_to_send
+
+
+def test_components_to_send(monkeypatch):
+    monkeypatch.setattr(chat, "KH_CHAT_STREAM_INTERVAL", 0.1)
+    monkeypatch.setattr(chat, "KH_CHAT_STREAM_MAX_CHARS", 500)
+
+    # the answer is sent on a time or size budget
+    assert components_to_send("chat", {"chat"}, 10, 0.01) == set()
+    assert components_to_send("chat", {"chat"}, 10, 0.2) == {"chat"}
+    assert components_to_send("chat", {"chat"}, 600, 0.01) == {"chat"}
+
+    # the pending answer is sent when another channel arrives
+    assert components_to_send("info", {"chat", "info"}, 10, 0.01) == {"chat"}
+    assert components_to_send("debug", {"chat"}, 10, 0.01) == {"chat"}
+
+    # the evidence is sent once its phase is over
+    assert components_to_send("info", {"info"}, 0, 0.01) == set()
+    assert components_to_send("chat", {"chat", "info"}, 10, 0.01) == {
+        "chat",
+        "info",
+    }
+
+    # the plots are sent right away, with the other changes
+    assert components_to_send("plot", {"chat", "plot"}, 10, 0.01) == {
+        "chat",
+        "plot",
+    }
+
+    # every chunk is sent without an interval
+    monkeypatch.setattr(chat, "KH_CHAT_STREAM_INTERVAL", 0)
+    assert components_to_send("chat", {"chat"}, 1, 0.0) == {"chat"}
+    assert components_to_send("info", {"info"}, 0, 0.0) == {"info"}
@@ -0,0 +1,323 @@
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from ktem.index.file import pipelines
+from ktem.index.file.pipelines import (
+    IndexDocumentPipeline,
+    IndexPipeline,
+    content_file_ids,
+)
+from sqlalchemy import JSON, Column, Integer, String, create_engine, select
+from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import Session, declarative_base
+
+from kotaemon.base import Document, DocumentWithEmbedding
+from kotaemon.embeddings import BaseEmbeddings
+from kotaemon.loaders import BaseReader
+from kotaemon.storages import InMemoryDocumentStore, InMemoryVectorStore
+
+Base = declarative_base()
+
+
+class Source(Base):
+    __tablename__ = "index__test__source"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String)
+    path = Column(String)
+    size = Column(Integer, default=0)
+    user = Column(String, default="")
+    note = Column(MutableDict.as_mutable(JSON), default={})  # type: ignore
+
+
+class IndexTable(Base):
+    __tablename__ = "index__test__index"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_id = Column(String)
+    target_id = Column(String)
+    relation_type = Column(String)
+    user = Column(String, default="")
+
+
+embedded: list[str] = []
+
+
+class LinesReader(BaseReader):
+    """Read each line of the file as a document"""
+
+    def run(self, file_path, extra_info: Optional[dict] = None, **kwargs):
+        return self.load_data(Path(file_path), extra_info=extra_info)
+
+    def load_data(self, file_path, extra_info: Optional[dict] = None, **kwargs):
+        return [
+            Document(text=line, metadata=dict(extra_info or {}))
+            for line in Path(file_path).read_text().splitlines()
+        ]
+
+
+class CountingEmbeddings(BaseEmbeddings):
+    def invoke(self, text, *args, **kwargs):
+        docs = self.prepare_input(text)
+        embedded.extend(doc.text for doc in docs)
+        return [
+            DocumentWithEmbedding(text=doc.text, embedding=[float(len(doc.text)), 1.0])
+            for doc in docs
+        ]
+
+
+@pytest.fixture
+def file_index(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sql.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(pipelines, "engine", engine)
+    embedded.clear()
+    (tmp_path / "files").mkdir()
+    return {
+        "Source": Source,
+        "Index": IndexTable,
+        "DS": InMemoryDocumentStore(),
+        "VS": InMemoryVectorStore(),
+        "FSPath": tmp_path / "files",
+    }
+
+
+def make_pipeline(file_index, user_id="user", **kwargs) -> IndexPipeline:
+    return IndexPipeline(
+        loader=LinesReader(),
+        splitter=None,
+        embedding=CountingEmbeddings(),
+        user_id=user_id,
+        **file_index,
+        **kwargs,
+    )
+
+
+def index_file(pipeline: IndexPipeline, file_path: Path, reindex=False) -> str:
+    stream = pipeline.stream(file_path, reindex)
+    while True:
+        try:
+            next(stream)
+        except StopIteration as e:
+            return e.value[0]
+
+
+def chunk_texts(file_index, file_id: str) -> set[str]:
+    """The texts of the chunks tagged with the file id"""
+    return {
+        doc.text
+        for doc in file_index["DS"].get_all()
+        if doc.metadata["file_id"] == file_id
+    }
+
+
+def indexed_texts(file_index, file_id: str) -> set[str]:
+    """The texts of the chunks recorded for the file in the index table"""
+    with Session(pipelines.engine) as session:
+        doc_ids = session.execute(
+            select(IndexTable.target_id).where(
+                IndexTable.source_id == file_id,
+                IndexTable.relation_type == "document",
+            )
+        ).all()
+    return {doc.text for doc in file_index["DS"].get([doc_id for (doc_id,) in doc_ids])}
+
+
+def test_dedup_content_link_reindex_delete(file_index, tmp_path):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text("alpha\nbeta")
+
+    file_a = index_file(
+        make_pipeline(file_index, "user1", dedup_content=True), tmp_path / "a.txt"
+    )
+    assert sorted(embedded) == ["alpha", "beta"]
+    assert len(list(file_index["FSPath"].iterdir())) == 1
+
+    # the files of the same content share the chunks, without embedding them
+    embedded.clear()
+    pipeline_b = make_pipeline(file_index, "user2", dedup_content=True)
+    file_b = index_file(pipeline_b, tmp_path / "b.txt")
+    pipeline_c = make_pipeline(file_index, "user3", dedup_content=True)
+    file_c = index_file(pipeline_c, tmp_path / "c.txt")
+    assert embedded == []
+    assert len(list(file_index["FSPath"].iterdir())) == 1
+    assert content_file_ids(Source, [file_b, file_c]) == [file_a]
+    assert indexed_texts(file_index, file_b) == {"alpha", "beta"}
+
+    # the file gets new content: the other ones keep the old one, in their
+    # own chunks, and none of them sees the new content
+    (tmp_path / "a.txt").write_text("gamma\nbeta")
+    index_file(
+        make_pipeline(file_index, "user1", dedup_content=True),
+        tmp_path / "a.txt",
+        reindex=True,
+    )
+    assert chunk_texts(file_index, file_a) == {"gamma", "beta"}
+    assert indexed_texts(file_index, file_a) == {"gamma", "beta"}
+    assert content_file_ids(Source, [file_a]) == [file_a]
+    assert content_file_ids(Source, [file_b, file_c]) == [file_b]
+    assert chunk_texts(file_index, file_b) == {"alpha", "beta"}
+    assert indexed_texts(file_index, file_c) == {"alpha", "beta"}
+
+    # the chunks are deleted with the last file using them
+    pipeline_b.delete_file(file_b)
+    assert chunk_texts(file_index, file_b) == {"alpha", "beta"}
+    assert indexed_texts(file_index, file_c) == {"alpha", "beta"}
+    pipeline_c.delete_file(file_c)
+    assert chunk_texts(file_index, file_b) == set()
+    assert chunk_texts(file_index, file_a) == {"gamma", "beta"}
+
+
+def chunk_ids(file_index, file_id: str) -> dict[str, list[str]]:
+    """The ids of the chunks of the file in the doc store, by text"""
+    ids: dict[str, list[str]] = {}
+    for doc in file_index["DS"].get_all():
+        if doc.metadata["file_id"] == file_id:
+            ids.setdefault(doc.text, []).append(doc.doc_id)
+    return {text: sorted(doc_ids) for text, doc_ids in ids.items()}
+
+
+def test_reindex_keeps_the_ids_of_unchanged_chunks(file_index, tmp_path):
+    (tmp_path / "a.txt").write_text("alpha\nbeta\nalpha")
+    file_id = index_file(make_pipeline(file_index), tmp_path / "a.txt")
+    ids = chunk_ids(file_index, file_id)
+    # the chunks of the same content are told apart by their occurrence
+    assert len(ids["alpha"]) == 2 and len(set(ids["alpha"])) == 2
+    assert sorted(embedded) == ["alpha", "alpha", "beta"]
+
+    # the same content gets the same ids, and isn't embedded again
+    embedded.clear()
+    index_file(make_pipeline(file_index), tmp_path / "a.txt", reindex=True)
+    assert chunk_ids(file_index, file_id) == ids
+    assert embedded == []
+
+    # only the new chunks are embedded, the ones that are gone are deleted
+    (tmp_path / "a.txt").write_text("alpha\ngamma")
+    index_file(make_pipeline(file_index), tmp_path / "a.txt", reindex=True)
+    new_ids = chunk_ids(file_index, file_id)
+    assert new_ids.keys() == {"alpha", "gamma"}
+    assert len(new_ids["alpha"]) == 1 and new_ids["alpha"][0] in ids["alpha"]
+    assert embedded == ["gamma"]
+    assert indexed_texts(file_index, file_id) == {"alpha", "gamma"}
+    vector_ids = set(file_index["VS"]._client._data.embedding_dict)
+    assert vector_ids == {new_ids["alpha"][0], new_ids["gamma"][0]}
+
+
+def test_reindex_after_interrupted_indexing(file_index, tmp_path):
+    (tmp_path / "a.txt").write_text("alpha\nbeta")
+    file_id = index_file(make_pipeline(file_index), tmp_path / "a.txt")
+
+    # the records were written, but not recorded in the index table
+    with Session(pipelines.engine) as session:
+        for (each,) in session.execute(
+            select(IndexTable).where(IndexTable.source_id == file_id)
+        ).all():
+            session.delete(each)
+        session.commit()
+
+    index_file(make_pipeline(file_index), tmp_path / "a.txt", reindex=True)
+    assert indexed_texts(file_index, file_id) == {"alpha", "beta"}
+    assert len(file_index["DS"].get_all()) == 2
+    assert len(file_index["VS"]._client._data.embedding_dict) == 2
+
+
+def test_pipelined_writes_documents_before_vectors(file_index, tmp_path, monkeypatch):
+    writes: list[tuple[str, str]] = []
+
+    class SlowDocumentStore(InMemoryDocumentStore):
+        def add(self, docs, *args, **kwargs):
+            time.sleep(0.05)
+            super().add(docs, *args, **kwargs)
+            writes.extend(("document", doc.doc_id) for doc in docs)
+
+    class RecordingVectorStore(InMemoryVectorStore):
+        def add(self, *args, **kwargs):
+            writes.extend(("vector", doc_id) for doc_id in kwargs["ids"])
+            return super().add(*args, **kwargs)
+
+    monkeypatch.setitem(pipelines.KH_DEFAULT_FILE_EXTRACTORS, ".txt", LinesReader())
+    # the stages run concurrently on the pipeline of each file, repeat to catch
+    # the races
+    for round_idx in range(5):
+        writes.clear()
+        file_paths = []
+        for file_idx in range(3):
+            file_path = tmp_path / f"{round_idx}_{file_idx}.txt"
+            file_path.write_text(f"alpha {file_idx}\nbeta {file_idx}")
+            file_paths.append(file_path)
+        pipeline = IndexDocumentPipeline(
+            embedding=CountingEmbeddings(),
+            pipelined=True,
+            load_workers=2,
+            embed_workers=2,
+            write_workers=2,
+            user_id="user",
+            **{**file_index, "DS": SlowDocumentStore(), "VS": RecordingVectorStore()},
+        )
+        stream = pipeline.stream(file_paths)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as e:
+                file_ids, errors, _ = e.value
+                break
+
+        assert errors == [None, None, None]
+        documents = [doc_id for kind, doc_id in writes if kind == "document"]
+        vectors = [doc_id for kind, doc_id in writes if kind == "vector"]
+        assert sorted(documents) == sorted(vectors) and len(documents) == 6
+        for doc_id in vectors:
+            assert writes.index(("document", doc_id)) < writes.index(
+                ("vector", doc_id)
+            ), "The document should be written before its vector"
+        texts = indexed_texts({**file_index, "DS": pipeline.DS}, file_ids[0])
+        assert texts == {"alpha 0", "beta 0"}
+
+
+def test_sequential_parses_the_next_files_ahead(file_index, tmp_path, monkeypatch):
+    events: list[str] = []
+    submit = pipelines.ProcessPoolLoader.submit
+
+    def recording_submit(self, loader, file_path, extra_info=None):
+        events.append(f"parse {Path(file_path).name}")
+        return submit(self, loader, file_path, extra_info)
+
+    monkeypatch.setattr(pipelines.ProcessPoolLoader, "submit", recording_submit)
+    monkeypatch.setitem(pipelines.KH_DEFAULT_FILE_EXTRACTORS, ".txt", LinesReader())
+    file_paths = []
+    for idx in range(4):
+        file_path = tmp_path / f"{idx}.txt"
+        file_path.write_text(f"alpha {idx}\nbeta {idx}")
+        file_paths.append(file_path)
+
+    pipeline = IndexDocumentPipeline(
+        embedding=CountingEmbeddings(),
+        parse_processes=2,
+        user_id="user",
+        **file_index,
+    )
+    stream = pipeline.stream(file_paths)
+    while True:
+        try:
+            doc = next(stream)
+        except StopIteration as e:
+            file_ids, errors, _ = e.value
+            break
+        if doc.channel == "index":
+            events.append(f"indexed {doc.content['file_name']}")
+
+    assert errors == [None] * 4
+    # the two next files are parsed while a file is indexed
+    assert events == [
+        "parse 0.txt",
+        "parse 1.txt",
+        "parse 2.txt",
+        "indexed 0.txt",
+        "parse 3.txt",
+        "indexed 1.txt",
+        "indexed 2.txt",
+        "indexed 3.txt",
+    ]
+    for idx, file_id in enumerate(file_ids):
+        assert chunk_texts(file_index, file_id) == {f"alpha {idx}", f"beta {idx}"}
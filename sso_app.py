@@ -7,6 +7,7 @@ from fastapi.responses import FileResponse
 from theflow.settings import settings as flowsettings
 
 KH_APP_DATA_DIR = getattr(flowsettings, "KH_APP_DATA_DIR", ".")
+KH_BLOB_STORE_PATH = getattr(flowsettings, "KH_BLOB_STORE_PATH", None)
 GRADIO_TEMP_DIR = os.getenv("GRADIO_TEMP_DIR", None)
 AUTHENTICATION_METHOD = config("AUTHENTICATION_METHOD", "GOOGLE")
 
@@ -74,5 +75,7 @@ grlogin.mount_gradio_app(
     allowed_paths=[
         "libs/ktem/ktem/assets",
         GRADIO_TEMP_DIR,
+        # page thumbnails and figures referenced by the documents
+        *([KH_BLOB_STORE_PATH] if KH_BLOB_STORE_PATH else []),
     ],
 )
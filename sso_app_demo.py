@@ -12,6 +12,7 @@ from theflow.settings import settings as flowsettings
 
 KH_DEMO_MODE = getattr(flowsettings, "KH_DEMO_MODE", False)
 KH_APP_DATA_DIR = getattr(flowsettings, "KH_APP_DATA_DIR", ".")
+KH_BLOB_STORE_PATH = getattr(flowsettings, "KH_BLOB_STORE_PATH", None)
 GRADIO_TEMP_DIR = os.getenv("GRADIO_TEMP_DIR", None)
 # override GRADIO_TEMP_DIR if it's not set
 if GRADIO_TEMP_DIR is None:
@@ -93,5 +94,7 @@ app = gr.mount_gradio_app(
     allowed_paths=[
         "libs/ktem/ktem/assets",
         GRADIO_TEMP_DIR,
+        # page thumbnails and figures referenced by the documents
+        *([KH_BLOB_STORE_PATH] if KH_BLOB_STORE_PATH else []),
     ],
 )